@@ -0,0 +1,239 @@
+"""
+Read-only JSON API
+Students, teachers, classes and subject assignments for the mobile clients,
+served by an ASGI server on SQLAlchemy's async engine so slow clients cost a
+coroutine each rather than a worker thread. Run it next to the Flask app:
+
+    API_TOKEN=... uvicorn --factory api:create_api --port 8000
+"""
+import hmac
+import os
+from contextlib import asynccontextmanager
+from sqlalchemy import event, func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from config import CONFIGS, basedir
+from models import Student, Teacher, Class, SubjectAssignment
+from sqlite_profile import sqlite_file, pragma_hook
+
+# Async drivers for the synchronous URLs the Flask app is configured with
+ASYNC_DRIVERS = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg'}
+
+# Columns each resource exposes, in order
+STUDENT_COLUMNS = (Student.id, Student.student_id, Student.full_name, Student.date_of_birth,
+                   Student.email, Student.phone, Student.class_id, Student.updated_at)
+TEACHER_COLUMNS = (Teacher.id, Teacher.teacher_id, Teacher.full_name, Teacher.subject,
+                   Teacher.qualification, Teacher.email, Teacher.phone, Teacher.joining_date,
+                   Teacher.updated_at)
+CLASS_COLUMNS = (Class.id, Class.grade, Class.section, Class.student_count, Class.assignment_count)
+ASSIGNMENT_COLUMNS = (SubjectAssignment.id, SubjectAssignment.subject_name,
+                      SubjectAssignment.class_id, SubjectAssignment.teacher_id)
+
+
+class APIError(Exception):
+    """Error answered with a JSON body and the given status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def async_database_url(config):
+    """
+    The configured database URL on its async driver
+    SQLite files are opened read-only, resolved the way Flask-SQLAlchemy does.
+    """
+    uri = config.SQLALCHEMY_DATABASE_URI
+    path = sqlite_file(uri, os.path.join(basedir, 'instance'))
+    if path is not None:
+        return f'sqlite+aiosqlite:///file:{path}?mode=ro&uri=true'
+    url = make_url(uri)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f'No async driver configured for {backend} databases')
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+def _serialize(row):
+    """JSON-safe dict of a result row; dates become ISO 8601 strings"""
+    data = dict(row._mapping)
+    for key, value in data.items():
+        if hasattr(value, 'isoformat'):
+            data[key] = value.isoformat()
+    return data
+
+
+def _class_name():
+    return (Class.grade + '-' + Class.section).label('class_name')
+
+
+def _int_arg(request, name, default=None, maximum=None):
+    value = request.query_params.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise APIError(400, f'{name} must be an integer')
+    if maximum is None and value < 0:
+        raise APIError(400, f'{name} must be a non-negative integer')
+    if maximum is not None and not 0 <= value <= maximum:
+        raise APIError(400, f'{name} must be between 0 and {maximum}')
+    return value
+
+
+async def _page(request, query, key):
+    """
+    One keyset page of query ordered by key: ?cursor= is the last key of the previous
+    page and ?limit= the page size. Returns {"items": [...], "next_cursor": ...}.
+    """
+    config = request.app.state.config
+    limit = _int_arg(request, 'limit', config.API_PAGE_SIZE, config.API_MAX_PAGE_SIZE) or config.API_PAGE_SIZE
+    cursor = _int_arg(request, 'cursor')
+    if cursor is not None:
+        query = query.where(key > cursor)
+    # One extra row tells whether another page follows
+    rows = await _fetch(request, query.order_by(key).limit(limit + 1))
+    items = [_serialize(row) for row in rows[:limit]]
+    return {'items': items, 'next_cursor': items[-1]['id'] if len(rows) > limit else None}
+
+
+async def _fetch(request, query):
+    """Run a query, holding a pooled connection only for the round trip"""
+    async with request.app.state.engine.connect() as connection:
+        return (await connection.execute(query)).all()
+
+
+async def _one(request, query, resource):
+    rows = await _fetch(request, query)
+    if not rows:
+        raise APIError(404, f'{resource} not found')
+    return _serialize(rows[0])
+
+
+async def list_students(request):
+    query = select(*STUDENT_COLUMNS)
+    class_id = _int_arg(request, 'class_id')
+    if class_id is not None:
+        query = query.where(Student.class_id == class_id)
+    return JSONResponse(await _page(request, query, Student.id))
+
+
+async def get_student(request):
+    student_id = request.path_params['student_id']
+    student = await _one(request, select(*STUDENT_COLUMNS, Student.address, _class_name())
+                         .outerjoin(Class, Student.class_id == Class.id)
+                         .where(Student.id == student_id), 'Student')
+    return JSONResponse(student)
+
+
+async def list_teachers(request):
+    return JSONResponse(await _page(request, select(*TEACHER_COLUMNS), Teacher.id))
+
+
+async def get_teacher(request):
+    teacher_id = request.path_params['teacher_id']
+    teacher = await _one(request, select(*TEACHER_COLUMNS).where(Teacher.id == teacher_id), 'Teacher')
+    assignments = await _fetch(request, select(*ASSIGNMENT_COLUMNS, _class_name())
+                               .join(Class, SubjectAssignment.class_id == Class.id)
+                               .where(SubjectAssignment.teacher_id == teacher_id)
+                               .order_by(Class.grade, Class.section, SubjectAssignment.subject_name))
+    teacher['assignments'] = [_serialize(row) for row in assignments]
+    return JSONResponse(teacher)
+
+
+async def list_classes(request):
+    query = select(*CLASS_COLUMNS, _class_name())
+    grade = request.query_params.get('grade')
+    if grade:
+        query = query.where(Class.grade == grade)
+    return JSONResponse(await _page(request, query, Class.id))
+
+
+async def get_class(request):
+    class_id = request.path_params['class_id']
+    class_data = await _one(request, select(*CLASS_COLUMNS, _class_name()).where(Class.id == class_id), 'Class')
+    students = await _fetch(request, select(Student.id, Student.student_id, Student.full_name)
+                            .where(Student.class_id == class_id).order_by(Student.full_name))
+    assignments = await _fetch(request, select(*ASSIGNMENT_COLUMNS, Teacher.full_name.label('teacher_name'))
+                               .join(Teacher, SubjectAssignment.teacher_id == Teacher.id)
+                               .where(SubjectAssignment.class_id == class_id)
+                               .order_by(SubjectAssignment.subject_name))
+    class_data['students'] = [_serialize(row) for row in students]
+    class_data['assignments'] = [_serialize(row) for row in assignments]
+    return JSONResponse(class_data)
+
+
+async def list_assignments(request):
+    query = select(*ASSIGNMENT_COLUMNS, _class_name(), Teacher.full_name.label('teacher_name')) \
+        .join(Class, SubjectAssignment.class_id == Class.id) \
+        .join(Teacher, SubjectAssignment.teacher_id == Teacher.id)
+    for name, column in (('class_id', SubjectAssignment.class_id), ('teacher_id', SubjectAssignment.teacher_id)):
+        value = _int_arg(request, name)
+        if value is not None:
+            query = query.where(column == value)
+    return JSONResponse(await _page(request, query, SubjectAssignment.id))
+
+
+async def health(request):
+    await _fetch(request, select(func.count()).select_from(Class))
+    return JSONResponse({'status': 'ok'})
+
+
+class TokenAuthMiddleware:
+    """Require "Authorization: Bearer <API_TOKEN>" on every request"""
+
+    def __init__(self, app, token):
+        self.app = app
+        self.expected = f'Bearer {token}'.encode() if token else None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            supplied = dict(scope['headers']).get(b'authorization', b'')
+            if self.expected is None or not hmac.compare_digest(supplied, self.expected):
+                response = JSONResponse({'error': 'unauthorized'}, status_code=401)
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+async def api_error(request, error):
+    return JSONResponse({'error': error.message}, status_code=error.status)
+
+
+def create_api(config_class=None):
+    """Build the ASGI application; the engine is created here and disposed on shutdown"""
+    config = config_class or CONFIGS[os.environ.get('APP_CONFIG', 'default')]
+    engine = create_async_engine(async_database_url(config), **config.API_ENGINE_OPTIONS)
+    if engine.dialect.name == 'sqlite' and config.SQLITE_PRAGMAS:
+        # journal_mode belongs to the Flask app's writer; read-only connections skip it
+        event.listen(engine.sync_engine, 'connect', pragma_hook(config.SQLITE_PRAGMAS, primary=False))
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        await engine.dispose()
+
+    app = Starlette(
+        routes=[
+            Route('/api/health', health),
+            Route('/api/students', list_students),
+            Route('/api/students/{student_id:int}', get_student),
+            Route('/api/teachers', list_teachers),
+            Route('/api/teachers/{teacher_id:int}', get_teacher),
+            Route('/api/classes', list_classes),
+            Route('/api/classes/{class_id:int}', get_class),
+            Route('/api/assignments', list_assignments),
+        ],
+        middleware=[Middleware(TokenAuthMiddleware, token=config.API_TOKEN)],
+        exception_handlers={APIError: api_error},
+        lifespan=lifespan,
+    )
+    app.state.config = config
+    app.state.engine = engine
+    return app
@@ -1,26 +1,46 @@
 """
 Main application entry point for School Management System
 """
+import os
 from flask import Flask
 from flask_login import LoginManager
-from config import Config
-from models import db, User
+from config import CONFIGS
+from models import db
 from routes.auth import auth_bp
 from routes.students import students_bp
 from routes.teachers import teachers_bp
 from routes.classes import classes_bp
 from routes.dashboard import dashboard_bp
+from routes.jobs import jobs_bp
+from routes.reports import reports_bp
+from routes.timetable import timetable_bp
+from routes.attendance import attendance_bp
+from search import init_search
+from migrations import upgrade
+from commands import register_commands
+from cache import init_stats_cache
+from fragments import init_fragment_cache
+from conditional import init_conditional
+from jobs import init_jobs
+from refdata import init_refdata
+from identity import init_identity, load_identity
+from instrumentation import init_instrumentation
+from metrics import init_metrics
+from sqlite_profile import configure_read_bind, init_sqlite
 
 
-def create_app(config_class=Config):
+def create_app(config_class=None):
     """
     Application factory pattern for creating Flask app instance
+    Without a config class, APP_CONFIG picks one from config.CONFIGS
     """
     app = Flask(__name__)
-    app.config.from_object(config_class)
+    app.config.from_object(config_class or CONFIGS[os.environ.get('APP_CONFIG', 'default')])
     
-    # Initialize extensions
+    # Initialize extensions (the read-only SQLite pool is an extra bind)
+    configure_read_bind(app)
     db.init_app(app)
+    init_sqlite(app)
     
     # Initialize Flask-Login
     login_manager = LoginManager()
@@ -31,8 +51,10 @@ def create_app(config_class=Config):
     
     @login_manager.user_loader
     def load_user(user_id):
-        """Load user from database for Flask-Login"""
-        return User.query.get(int(user_id))
+        """Load user for Flask-Login (cached, see identity.py)"""
+        return load_identity(user_id)
+    
+    init_identity(app)
     
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/auth')
@@ -40,15 +62,45 @@ def create_app(config_class=Config):
     app.register_blueprint(teachers_bp, url_prefix='/teachers')
     app.register_blueprint(classes_bp, url_prefix='/classes')
     app.register_blueprint(dashboard_bp, url_prefix='/')
+    app.register_blueprint(jobs_bp, url_prefix='/jobs')
+    app.register_blueprint(reports_bp, url_prefix='/reports')
+    app.register_blueprint(timetable_bp, url_prefix='/timetable')
+    app.register_blueprint(attendance_bp, url_prefix='/attendance')
     
     # Create database tables
     with app.app_context():
         db.create_all()
+        upgrade(db.engine, app.logger)
+    
+    # Full-text search indexes for the list views
+    init_search(app)
+    
+    # Dashboard statistics and template fragment caches, invalidated on commit
+    init_stats_cache(app)
+    init_fragment_cache(app)
+    
+    # ETag/Last-Modified validators for the views that compute them
+    init_conditional(app)
+    
+    # Version rows for the cached class/teacher choice lists
+    init_refdata(app)
+    
+    # Sampled SQL/template timings (Server-Timing header and log line)
+    init_instrumentation(app)
+    
+    # Request, pool and cache metrics at /metrics
+    init_metrics(app)
+    
+    # Background job runner for imports, exports and bulk updates
+    init_jobs(app)
+    
+    # Maintenance commands (flask --app app <command>)
+    register_commands(app)
     
     return app
 
 
 if __name__ == '__main__':
-    app = create_app()
+    app = create_app(CONFIGS[os.environ.get('APP_CONFIG', 'development')])
     app.run(debug=True, host='0.0.0.0', port=5000)
 
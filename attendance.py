@@ -0,0 +1,246 @@
+"""
+Attendance bitmaps
+Each student has one attendance row per term holding two packed bitmaps (see
+models.Attendance), so a term costs a few dozen bytes per student rather than
+a row per student per day. Marking a class locks and reads its rows once and
+writes them back with one upsert statement; term reports load every bitmap of
+the term into NumPy arrays and count bits for all students at once
+"""
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import and_, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, Student, Class, Term, Attendance
+
+# INSERT ... ON CONFLICT DO UPDATE, which both dialects spell the same way
+UPSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+# Set bits of every byte value
+_POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+
+def bitmap_size(days):
+    """Bytes in a bitmap of one bit per day"""
+    return (days + 7) // 8
+
+
+def _int(bitmap):
+    """A bitmap as an integer, bit d standing for day d"""
+    return int.from_bytes(bitmap or b'', 'little')
+
+
+def _dates(term, bits):
+    """Dates of the set bits of an integer bitmap"""
+    dates = []
+    while bits:
+        low = bits & -bits
+        dates.append(term.start_date + timedelta(days=low.bit_length() - 1))
+        bits ^= low
+    return dates
+
+
+def _grade_key(grade):
+    """Numeric grades in number order, then the rest alphabetically"""
+    return (0, int(grade), '') if grade.isdigit() else (1, 0, grade)
+
+
+def term_for(day):
+    """The term containing day, or None"""
+    return Term.query.filter(Term.start_date <= day, Term.end_date >= day).first()
+
+
+def overlapping_term(start_date, end_date):
+    """A term sharing at least one day with start_date..end_date, or None"""
+    return Term.query.filter(Term.start_date <= end_date, Term.end_date >= start_date).first()
+
+
+def class_attendance(term, class_id, day=None):
+    """
+    The class's current students with their term so far, in name order:
+    (student, present days, marked days, status) where status is True or False
+    for present or absent on day, and None when day was not marked for them
+    """
+    rows = db.session.execute(
+        select(Student, Attendance.marked, Attendance.present)
+        .outerjoin(Attendance, and_(Attendance.student_id == Student.id, Attendance.term_id == term.id))
+        .where(Student.class_id == class_id)
+        .order_by(Student.full_name, Student.id)
+    ).all()
+    bit = 1 << (day - term.start_date).days if day is not None else 0
+    result = []
+    for student, marked, present in rows:
+        marked, present = _int(marked), _int(present)
+        status = bool(present & bit) if marked & bit else None
+        result.append((student, present.bit_count(), marked.bit_count(), status))
+    return result
+
+
+def _lock_class(class_id):
+    """
+    Hold the write lock on the class's attendance until the caller commits, so two
+    markings of the class (say for different days) cannot both read the old
+    bitmaps and each write back only their own day: SQLite locks the database
+    with BEGIN IMMEDIATE, other databases the class's student rows
+    """
+    if db.session.get_bind().dialect.name == 'sqlite':
+        db.session.execute(text('BEGIN IMMEDIATE'))
+    else:
+        db.session.execute(select(Student.id).where(Student.class_id == class_id).with_for_update()).all()
+
+
+def mark_class(term, class_id, day, present_ids):
+    """
+    Record day for every current student of the class: present when their id is
+    in present_ids, absent otherwise. One read and one upsert statement however
+    large the class. Call with no uncommitted writes: the class stays locked until
+    the caller commits. Returns the number of students marked.
+    """
+    index = (day - term.start_date).days
+    if not 0 <= index < term.days:
+        raise ValueError(f'{day:%Y-%m-%d} is not in term {term.name}')
+    bit = 1 << index
+    size = bitmap_size(term.days)
+    present_ids = set(present_ids)
+    now = datetime.utcnow()
+
+    _lock_class(class_id)
+    name = db.session.execute(select(Class.grade, Class.section).where(Class.id == class_id)).first()
+    if name is None:
+        return 0
+    rows = []
+    for student_id, marked, present in db.session.execute(
+        select(Student.id, Attendance.marked, Attendance.present)
+        .outerjoin(Attendance, and_(Attendance.student_id == Student.id, Attendance.term_id == term.id))
+        .where(Student.class_id == class_id)
+    ):
+        marked, present = _int(marked) | bit, _int(present)
+        present = present | bit if student_id in present_ids else present & ~bit
+        rows.append({
+            'term_id': term.id,
+            'student_id': student_id,
+            'class_id': class_id,
+            'grade': name.grade,
+            'section': name.section,
+            'marked': marked.to_bytes(size, 'little'),
+            'present': present.to_bytes(size, 'little'),
+            'updated_at': now,
+        })
+    if rows:
+        upsert = UPSERTS[db.session.get_bind().dialect.name](Attendance.__table__)
+        db.session.execute(upsert.on_conflict_do_update(
+            index_elements=['term_id', 'student_id'],
+            set_={'class_id': upsert.excluded.class_id,
+                  'grade': upsert.excluded.grade,
+                  'section': upsert.excluded.section,
+                  'marked': upsert.excluded.marked,
+                  'present': upsert.excluded.present,
+                  'updated_at': upsert.excluded.updated_at}
+        ), rows)
+    return len(rows)
+
+
+def student_attendance(student_id):
+    """
+    Every term the student has attendance in, newest first:
+    (term, present days, marked days, dates absent)
+    """
+    rows = db.session.execute(
+        select(Term, Attendance.marked, Attendance.present)
+        .join(Attendance, Attendance.term_id == Term.id)
+        .where(Attendance.student_id == student_id)
+        .order_by(Term.start_date.desc())
+    ).all()
+    result = []
+    for term, marked, present in rows:
+        marked, present = _int(marked), _int(present)
+        result.append((term, present.bit_count(), marked.bit_count(), _dates(term, marked & ~present)))
+    return result
+
+
+class TermReport:
+    """
+    Attendance of one term by class, grade and day
+    classes are dicts in grade/section order with the class's students,
+    present and marked student-days and low, the students present on less than
+    threshold of their marked days; grades sum the same per grade. Classes and
+    grades are named as they were when marked, so a term before a promotion
+    still reports its old grades, and current is False for a class that has
+    since been deleted; rows whose class was deleted before names were kept
+    count only towards the totals. daily holds (date, present, marked) for every day anyone
+    was marked.
+    """
+
+    def __init__(self, term, threshold, classes, grades, daily, totals):
+        self.term = term
+        self.threshold = threshold
+        self.classes = classes
+        self.grades = grades
+        self.daily = daily
+        self.totals = totals
+
+
+def _matrix(bitmaps, size):
+    """(students x bytes) matrix of equal-length bitmaps"""
+    return np.frombuffer(b''.join(bitmaps), dtype=np.uint8).reshape(-1, size)
+
+
+def _rate(present, marked):
+    return present / marked if marked else None
+
+
+def _summary(students, present, marked, low):
+    return {'students': students, 'present': present, 'marked': marked, 'low': low,
+            'rate': _rate(present, marked)}
+
+
+def term_report(term, threshold):
+    """Load every bitmap of the term in one query and aggregate them with NumPy"""
+    # Table columns rather than ORM attributes: ORM row processing would double the load time
+    table = Attendance.__table__
+    rows = db.session.execute(
+        select(table.c.class_id, table.c.grade, table.c.section, table.c.marked, table.c.present)
+        .where(table.c.term_id == term.id)
+    ).all()
+    if not rows:
+        return TermReport(term, threshold, [], [], [], _summary(0, 0, 0, 0))
+    class_ids, grade_names, section_names, marked_bitmaps, present_bitmaps = zip(*rows)
+    size = bitmap_size(term.days)
+    marked = _matrix(marked_bitmaps, size)
+    present = _matrix(present_bitmaps, size) & marked
+
+    # Per student: set bits summed over the bytes of each row
+    marked_days = _POPCOUNT[marked].sum(axis=1, dtype=np.int64)
+    present_days = _POPCOUNT[present].sum(axis=1, dtype=np.int64)
+    low = (marked_days > 0) & (present_days < threshold * marked_days)
+
+    # Per day: bits unpacked into a (students x days) matrix and summed down the columns
+    marked_daily = np.unpackbits(marked, axis=1, count=term.days, bitorder='little').sum(axis=0, dtype=np.int64)
+    present_daily = np.unpackbits(present, axis=1, count=term.days, bitorder='little').sum(axis=0, dtype=np.int64)
+    daily = [(term.start_date + timedelta(days=int(d)), int(present_daily[d]), int(marked_daily[d]))
+             for d in np.flatnonzero(marked_daily)]
+
+    # Per class: sums over the students of each class id and name as marked (a
+    # class promoted mid-term shows once per grade it was marked in)
+    keys = {}
+    codes = np.fromiter((keys.setdefault(key, len(keys)) for key in zip(class_ids, grade_names, section_names)),
+                        dtype=np.int64, count=len(rows))
+    by_class = zip(keys,
+                   np.bincount(codes).tolist(),
+                   np.bincount(codes, weights=present_days).astype(np.int64).tolist(),
+                   np.bincount(codes, weights=marked_days).astype(np.int64).tolist(),
+                   np.bincount(codes, weights=low).astype(np.int64).tolist())
+    existing = set(db.session.scalars(select(Class.id)))
+    classes, grades = [], {}
+    for (class_id, grade, section), students, present_sum, marked_sum, low_sum in by_class:
+        if not grade:
+            continue  # marked before names were kept, in a class deleted since
+        classes.append(dict(_summary(students, present_sum, marked_sum, low_sum),
+                            id=class_id, grade=grade, section=section, current=class_id in existing))
+        totals = grades.setdefault(grade, [0, 0, 0, 0])
+        for i, value in enumerate((students, present_sum, marked_sum, low_sum)):
+            totals[i] += value
+    classes.sort(key=lambda row: (_grade_key(row['grade']), row['section']))
+    grades = [dict(_summary(*grades[grade]), grade=grade) for grade in sorted(grades, key=_grade_key)]
+
+    totals = _summary(len(rows), int(present_days.sum()), int(marked_days.sum()), int(low.sum()))
+    return TermReport(term, threshold, classes, grades, daily, totals)
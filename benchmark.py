@@ -0,0 +1,588 @@
+"""
+End-to-end HTTP benchmark suite
+Builds the app with create_app against seeded datasets of several sizes and drives
+every blueprint route through an authenticated test client, reporting throughput,
+p50/p95/p99 latency and SQL queries per route. Endpoints of app.url_map that no
+route reached (and that are not in UNBENCHMARKED) fail the run, so new routes
+cannot be missed.
+
+Examples:
+    python benchmark.py --sizes 1000,20000 --output baseline.json
+    python benchmark.py --sizes 1000,20000 --baseline baseline.json --threshold 0.25
+    python benchmark.py --set LIST_PAGINATION=keyset --set CLASS_COUNTER_CACHE=true
+"""
+import argparse
+import io
+import json
+import math
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+from datetime import date, datetime, timedelta
+from flask import request, request_started
+from sqlalchemy import event, func, select
+from app import create_app
+from config import CONFIGS
+from models import db, User, Student, Teacher, Class, SubjectAssignment, Term
+from generate_data import generate_dataset
+
+ADMIN_USERNAME = 'bench-admin'
+ADMIN_PASSWORD = 'bench-password'
+
+# Rows in each uploaded CSV for the import route
+IMPORT_ROWS = 100
+
+# Days in the seeded attendance term, which ends today
+TERM_DAYS = 120
+
+# Endpoints deliberately left out, with the reason; api.py has its own load test
+UNBENCHMARKED = {
+    'static': 'files served by the web server in production',
+}
+
+
+class Route:
+    """
+    One benchmarked request
+    prepare(bench, i) runs untimed before each request and returns the
+    keyword arguments for the test client (path, data, ...)
+    """
+
+    def __init__(self, name, method, prepare, expect=200, guest=False, weight=1.0):
+        self.name = name
+        self.method = method
+        self.prepare = prepare
+        self.expect = expect
+        self.guest = guest
+        self.weight = weight  # fraction of the iterations to run, for very slow routes
+
+
+def _get(url):
+    return lambda bench, i: {'path': url}
+
+
+def _student_form(bench, i, prefix):
+    return {
+        'student_id': f'{prefix}{bench.run_id}-{i}',
+        'full_name': f'Bench Student {i}',
+        'date_of_birth': '2012-03-04',
+        'email': f'{prefix.lower()}{bench.run_id}-{i}@bench.example.com',
+        'phone': '555-0100',
+        'address': '1 Benchmark Road',
+        'class_id': str(bench.class_id),
+    }
+
+
+def _teacher_form(bench, i, prefix):
+    return {
+        'teacher_id': f'{prefix}{bench.run_id}-{i}',
+        'full_name': f'Bench Teacher {i}',
+        'subject': 'Mathematics',
+        'qualification': 'M.Sc.',
+        'email': f'{prefix.lower()}{bench.run_id}-{i}@bench.example.com',
+        'phone': '555-0200',
+        'joining_date': '2015-08-01',
+    }
+
+
+def _prepare_login(bench, i):
+    bench.guest.get('/auth/logout')
+    return {'path': '/auth/login', 'data': {'username': ADMIN_USERNAME, 'password': ADMIN_PASSWORD}}
+
+
+def _prepare_logout(bench, i):
+    bench.guest.post('/auth/login', data={'username': ADMIN_USERNAME, 'password': ADMIN_PASSWORD})
+    return {'path': '/auth/logout'}
+
+
+def _prepare_login_page(bench, i):
+    bench.guest.get('/auth/logout')
+    return {'path': '/auth/login'}
+
+
+def _prepare_edit_student(bench, i):
+    data = _student_form(bench, i, 'BE')
+    data['student_id'] = bench.student_code
+    data['email'] = ''
+    return {'path': f'/students/{bench.student_id}/edit', 'data': data}
+
+
+def _prepare_edit_teacher(bench, i):
+    data = _teacher_form(bench, i, 'TE')
+    data['teacher_id'] = bench.teacher_code
+    data['email'] = ''
+    return {'path': f'/teachers/{bench.teacher_id}/edit', 'data': data}
+
+
+def _prepare_import(bench, i):
+    lines = ['student_id,full_name,date_of_birth,email,phone,address,class']
+    for row in range(IMPORT_ROWS):
+        lines.append(f'BI{bench.run_id}-{i}-{row},Imported Student {row},2011-01-02,,,,{bench.class_name}')
+    upload = io.BytesIO('\n'.join(lines).encode('utf-8'))
+    return {'path': '/students/import', 'data': {'file': (upload, 'students.csv')},
+            'content_type': 'multipart/form-data'}
+
+
+def _prepare_create_term(bench, i):
+    # Short terms far in the future, so they never overlap the seeded one or each other
+    start = date(2200, 1, 1) + timedelta(days=10 * i)
+    return {'path': '/attendance/terms/create',
+            'data': {'name': f'Bench {bench.run_id}-{i}', 'start_date': start.isoformat(),
+                     'end_date': (start + timedelta(days=4)).isoformat()}}
+
+
+def _prepare_delete_term(bench, i):
+    start = date(1900, 1, 1) + timedelta(days=10 * i)
+    term_id = _insert(bench, Term(name=f'Delete {bench.run_id}-{i}', start_date=start,
+                                  end_date=start + timedelta(days=4)))
+    return {'path': f'/attendance/terms/{term_id}/delete'}
+
+
+def _prepare_mark_class(bench, i):
+    day = date.today() - timedelta(days=i % TERM_DAYS)
+    return {'path': f'/attendance/class/{bench.class_id}',
+            'data': {'day': day.isoformat(), 'present': [str(s) for s in bench.class_students[:-2]]}}
+
+
+def _prepare_bulk(bench, i):
+    # Two students "move" to the class they are in, so runs repeat
+    return {'path': '/students/bulk', 'data': {'scope': 'selected', 'action': 'reassign',
+                                               'class_id': str(bench.class_id),
+                                               'student_ids': [str(s) for s in bench.class_students[:2]]}}
+
+
+def _prepare_bulk_job(bench, i):
+    # Every student of the class "moves" to the class they are in, so runs repeat
+    return {'path': '/students/bulk', 'data': {'scope': 'filtered', 'action': 'reassign',
+                                               'class_id': str(bench.class_id), 'class': str(bench.class_id)}}
+
+
+def _insert(bench, row):
+    """Create a throwaway row for a delete route; returns its primary key"""
+    with bench.app.app_context():
+        db.session.add(row)
+        db.session.commit()
+        return row.id
+
+
+def _prepare_delete_student(bench, i):
+    student_id = _insert(bench, Student(student_id=f'BD{bench.run_id}-{i}', full_name='Delete Me',
+                                        date_of_birth=date(2012, 1, 1), class_id=bench.class_id))
+    return {'path': f'/students/{student_id}/delete'}
+
+
+def _prepare_delete_teacher(bench, i):
+    teacher_id = _insert(bench, Teacher(teacher_id=f'TD{bench.run_id}-{i}', full_name='Delete Me',
+                                        subject='Art', joining_date=date(2015, 1, 1)))
+    return {'path': f'/teachers/{teacher_id}/delete'}
+
+
+def _prepare_delete_class(bench, i):
+    class_id = _insert(bench, Class(grade='99', section=f'D{bench.run_id}-{i}'))
+    return {'path': f'/classes/{class_id}/delete'}
+
+
+def _prepare_delete_assignment(bench, i):
+    assignment_id = _insert(bench, SubjectAssignment(teacher_id=bench.teacher_id, class_id=bench.class_id,
+                                                     subject_name=f'Delete {bench.run_id}-{i}'))
+    return {'path': f'/classes/assignment/{assignment_id}/delete'}
+
+
+ROUTES = [
+    # Authentication (separate, initially anonymous client)
+    Route('auth.login_page', 'GET', _prepare_login_page, guest=True),
+    Route('auth.login', 'POST', _prepare_login, expect=302, guest=True),
+    Route('auth.logout', 'GET', _prepare_logout, expect=302, guest=True),
+
+    # Dashboard
+    Route('dashboard.index', 'GET', _get('/')),
+
+    # Students
+    Route('students.list', 'GET', _get('/students/')),
+    Route('students.list_deep_page', 'GET', lambda bench, i: {'path': f'/students/?page={bench.deep_page}'}),
+    Route('students.list_keyset', 'GET', _get('/students/?paging=keyset')),
+    Route('students.search', 'GET', _get('/students/?search=smith')),
+    Route('students.filter_class', 'GET', lambda bench, i: {'path': f'/students/?class={bench.class_id}'}),
+    Route('students.view', 'GET', lambda bench, i: {'path': f'/students/{bench.student_id}'}),
+    Route('students.create_form', 'GET', _get('/students/create')),
+    Route('students.create', 'POST',
+          lambda bench, i: {'path': '/students/create', 'data': _student_form(bench, i, 'BC')}, expect=302),
+    Route('students.edit_form', 'GET', lambda bench, i: {'path': f'/students/{bench.student_id}/edit'}),
+    Route('students.edit', 'POST', _prepare_edit_student, expect=302),
+    Route('students.delete', 'POST', _prepare_delete_student, expect=302),
+    Route('students.export_class_csv', 'GET',
+          lambda bench, i: {'path': f'/students/export?format=csv&class={bench.class_id}'}),
+    Route('students.export_all_json', 'GET', _get('/students/export?format=json'), weight=0.1),
+    Route('students.import_form', 'GET', _get('/students/import')),
+    Route('students.import', 'POST', _prepare_import, expect=302, weight=0.2),
+    Route('students.bulk', 'POST', _prepare_bulk, expect=302),
+    Route('students.export_job', 'GET',
+          lambda bench, i: {'path': f'/students/export?format=csv&class={bench.class_id}&background=1'}, expect=302),
+    Route('students.bulk_job', 'POST', _prepare_bulk_job, expect=302, weight=0.2),
+
+    # Teachers
+    Route('teachers.list', 'GET', _get('/teachers/')),
+    Route('teachers.search', 'GET', _get('/teachers/?search=math')),
+    Route('teachers.view', 'GET', lambda bench, i: {'path': f'/teachers/{bench.teacher_id}'}),
+    Route('teachers.create_form', 'GET', _get('/teachers/create')),
+    Route('teachers.create', 'POST',
+          lambda bench, i: {'path': '/teachers/create', 'data': _teacher_form(bench, i, 'TC')}, expect=302),
+    Route('teachers.edit_form', 'GET', lambda bench, i: {'path': f'/teachers/{bench.teacher_id}/edit'}),
+    Route('teachers.edit', 'POST', _prepare_edit_teacher, expect=302),
+    Route('teachers.delete', 'POST', _prepare_delete_teacher, expect=302),
+    Route('teachers.export_csv', 'GET', _get('/teachers/export?format=csv'), weight=0.2),
+
+    # Classes and subject assignments
+    Route('classes.list', 'GET', _get('/classes/')),
+    Route('classes.view', 'GET', lambda bench, i: {'path': f'/classes/{bench.class_id}'}),
+    Route('classes.create_form', 'GET', _get('/classes/create')),
+    Route('classes.create', 'POST',
+          lambda bench, i: {'path': '/classes/create',
+                            'data': {'grade': '98', 'section': f'C{bench.run_id}-{i}'}}, expect=302),
+    Route('classes.delete', 'POST', _prepare_delete_class, expect=302),
+    Route('classes.assign_form', 'GET', _get('/classes/assign-subject')),
+    Route('classes.assign', 'POST',
+          lambda bench, i: {'path': '/classes/assign-subject',
+                            'data': {'teacher_id': str(bench.teacher_id), 'class_id': str(bench.class_id),
+                                     'subject_name': f'Bench {bench.run_id}-{i}'}}, expect=302),
+    Route('classes.delete_assignment', 'POST', _prepare_delete_assignment, expect=302),
+    Route('classes.staffing', 'GET', _get('/classes/staffing')),
+    Route('classes.staffing_json', 'GET', _get('/classes/staffing.json')),
+    Route('classes.promote_form', 'GET', _get('/classes/promote')),
+
+    # Background jobs (run inline by the benchmark config, so these finished)
+    Route('jobs.list', 'GET', _get('/jobs/')),
+    Route('jobs.view', 'GET', lambda bench, i: {'path': f'/jobs/{bench.job_id}'}),
+    Route('jobs.status', 'GET', lambda bench, i: {'path': f'/jobs/{bench.job_id}/status'}),
+    Route('jobs.download', 'GET', lambda bench, i: {'path': f'/jobs/{bench.job_id}/download'}),
+
+    # Reports (summary tables only)
+    Route('reports.index', 'GET', _get('/reports/')),
+
+    # Timetable
+    Route('timetable.index', 'GET', _get('/timetable/')),
+    Route('timetable.generate', 'POST',
+          lambda bench, i: {'path': '/timetable/', 'data': {'mode': 'incremental' if i % 2 else 'full'}},
+          expect=302, weight=0.2),
+    Route('timetable.class', 'GET', lambda bench, i: {'path': f'/timetable/class/{bench.class_id}'}),
+    Route('timetable.teacher', 'GET', lambda bench, i: {'path': f'/timetable/teacher/{bench.teacher_id}'}),
+
+    # Attendance
+    Route('attendance.index', 'GET', _get('/attendance/')),
+    Route('attendance.class', 'GET', lambda bench, i: {'path': f'/attendance/class/{bench.class_id}'}),
+    Route('attendance.student', 'GET', lambda bench, i: {'path': f'/attendance/student/{bench.student_id}'}),
+    Route('attendance.mark', 'POST', _prepare_mark_class, expect=302),
+    Route('attendance.report', 'GET', lambda bench, i: {'path': f'/attendance/report?term={bench.term_id}'}),
+    Route('attendance.report_grade', 'GET',
+          lambda bench, i: {'path': f'/attendance/report?term={bench.term_id}&grade={bench.class_grade}'}),
+    Route('attendance.create_term_form', 'GET', _get('/attendance/terms/create')),
+    Route('attendance.create_term', 'POST', _prepare_create_term, expect=302),
+    Route('attendance.delete_term', 'POST', _prepare_delete_term, expect=302),
+
+    # Monitoring
+    Route('metrics', 'GET',
+          lambda bench, i: {'path': '/metrics', 'headers': {'Authorization': f'Bearer {bench.app.config["METRICS_TOKEN"]}'}}),
+
+    # Last: every class moves up a grade on each run. No dataset class graduates
+    # below grade 99, but class names and grades differ from here on
+    Route('classes.promote', 'POST', lambda bench, i: {'path': '/classes/promote', 'data': {'top_grade': '99'}},
+          expect=302, weight=0.2),
+]
+
+
+class Bench:
+    """An app built against one seeded dataset, with logged-in and guest clients"""
+
+    def __init__(self, app):
+        self.app = app
+        self.run_id = int(time.time()) % 100000
+        self.queries = 0
+        self.timing = False
+        self.covered = set()  # (endpoint, method) reached by timed requests
+        request_started.connect(self._record_endpoint, app)
+
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', self._count_query)
+
+            # The busiest class gives the heaviest class view and filter
+            class_id = db.session.scalar(
+                select(Student.class_id).where(Student.class_id.isnot(None))
+                .group_by(Student.class_id).order_by(func.count().desc()).limit(1)
+            )
+            class_obj = db.session.get(Class, class_id)
+            self.class_id = class_obj.id
+            self.class_name = class_obj.get_display_name()
+            self.class_grade = class_obj.grade
+            self.class_students = db.session.scalars(select(Student.id).where(Student.class_id == class_id)).all()
+
+            student = db.session.scalars(select(Student).order_by(Student.id).limit(1)).one()
+            self.student_id, self.student_code = student.id, student.student_id
+            teacher = db.session.scalars(select(Teacher).order_by(Teacher.id).limit(1)).one()
+            self.teacher_id, self.teacher_code = teacher.id, teacher.teacher_id
+
+            # Half way through the offset pages
+            self.deep_page = max(1, db.session.scalar(select(func.count(Student.id))) // 20)
+
+            # A term of attendance up to today, so the report has every student to count
+            from benchmark_attendance import fill_term  # it imports this module
+            term = Term(name=f'Benchmark {self.run_id}', start_date=date.today() - timedelta(days=TERM_DAYS - 1),
+                        end_date=date.today())
+            db.session.add(term)
+            db.session.commit()
+            fill_term(term, np.random.default_rng(self.run_id), 0.06)
+            self.term_id = term.id
+
+        self.client = app.test_client()
+        self.guest = app.test_client()
+        response = self.client.post('/auth/login', data={'username': ADMIN_USERNAME, 'password': ADMIN_PASSWORD})
+        if response.status_code != 302:
+            raise RuntimeError('Benchmark admin could not log in')
+
+        # A finished export job for the job pages and its download
+        response = self.client.get(f'/students/export?format=csv&class={self.class_id}&background=1')
+        self.job_id = int(response.headers['Location'].rstrip('/').rsplit('/', 1)[1])
+
+    def _count_query(self, conn, cursor, statement, parameters, context, executemany):
+        self.queries += 1
+
+    def _record_endpoint(self, sender, **extra):
+        if self.timing and request.endpoint:
+            self.covered.add((request.endpoint, request.method))
+
+    def uncovered(self):
+        """(endpoint, method) pairs of app.url_map that no timed request reached"""
+        expected = {(rule.endpoint, method) for rule in self.app.url_map.iter_rules()
+                    if rule.endpoint not in UNBENCHMARKED
+                    for method in rule.methods - {'HEAD', 'OPTIONS'}}
+        return sorted(expected - self.covered)
+
+    def run(self, route, iterations, warmup):
+        """Time one route; returns its summary"""
+        client = self.guest if route.guest else self.client
+        count = max(1, math.ceil(iterations * route.weight))
+        latencies, queries, errors = [], [], 0
+
+        for i in range(warmup + count):
+            options = route.prepare(self, i)
+            self.queries = 0
+            self.timing = True
+            started = time.perf_counter()
+            response = client.open(method=route.method, **options)
+            response.get_data()
+            elapsed = time.perf_counter() - started
+            self.timing = False
+            query_count = self.queries
+            response.close()
+
+            if i < warmup:
+                continue
+            latencies.append(elapsed)
+            queries.append(query_count)
+            if response.status_code != route.expect:
+                errors += 1
+
+        return summarize(latencies, queries, errors)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sorted list"""
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(pct / 100 * len(values)) - 1)]
+
+
+def summarize(latencies, queries, errors):
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / total, 1) if total else 0.0,
+        'mean_ms': round(total / len(latencies) * 1000, 3),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'queries_per_request': round(sum(queries) / len(queries), 2),
+        'max_queries': max(queries),
+    }
+
+
+def dataset_shape(students):
+    """Teachers, classes and assignments that go with a student count"""
+    return {
+        'students': students,
+        'teachers': max(10, students // 50),
+        'classes': max(12, students // 40),
+        'assignments_per_class': 5,
+    }
+
+
+def build_app(database_path, overrides, profile='default'):
+    """Create the app against a fresh database with a benchmark admin"""
+
+    class BenchmarkConfig(CONFIGS[profile]):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{database_path}'
+        WTF_CSRF_ENABLED = False
+        SECRET_KEY = 'benchmark'
+        REQUEST_TIMING_SAMPLE_RATE = 0.0  # keep timing log lines out of the report
+        JOBS_MAX_WORKERS = 0  # run jobs inside the timed request
+        JOBS_DIR = os.path.join(os.path.dirname(database_path), 'jobs')
+        METRICS_TOKEN = 'bench-metrics'
+
+    for key, value in overrides.items():
+        setattr(BenchmarkConfig, key, value)
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        admin = User(username=ADMIN_USERNAME, email='bench-admin@bench.example.com', role='Admin')
+        admin.set_password(ADMIN_PASSWORD)
+        db.session.add(admin)
+        db.session.commit()
+    return app
+
+
+def run_size(students, routes, iterations, warmup, overrides, seed, profile='default', report=print):
+    """Seed a temporary database of the given size and benchmark every route"""
+    workdir = tempfile.mkdtemp(prefix='school-bench-')
+    try:
+        app = build_app(os.path.join(workdir, 'bench.db'), overrides, profile)
+        shape = dataset_shape(students)
+        started = time.perf_counter()
+        with app.app_context():
+            generate_dataset(seed=seed, report=None, **shape)
+        report(f'Seeded {students} students in {time.perf_counter() - started:.1f}s')
+
+        bench = Bench(app)
+        report(HEADER)
+        results = {}
+        for route in routes:
+            results[route.name] = bench.run(route, iterations, warmup)
+            report(format_row(route.name, results[route.name]))
+        uncovered = bench.uncovered()
+
+        with app.app_context():
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+        return {'dataset': shape, 'routes': results, 'uncovered': uncovered}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+HEADER = f'{"route":<30} {"req/s":>9} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"queries":>8} {"errors":>7}'
+
+
+def format_row(name, result):
+    return (f'{name:<30} {result["throughput_rps"]:>9.1f} {result["p50_ms"]:>9.2f} {result["p95_ms"]:>9.2f} '
+            f'{result["p99_ms"]:>9.2f} {result["queries_per_request"]:>8.1f} {result["errors"]:>7}')
+
+
+def compare(current, baseline, metric, threshold, min_delta_ms):
+    """
+    List regressions of current against baseline results: a route whose latency
+    metric grew by more than threshold (and min_delta_ms), or that issues more queries
+    """
+    regressions = []
+    for size, sized in current['sizes'].items():
+        base_routes = baseline.get('sizes', {}).get(size, {}).get('routes', {})
+        for name, result in sized['routes'].items():
+            base = base_routes.get(name)
+            if base is None:
+                continue
+            now, before = result[metric], base[metric]
+            if now > before * (1 + threshold) and now - before > min_delta_ms:
+                regressions.append(f'{size} {name}: {metric} {before:.2f} -> {now:.2f} ms '
+                                   f'(+{(now / before - 1) * 100 if before else math.inf:.0f}%)')
+            if result['max_queries'] > base['max_queries']:
+                regressions.append(f'{size} {name}: queries {base["max_queries"]} -> {result["max_queries"]}')
+    return regressions
+
+
+def parse_overrides(pairs):
+    """KEY=VALUE config overrides; values are read as JSON when possible"""
+    overrides = {}
+    for pair in pairs:
+        key, _, value = pair.partition('=')
+        try:
+            overrides[key] = json.loads(value)
+        except ValueError:
+            overrides[key] = value
+    return overrides
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark every route against seeded datasets.')
+    parser.add_argument('--sizes', default='1000,10000', help='Comma separated student counts.')
+    parser.add_argument('--iterations', type=int, default=50, help='Timed requests per route.')
+    parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per route.')
+    parser.add_argument('--routes', help='Only run routes whose name starts with one of these (comma separated).')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--profile', default='default', choices=sorted(CONFIGS),
+                        help='Config profile to start from (see config.CONFIGS).')
+    parser.add_argument('--set', dest='overrides', action='append', default=[], metavar='KEY=VALUE',
+                        help='Override a config setting, e.g. LIST_PAGINATION=keyset.')
+    parser.add_argument('--output', help='Write the results as JSON to this file.')
+    parser.add_argument('--baseline', help='Fail if any route regressed against these stored results.')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed slowdown, as a fraction.')
+    parser.add_argument('--metric', default='p50_ms', choices=['p50_ms', 'p95_ms', 'p99_ms', 'mean_ms'])
+    parser.add_argument('--min-delta-ms', type=float, default=0.5,
+                        help='Ignore slowdowns smaller than this, to keep fast routes from flapping.')
+    args = parser.parse_args()
+
+    routes = ROUTES
+    if args.routes:
+        prefixes = tuple(args.routes.split(','))
+        routes = [route for route in ROUTES if route.name.startswith(prefixes)]
+    overrides = parse_overrides(args.overrides)
+
+    results = {
+        'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'iterations': args.iterations,
+        'profile': args.profile,
+        'config': overrides,
+        'sizes': {},
+    }
+    for students in (int(size) for size in args.sizes.split(',')):
+        print(f'\n== {students} students ==')
+        results['sizes'][str(students)] = run_size(
+            students, routes, args.iterations, args.warmup, overrides, args.seed, args.profile
+        )
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+        print(f'\nResults written to {args.output}')
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline, args.metric, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f'\n{len(regressions)} regressions against {args.baseline}:')
+            for line in regressions:
+                print(f'  {line}')
+            sys.exit(1)
+        print(f'\nNo regressions against {args.baseline}.')
+
+    # Only the full route list has to reach every endpoint
+    uncovered = [] if args.routes else sorted({
+        f'{method} {endpoint}' for sized in results['sizes'].values() for endpoint, method in sized['uncovered']
+    })
+    if uncovered:
+        print(f'\nEndpoints no route benchmarks (add a Route or list them in UNBENCHMARKED): '
+              f'{", ".join(uncovered)}')
+        sys.exit(2)
+
+    if any(result['errors'] for sized in results['sizes'].values() for result in sized['routes'].values()):
+        print('\nSome requests returned an unexpected status (see the errors column).')
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Attendance benchmark
+Generates a district per size and a term of attendance bitmaps, then times
+marking whole classes and the term report, checking the report's totals
+against a plain Python count of the same bitmaps.
+
+    python benchmark_attendance.py --students 50000,500000
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+import numpy as np
+from sqlalchemy import insert, select
+from benchmark import build_app, dataset_shape
+from generate_data import generate_dataset
+from models import db, Student, Class, Term, Attendance
+from attendance import bitmap_size, mark_class, term_report
+
+
+def fill_term(term, rng, absence, batch_size=50000):
+    """Random bitmaps for every student: weekdays marked, each absent with probability absence"""
+    days = np.arange(term.days)
+    weekdays = np.array([(term.start_date + timedelta(days=int(d))).weekday() < 5 for d in days])
+    students = db.session.execute(
+        select(Student.id, Student.class_id, Class.grade, Class.section).join(Class, Student.class_id == Class.id)
+    ).all()
+    now = datetime.utcnow()
+    for begin in range(0, len(students), batch_size):
+        batch = students[begin:begin + batch_size]
+        marked = np.broadcast_to(weekdays, (len(batch), term.days))
+        present = marked & (rng.random((len(batch), term.days)) >= absence)
+        marked = np.packbits(marked, axis=1, bitorder='little')
+        present = np.packbits(present, axis=1, bitorder='little')
+        db.session.execute(insert(Attendance.__table__), [
+            {'term_id': term.id, 'student_id': student_id, 'class_id': class_id, 'grade': grade, 'section': section,
+             'marked': m.tobytes(), 'present': p.tobytes(), 'updated_at': now}
+            for (student_id, class_id, grade, section), m, p in zip(batch, marked, present)
+        ])
+        db.session.commit()
+    return len(students)
+
+
+def check(term, report):
+    """Totals counted bitmap by bitmap with Python integers; True when they match the report"""
+    present = marked = 0
+    for m, p in db.session.execute(select(Attendance.marked, Attendance.present).where(Attendance.term_id == term.id)):
+        m = int.from_bytes(m, 'little')
+        marked += m.bit_count()
+        present += (int.from_bytes(p, 'little') & m).bit_count()
+    return (present, marked) == (report.totals['present'], report.totals['marked'])
+
+
+def run(students, args):
+    workdir = tempfile.mkdtemp(prefix='school-attendance-')
+    try:
+        app = build_app(os.path.join(workdir, 'attendance.db'), {})
+        rng = np.random.default_rng(args.seed)
+        with app.app_context():
+            shape = dataset_shape(students)
+            shape['assignments_per_class'] = 0
+            generate_dataset(seed=args.seed, report=None, **shape)
+            start = date(2026, 1, 5)
+            term = Term(name='Benchmark', start_date=start, end_date=start + timedelta(days=args.days - 1))
+            db.session.add(term)
+            db.session.commit()
+
+            started = time.perf_counter()
+            filled = fill_term(term, rng, args.absence)
+            fill_seconds = time.perf_counter() - started
+
+            # Whole-class marking as a teacher would do it, each a read, an upsert and a commit
+            picker = random.Random(args.seed)
+            class_ids = db.session.scalars(select(Class.id)).all()
+            timings = []
+            for _ in range(args.marks):
+                class_id = picker.choice(class_ids)
+                present = db.session.scalars(select(Student.id).where(Student.class_id == class_id)).all()
+                day = term.start_date + timedelta(days=picker.randrange(term.days))
+                started = time.perf_counter()
+                mark_class(term, class_id, day, present[:-2])
+                db.session.commit()
+                timings.append((time.perf_counter() - started) * 1000)
+
+            reports = []
+            for _ in range(args.repeat):
+                db.session.expire_all()
+                started = time.perf_counter()
+                report = term_report(term, 0.9)
+                reports.append(time.perf_counter() - started)
+            matches = check(term, report)
+
+            size = bitmap_size(term.days) * 2
+            print(f'{students:>9}{len(class_ids):>8}{filled:>9}{size:>7}{fill_seconds:>8.1f}'
+                  f'{statistics.median(timings):>9.1f}{max(timings):>9.1f}'
+                  f'{statistics.median(reports):>10.2f}{report.totals["rate"]:>8.1%}{str(matches):>7}')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time class marking and term reports on generated attendance.')
+    parser.add_argument('--students', default='50000,500000', help='Comma separated student counts.')
+    parser.add_argument('--days', type=int, default=120, help='Calendar days in the term.')
+    parser.add_argument('--absence', type=float, default=0.06, help='Chance a student misses a school day.')
+    parser.add_argument('--marks', type=int, default=50, help='Whole-class markings to time.')
+    parser.add_argument('--repeat', type=int, default=3, help='Term reports to time.')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    print(f'{args.days}-day term, weekdays marked, {args.absence:.0%} absence')
+    print(f'{"students":>9}{"classes":>8}{"records":>9}{"bytes":>7}{"fill s":>8}'
+          f'{"mark ms":>9}{"max ms":>9}{"report s":>10}{"rate":>8}{"check":>7}')
+    for students in [int(s) for s in args.students.split(',')]:
+        run(students, args)
+    print('bytes: both bitmaps of one student for the term; mark: one whole class for one day')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Timetable solver benchmark
+Generates a district per size, blocks a share of every teacher's periods, then
+times a full solve and a series of incremental re-solves after single
+assignment changes, checking every result for double bookings.
+
+    python benchmark_timetable.py --classes 50,500,2000 --changes 20
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from sqlalchemy import bindparam, select, update
+from benchmark import build_app, dataset_shape
+from generate_data import generate_dataset
+from models import db, Teacher, SubjectAssignment
+from timetable import generate_timetable
+
+
+def block_periods(rng, share, slot_count):
+    """Mark about share of each teacher's periods unavailable"""
+    teachers = db.session.scalars(select(Teacher.id)).all()
+    params = [{'teacher_pk': teacher_id,
+               'mask': sum(1 << slot for slot in range(slot_count) if rng.random() < share)}
+              for teacher_id in teachers]
+    db.session.execute(
+        update(Teacher.__table__).where(Teacher.__table__.c.id == bindparam('teacher_pk'))
+        .values(unavailable_slots=bindparam('mask')),
+        params
+    )
+    db.session.commit()
+    return teachers
+
+
+def check():
+    """
+    Booked periods that clash in the saved timetable, read straight from the rows
+    rather than through load_timetable (which drops clashing lessons as it loads):
+    a teacher or class booked twice, or a teacher booked while unavailable
+    """
+    blocked = dict(db.session.execute(select(Teacher.id, Teacher.unavailable_slots)).all())
+    teacher_busy, class_busy = {}, {}
+    clashes = 0
+    for teacher_id, class_id, slots in db.session.execute(
+        select(SubjectAssignment.teacher_id, SubjectAssignment.class_id, SubjectAssignment.timetable_slots)
+    ):
+        slots = slots or 0
+        teacher, klass = teacher_busy.get(teacher_id, 0), class_busy.get(class_id, 0)
+        clashes += (slots & (teacher | klass | (blocked.get(teacher_id) or 0))).bit_count()
+        teacher_busy[teacher_id] = teacher | slots
+        class_busy[class_id] = klass | slots
+    return clashes
+
+
+def run(classes, args):
+    workdir = tempfile.mkdtemp(prefix='school-timetable-')
+    try:
+        app = build_app(os.path.join(workdir, 'timetable.db'), {})
+        config = app.config
+        config['TIMETABLE_DEFAULT_PERIODS'] = args.periods
+        rng = random.Random(args.seed)
+        with app.app_context():
+            shape = dataset_shape(classes * 40)
+            shape['assignments_per_class'] = args.assignments
+            generate_dataset(seed=args.seed, report=None, **shape)
+            teachers = block_periods(rng, args.unavailable,
+                                     config['TIMETABLE_DAYS'] * config['TIMETABLE_PERIODS_PER_DAY'])
+
+            full = generate_timetable(config)
+            clashes = check()
+            print(f'{classes:>8}{len(teachers):>9}{full["lessons"]:>9}{full["unplaced"]:>10}'
+                  f'{full["over_capacity"]:>10}{full["load_seconds"]:>8.2f}{full["solve_seconds"]:>8.2f}'
+                  f'{full["save_seconds"]:>8.2f}{clashes:>9}', end='')
+
+            # One assignment at a time moves to another teacher, as an admin edit would
+            assignment_ids = db.session.scalars(select(SubjectAssignment.id)).all()
+            timings, moved = [], []
+            for _ in range(args.changes):
+                assignment = db.session.get(SubjectAssignment, rng.choice(assignment_ids))
+                assignment.teacher_id = rng.choice(teachers)
+                try:
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()  # that teacher already teaches the subject there
+                    continue
+                started = time.perf_counter()
+                summary = generate_timetable(config, incremental=True, assignment_ids=[assignment.id])
+                timings.append((time.perf_counter() - started) * 1000)
+                moved.append(summary['assignments_written'])
+            clashes = check()
+            if timings:
+                print(f'{statistics.median(timings):>10.1f}{max(timings):>10.1f}'
+                      f'{statistics.median(moved):>8.0f}{clashes:>9}')
+            else:
+                print()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time full and incremental timetable solves on generated data.')
+    parser.add_argument('--classes', default='50,500,2000', help='Comma separated class counts.')
+    parser.add_argument('--assignments', type=int, default=5, help='Subject assignments per class.')
+    parser.add_argument('--periods', type=int, default=4, help='Lessons a week per assignment.')
+    parser.add_argument('--unavailable', type=float, default=0.1, help='Share of each teacher\'s periods blocked.')
+    parser.add_argument('--changes', type=int, default=20, help='Single-assignment changes to re-solve.')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    print(f'{args.assignments} assignments per class, {args.periods} lessons each, '
+          f'{args.unavailable:.0%} of teacher periods blocked')
+    print(f'{"classes":>8}{"teachers":>9}{"lessons":>9}{"unplaced":>10}{"capacity":>10}'
+          f'{"load s":>8}{"solve s":>8}{"save s":>8}{"clashes":>9}'
+          f'{"incr ms":>10}{"max ms":>10}{"moved":>8}{"clashes":>9}')
+    for classes in [int(c) for c in args.classes.split(',')]:
+        run(classes, args)
+    print('capacity: lessons no timetable can place, because a teacher or class needs more '
+          'lessons than it has available periods')
+
+
+if __name__ == '__main__':
+    main()
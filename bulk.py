@@ -0,0 +1,119 @@
+"""
+Set-based bulk operations
+Each operation runs a fixed number of statements however many rows it touches;
+callers commit, so every operation is a single transaction
+"""
+from datetime import datetime
+from sqlalchemy import case, delete, func, select, update
+from models import db, Student, Class, SubjectAssignment, Attendance
+from counters import refresh_class_counters
+from summaries import rebuild_summaries, refresh_summaries
+
+# Nothing these operations change is loaded in the session, so the identity map is
+# not synchronized: 'fetch' would add a query and 'evaluate' cannot handle subqueries
+NO_SYNC = {'synchronize_session': False}
+
+
+def _affected_classes(where):
+    """Classes of the students matching where, for refreshing their counters"""
+    return set(db.session.scalars(select(Student.class_id).where(where).distinct())) - {None}
+
+
+def delete_students(criteria):
+    """
+    Delete students by a list of ids or a select() of Student.id.
+    Returns the number of students deleted.
+    """
+    where = Student.id.in_(criteria)
+    class_ids = _affected_classes(where)
+    db.session.execute(delete(Attendance).where(Attendance.student_id.in_(criteria)).execution_options(**NO_SYNC))
+    deleted = db.session.execute(delete(Student).where(where).execution_options(**NO_SYNC)).rowcount
+    if class_ids:
+        refresh_class_counters(class_ids=class_ids)
+        refresh_summaries(class_ids=class_ids)
+    return deleted
+
+
+def reassign_students(criteria, class_id):
+    """
+    Move students (a list of ids or a select() of Student.id) to another class,
+    or to no class when class_id is None. Returns the number of students moved.
+    """
+    where = Student.id.in_(criteria)
+    class_ids = _affected_classes(where)
+    moved = db.session.execute(
+        update(Student).where(where)
+        .values(class_id=class_id, updated_at=datetime.utcnow())
+        .execution_options(**NO_SYNC)
+    ).rowcount
+    if class_id is not None:
+        class_ids.add(class_id)
+    if class_ids:
+        refresh_class_counters(class_ids=class_ids)
+        refresh_summaries(class_ids=class_ids)
+    return moved
+
+
+def promotion_plan(top_grade=12):
+    """
+    What promote_classes would do: ({grade: classes}, graduating classes,
+    graduating students). Non-numeric grades are left alone.
+    """
+    classes_by_grade = dict(db.session.execute(
+        select(Class.grade, func.count()).group_by(Class.grade)
+    ).all())
+    graduating = [grade for grade in classes_by_grade if grade.isdigit() and int(grade) >= top_grade]
+    students = 0
+    if graduating:
+        students = db.session.scalar(
+            select(func.count(Student.id)).join(Class, Student.class_id == Class.id)
+            .where(Class.grade.in_(graduating))
+        )
+    return classes_by_grade, sum(classes_by_grade[grade] for grade in graduating), students
+
+
+def promote_classes(top_grade=12):
+    """
+    Move every class with a numeric grade up one grade.
+    Classes already at top_grade graduate: their students are left without a class
+    and the classes are removed with their subject assignments.
+    Returns (classes promoted, classes graduated, students released).
+    """
+    grades = [grade for grade in db.session.scalars(select(Class.grade).distinct()) if grade.isdigit()]
+    graduating = [grade for grade in grades if int(grade) >= top_grade]
+    promoting = {grade: str(int(grade) + 1) for grade in grades if int(grade) < top_grade}
+
+    released = graduated = 0
+    if graduating:
+        graduating_ids = select(Class.id).where(Class.grade.in_(graduating))
+        released = db.session.execute(
+            update(Student).where(Student.class_id.in_(graduating_ids))
+            .values(class_id=None, updated_at=datetime.utcnow())
+            .execution_options(**NO_SYNC)
+        ).rowcount
+        db.session.execute(
+            delete(SubjectAssignment).where(SubjectAssignment.class_id.in_(graduating_ids))
+            .execution_options(**NO_SYNC)
+        )
+        graduated = db.session.execute(
+            delete(Class).where(Class.grade.in_(graduating)).execution_options(**NO_SYNC)
+        ).rowcount
+
+    promoted = 0
+    if promoting:
+        # Two passes: shifting in place would collide with the unique grade/section
+        # of the class one grade up before that class has moved itself
+        marked = {f'+{grade}': new_grade for grade, new_grade in promoting.items()}
+        db.session.execute(
+            update(Class).where(Class.grade.in_(list(promoting)))
+            .values(grade='+' + Class.grade)
+            .execution_options(**NO_SYNC)
+        )
+        promoted = db.session.execute(
+            update(Class).where(Class.grade.in_(list(marked)))
+            .values(grade=case(marked, value=Class.grade))
+            .execution_options(**NO_SYNC)
+        ).rowcount
+    # Every class changed grade or went away
+    rebuild_summaries()
+    return promoted, graduated, released
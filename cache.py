@@ -0,0 +1,219 @@
+"""
+Caching helpers
+Pluggable cache backends and commit-driven invalidation by table name or row
+"""
+import threading
+import time
+from collections import OrderedDict
+from blinker import Namespace
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from werkzeug.utils import import_string
+
+_signals = Namespace()
+
+# Sent after a successful commit with tables=frozenset of changed table names
+tables_committed = _signals.signal('tables-committed')
+
+# Sent after a successful commit with rows=frozenset of (table, primary key) written
+# by flushes, and bulk=frozenset of tables changed by statements with unknown rows
+rows_committed = _signals.signal('rows-committed')
+
+
+class LRUBackend:
+    """
+    Thread-safe in-process LRU cache with an optional TTL in seconds
+    """
+
+    def __init__(self, max_size=256, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class NullBackend:
+    """Backend that never stores anything, for disabling a cache"""
+
+    def __init__(self, **options):
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        self.misses += 1
+        return default
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+BACKENDS = {'lru': LRUBackend, 'null': NullBackend}
+
+
+def make_backend(name, **options):
+    """Build a backend by short name ('lru', 'null') or import path ('pkg.module:Class')"""
+    backend_class = BACKENDS.get(name) or import_string(name)
+    return backend_class(**options)
+
+
+class TableCache:
+    """
+    Cache whose entries declare the tables they are computed from
+    Entries are dropped when a commit changes any of those tables
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._keys_by_table = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        tables_committed.connect(self._on_commit, weak=False)
+
+    def get_or_set(self, key, tables, factory):
+        """Return the cached value for key, computing and storing it on a miss"""
+        missing = object()
+        value = self.backend.get(key, missing)
+        if value is missing:
+            generation = self._generation
+            value = factory()
+            with self._lock:
+                # Skip storing if a commit invalidated entries while computing
+                if generation != self._generation:
+                    return value
+                for table in tables:
+                    self._keys_by_table.setdefault(table, set()).add(key)
+                self.backend.set(key, value)
+        return value
+
+    def invalidate(self, tables):
+        """Drop every entry computed from any of the given tables"""
+        with self._lock:
+            self._generation += 1
+            keys = set()
+            for table in tables:
+                keys.update(self._keys_by_table.pop(table, ()))
+        for key in keys:
+            self.backend.delete(key)
+
+    def _on_commit(self, sender, tables):
+        self.invalidate(tables)
+
+
+def init_stats_cache(app):
+    """Create the statistics cache used by the dashboard"""
+    backend = make_backend(
+        app.config['STATS_CACHE_BACKEND'],
+        max_size=app.config['STATS_CACHE_SIZE'],
+        ttl=app.config['STATS_CACHE_TTL']
+    )
+    app.extensions['stats_cache'] = TableCache(backend)
+
+
+# Change tracking: remember which tables and rows a session wrote to, announce them on commit
+
+def changed_tables(session):
+    """Names of the tables written in the session's current transaction"""
+    return session.info.setdefault('changed_tables', set())
+
+
+def changed_rows(session):
+    """(table, primary key) of the rows flushed in the session's current transaction"""
+    return session.info.setdefault('changed_rows', set())
+
+
+def bulk_tables(session):
+    """Tables changed by bulk statements, whose rows are not known individually"""
+    return session.info.setdefault('bulk_tables', set())
+
+
+def _row_tags(obj):
+    """
+    The row itself plus every row it references, before and after the flush:
+    a student moving classes changes the pages of both classes
+    """
+    state = inspect(obj)
+    table = obj.__table__
+    tags = {(table.name, state.mapper.primary_key_from_instance(obj)[0])}
+    for column in table.columns:
+        for foreign_key in column.foreign_keys:
+            history = state.attrs[state.mapper.get_property_by_column(column).key].history
+            for value in history.sum():
+                if value is not None:
+                    tags.add((foreign_key.column.table.name, value))
+    return tags
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_flush(session, flush_context):
+    changed = changed_tables(session)
+    rows = changed_rows(session)
+    for obj in session.new | session.deleted:
+        changed.add(obj.__table__.name)
+        rows.update(_row_tags(obj))
+    for obj in session.dirty:
+        if session.is_modified(obj, include_collections=False):
+            changed.add(obj.__table__.name)
+            rows.update(_row_tags(obj))
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _track_statement(orm_execute_state):
+    # Bulk INSERT/UPDATE/DELETE statements bypass the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if table is not None and getattr(table, 'name', None):
+            changed_tables(orm_execute_state.session).add(table.name)
+            bulk_tables(orm_execute_state.session).add(table.name)
+
+
+@event.listens_for(Session, 'after_commit')
+def _announce_commit(session):
+    changed = session.info.pop('changed_tables', None)
+    rows = session.info.pop('changed_rows', None)
+    bulk = session.info.pop('bulk_tables', None)
+    if changed:
+        tables_committed.send(session, tables=frozenset(changed))
+    if rows or bulk:
+        rows_committed.send(session, rows=frozenset(rows or ()), bulk=frozenset(bulk or ()))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    for key in ('changed_tables', 'changed_rows', 'bulk_tables'):
+        session.info.pop(key, None)
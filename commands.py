@@ -0,0 +1,84 @@
+"""
+Command line maintenance tasks
+Run with: flask --app app <command>
+"""
+import click
+from models import db
+from counters import refresh_class_counters
+from summaries import rebuild_summaries
+from timetable import generate_timetable
+from importer import import_students
+
+
+def register_commands(app):
+    """Attach the maintenance commands to the app's CLI"""
+
+    @app.cli.command('repair-counters')
+    def repair_counters():
+        """Recompute the cached student and assignment counts of every class"""
+        refreshed = refresh_class_counters()
+        db.session.commit()
+        click.echo(f'Recomputed counters for {refreshed} classes.')
+    
+    @app.cli.command('rebuild-summaries')
+    def rebuild_summaries_command():
+        """Recompute the class_stats and teacher_load report tables from scratch"""
+        classes, teachers = rebuild_summaries()
+        db.session.commit()
+        click.echo(f'Rebuilt summaries for {classes} classes and {teachers} teachers.')
+
+    @app.cli.command('import-students')
+    @click.argument('csv_path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--batch-size', default=None, type=int, help='Rows per insert batch.')
+    def import_students_command(csv_path, batch_size):
+        """Bulk import students from a CSV file"""
+        with open(csv_path, encoding='utf-8-sig', newline='') as csv_file:
+            report = import_students(csv_file, batch_size=batch_size or app.config['IMPORT_BATCH_SIZE'])
+        for line, student_id, message in report.errors:
+            click.echo(f'line {line} ({student_id or "?"}): {message}', err=True)
+        if report.error_count > len(report.errors):
+            click.echo(f'... {report.error_count - len(report.errors)} more errors', err=True)
+        click.echo(f'Imported {report.inserted} students, {report.error_count} rows rejected.')
+
+    @app.cli.command('generate-timetable')
+    @click.option('--incremental', is_flag=True, help='Keep scheduled lessons and place only the missing ones.')
+    def generate_timetable_command(incremental):
+        """Schedule every subject assignment's weekly lessons"""
+        summary = generate_timetable(app.config, incremental=incremental)
+        click.echo(f'Scheduled {summary["lessons"] - summary["unplaced"]} of {summary["lessons"]} lessons '
+                   f'({summary["over_capacity"]} exceed teacher or class capacity) in '
+                   f'{summary["solve_seconds"]}s; {summary["assignments_written"]} assignments updated.')
+    
+    @app.cli.command('jobs-prune')
+    @click.option('--days', default=None, type=int, help='Keep finished jobs this many days.')
+    def jobs_prune_command(days):
+        """Delete finished background jobs and their result files"""
+        removed = app.extensions['jobs'].prune(days if days is not None else app.config['JOBS_RETENTION_DAYS'])
+        click.echo(f'Removed {removed} finished jobs.')
+
+    @app.cli.command('index-advisor')
+    @click.option('--students', default=2000, help='Students in the scratch dataset.')
+    @click.option('--show-sql', is_flag=True, help='Print each flagged statement.')
+    @click.option('--fail-on-scan', is_flag=True, help='Exit with status 1 if any full table scan is found.')
+    def index_advisor_command(students, show_sql, fail_on_scan):
+        """Explain every query the routes issue and flag scans an index could avoid"""
+        # Imported here: the advisor drives the app through the benchmark routes
+        from index_advisor import FULL_SCAN, capture_route_queries, explain, cleanup
+        
+        scratch, captured = capture_route_queries(students=students)
+        try:
+            findings = explain(scratch, captured)
+        finally:
+            cleanup(scratch)
+        
+        for finding in findings:
+            click.echo(f'[{finding.kind}] {finding.detail}')
+            click.echo(f'    routes: {", ".join(sorted(finding.routes))}')
+            if show_sql:
+                for statement in finding.statements:
+                    click.echo('    ' + ' '.join(statement.split()))
+        scans = sum(1 for finding in findings if finding.kind == FULL_SCAN)
+        click.echo(f'{len(captured)} distinct statements explained, {scans} full table scans, '
+                   f'{len(findings) - scans} other findings.')
+        if fail_on_scan and scans:
+            raise SystemExit(1)
@@ -0,0 +1,87 @@
+"""
+Conditional GET support
+Views compute a cheap fingerprint of what they are about to render; when it
+matches the client's If-None-Match (or If-Modified-Since) they answer 304
+before loading rows or rendering templates
+"""
+import hashlib
+import time
+from datetime import timezone
+from flask import g, request, session, make_response
+from flask_login import current_user
+from sqlalchemy import func, select
+
+# Forms carry CSRF tokens that expire; pages with one are revalidated this often
+CSRF_WINDOW = 1800  # seconds
+
+
+def change_stamp(column):
+    """
+    (row count, max(column)) of column's table as scalar subqueries for one SELECT
+    Separate subqueries let SQLite answer max() from an index instead of a scan.
+    """
+    return (
+        select(func.count()).select_from(column.table).scalar_subquery(),
+        select(func.max(column)).scalar_subquery(),
+    )
+
+
+def csrf_window():
+    """Fingerprint part that changes before a rendered CSRF token can expire"""
+    return int(time.time() // CSRF_WINDOW)
+
+
+def make_etag(parts):
+    """Opaque tag for the fingerprint parts of this URL, as seen by the current user"""
+    viewer = None
+    if current_user.is_authenticated:
+        viewer = (current_user.get_id(), current_user.role)
+    return hashlib.sha1(repr((request.full_path, viewer, parts)).encode()).hexdigest()[:24]
+
+
+def conditional(*parts, weak=False, last_modified=None):
+    """
+    Return a 304 response if the client already has the page for these parts,
+    else None, in which case the ETag is attached to the page the view renders.
+    Pages with pending flash messages are never tagged: they are one-off.
+    """
+    if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+        return None
+    etag = make_etag(parts)
+    if last_modified is not None:
+        last_modified = last_modified.replace(microsecond=0, tzinfo=timezone.utc)
+    g.conditional = (etag, weak, last_modified)
+
+    if request.if_none_match:
+        if weak:
+            matched = request.if_none_match.contains_weak(etag)
+        else:
+            matched = request.if_none_match.contains(etag)
+    else:
+        since = request.if_modified_since
+        matched = last_modified is not None and since is not None and last_modified <= since
+    if matched:
+        return make_response('', 304)
+    return None
+
+
+def init_conditional(app):
+    """Add the validators computed by conditional() to the response"""
+
+    @app.after_request
+    def _add_validators(response):
+        validators = g.pop('conditional', None)
+        if validators is None or response.status_code not in (200, 304):
+            return response
+        # A view that flashed while rendering made a one-off page
+        if response.status_code == 200 and session.get('_flashes'):
+            return response
+        etag, weak, last_modified = validators
+        response.set_etag(etag, weak=weak)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        # Pages differ per user and must be revalidated on every use
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        response.vary.add('Cookie')
+        return response
@@ -21,6 +21,125 @@ class Config:
         f'sqlite:///{basedir}/school_management.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # SQLite: pragmas run on every new connection, and an optional read-only
+    # pool for GET requests (see ProductionConfig for tuned values)
+    SQLITE_PRAGMAS = {}
+    SQLITE_READ_POOL = False
+    SQLITE_READ_POOL_OPTIONS = {'pool_size': 10, 'max_overflow': 10}
+    
+    # Full-text search: order by relevance when a search matches at most this many rows
+    SEARCH_RANK_LIMIT = 500
+    
+    # List views: 'offset' (numbered pages) or 'keyset' (cursor pages, constant cost)
+    LIST_PAGINATION = 'offset'
+    
+    # Read class student/assignment counts from the counter columns instead of aggregating
+    CLASS_COUNTER_CACHE = False
+    
+    # Subject assignments above which the staffing matrix flags a teacher as overloaded
+    STAFFING_MAX_ASSIGNMENTS = 8
+    
+    # Timetable week; days x periods must fit in a 63-bit mask
+    TIMETABLE_DAYS = 5
+    TIMETABLE_PERIODS_PER_DAY = 8
+    TIMETABLE_DEFAULT_PERIODS = 4  # lessons a week for assignments without periods_per_week
+    TIMETABLE_TIME_LIMIT = 60  # seconds the repair may run
+    TIMETABLE_SEED = 0
+    # Re-solve incrementally when an assignment or a teacher's availability changes
+    TIMETABLE_AUTO_RESOLVE = True
+    
+    # Attendance reports flag students present on less than this share of their marked days
+    ATTENDANCE_LOW_THRESHOLD = 0.9
+    
+    # Dashboard statistics cache: 'lru', 'null' or an import path to a backend class.
+    # Entries drop on commit in this process; the TTL bounds staleness across workers.
+    STATS_CACHE_BACKEND = 'lru'
+    STATS_CACHE_SIZE = 128
+    STATS_CACHE_TTL = 300  # seconds
+    
+    # Rendered {% cache %} blocks of the detail pages. Commits in this process change
+    # the keys of the blocks they affect; the TTL bounds staleness across workers.
+    FRAGMENT_CACHE_BACKEND = 'lru'
+    FRAGMENT_CACHE_SIZE = 2048
+    FRAGMENT_CACHE_TTL = 300  # seconds
+    
+    # Rows per executemany batch for bulk student imports
+    IMPORT_BATCH_SIZE = 5000
+    
+    # Background jobs (imports, exports, bulk updates): worker threads per process,
+    # jobs allowed to wait for one, and where uploads and results are kept.
+    # JOBS_MAX_WORKERS = 0 runs each job inline in the request that submits it.
+    JOBS_MAX_WORKERS = 2
+    JOBS_MAX_QUEUED = 20
+    JOBS_DIR = os.environ.get('JOBS_DIR') or str(basedir / 'jobs')
+    JOBS_RETENTION_DAYS = 7  # finished jobs and their files, for "flask jobs-prune"
+    
+    # Per-request instrumentation: fraction of requests that get SQL/template timings,
+    # a Server-Timing header and a structured log line (1.0 in development, small in production)
+    REQUEST_TIMING_SAMPLE_RATE = float(os.environ.get('REQUEST_TIMING_SAMPLE_RATE', 0.01))
+    REQUEST_TIMING_SLOW_QUERIES = 3  # slowest statements kept per request
+    REQUEST_TIMING_SLOW_MS = 1000  # log unsampled requests slower than this (0 disables)
+    REQUEST_TIMING_HEADER = True
+    
+    # /metrics: with several worker processes, set METRICS_DIR to a directory they share;
+    # each worker writes its totals there at most every METRICS_FLUSH_INTERVAL seconds
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    METRICS_FLUSH_INTERVAL = 5  # seconds
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # require "Authorization: Bearer <token>"
+    METRICS_REQUIRE_TOKEN = True  # /metrics stays off until METRICS_TOKEN is set
+    
+    # Read-only JSON API (api.py, served by an ASGI server). Every request needs
+    # "Authorization: Bearer <API_TOKEN>"; the API refuses all requests while it is unset.
+    API_TOKEN = os.environ.get('API_TOKEN')
+    API_PAGE_SIZE = 50
+    API_MAX_PAGE_SIZE = 500
+    API_ENGINE_OPTIONS = {'pool_size': 10, 'max_overflow': 20, 'pool_timeout': 30}
+    
     # Flask-Login settings
     REMEMBER_COOKIE_DURATION = 86400  # 24 hours
+    
+    # User loader: 'db' (query every request), 'cache' (in-process TTL cache)
+    # or 'session' (identity in the signed session, rechecked periodically)
+    USER_LOADER_MODE = 'cache'
+    USER_CACHE_TTL = 60  # seconds
+    USER_CACHE_SIZE = 1024
+    SESSION_USER_RECHECK = 300  # seconds
+
+
+class DevelopmentConfig(Config):
+    """
+    Local development profile, used by `python app.py`
+    /metrics answers without a token so it can be checked from a browser
+    """
+    METRICS_REQUIRE_TOKEN = False
+
+
+class ProductionConfig(Config):
+    """
+    Production profile for a single SQLite file shared by several workers
+    WAL lets readers run alongside the writer; busy_timeout makes writers queue
+    for the lock instead of failing with "database is locked"
+    """
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',  # durable at checkpoints; safe with WAL
+        'cache_size': -64000,  # KiB, i.e. 64 MB page cache per connection
+        'mmap_size': 268435456,  # 256 MB memory-mapped I/O
+        'busy_timeout': 10000,  # ms to wait for the write lock
+        'temp_store': 'MEMORY',
+    }
+    
+    # Writes serialize on the file lock, so a small writer pool is enough
+    SQLALCHEMY_ENGINE_OPTIONS = {'pool_size': 5, 'max_overflow': 5, 'pool_timeout': 10}
+    
+    # GET requests read through their own read-only pool
+    SQLITE_READ_POOL = True
+    SQLITE_READ_POOL_OPTIONS = {'pool_size': 20, 'max_overflow': 10, 'pool_timeout': 10}
+
 
+# Selected with the APP_CONFIG environment variable
+CONFIGS = {
+    'default': Config,
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+}
@@ -0,0 +1,108 @@
+"""
+Per-class student and assignment counts
+Aggregated in a single query, or read from the counter columns on Class
+that the ORM events below keep in step with every flush
+"""
+from sqlalchemy import bindparam, event, func, inspect, select
+from models import db, Class, Student, SubjectAssignment
+
+classes_table = Class.__table__
+
+
+def class_counts_query():
+    """
+    Query (Class, student_count, assignment_count) rows for every class,
+    computed with one GROUP BY per table in a single statement
+    """
+    student_counts = db.session.query(
+        Student.class_id, func.count(Student.id).label('total')
+    ).group_by(Student.class_id).subquery()
+    assignment_counts = db.session.query(
+        SubjectAssignment.class_id, func.count(SubjectAssignment.id).label('total')
+    ).group_by(SubjectAssignment.class_id).subquery()
+
+    return db.session.query(
+        Class,
+        func.coalesce(student_counts.c.total, 0),
+        func.coalesce(assignment_counts.c.total, 0)
+    ).outerjoin(student_counts, student_counts.c.class_id == Class.id) \
+     .outerjoin(assignment_counts, assignment_counts.c.class_id == Class.id) \
+     .order_by(Class.grade, Class.section)
+
+
+def refresh_class_counters(connection=None, class_ids=None):
+    """
+    Recompute the counter columns from the students and subject_assignments tables.
+    Limited to class_ids when given; returns the number of classes refreshed.
+    """
+    connection = connection or db.session.connection()
+    counts = {}
+    for key, model in (('students', Student), ('assignments', SubjectAssignment)):
+        totals = select(model.class_id, func.count()).where(model.class_id.isnot(None))
+        if class_ids is not None:
+            totals = totals.where(model.class_id.in_(class_ids))
+        for class_id, total in connection.execute(totals.group_by(model.class_id)):
+            counts.setdefault(class_id, {'students': 0, 'assignments': 0})[key] = total
+
+    reset = classes_table.update().values(student_count=0, assignment_count=0)
+    if class_ids is not None:
+        reset = reset.where(classes_table.c.id.in_(class_ids))
+    refreshed = connection.execute(reset).rowcount
+
+    if counts:
+        connection.execute(
+            classes_table.update()
+            .where(classes_table.c.id == bindparam('class_pk'))
+            .values(student_count=bindparam('students'),
+                    assignment_count=bindparam('assignments')),
+            [dict(values, class_pk=class_id) for class_id, values in counts.items()]
+        )
+    return refreshed
+
+
+def adjust_class_counters(connection, column, deltas):
+    """
+    Add per-class deltas ({class_id: delta}) to one counter column.
+    For bulk writes that bypass the ORM events below.
+    """
+    params = [{'class_pk': class_id, 'delta': delta}
+              for class_id, delta in deltas.items() if class_id is not None and delta]
+    if params:
+        connection.execute(
+            classes_table.update()
+            .where(classes_table.c.id == bindparam('class_pk'))
+            .values({column: classes_table.c[column] + bindparam('delta')}),
+            params
+        )
+
+
+def class_id_change(target):
+    """Return (old, new) class_id if it changed in this flush, else None"""
+    history = inspect(target).attrs.class_id.history
+    if not history.has_changes():
+        return None
+    old = history.deleted[0] if history.deleted else None
+    new = history.added[0] if history.added else None
+    return old, new
+
+
+def _track(model, column):
+    """Keep one counter column in step with inserts, deletes and moves of a model"""
+
+    @event.listens_for(model, 'after_insert')
+    def after_insert(mapper, connection, target):
+        adjust_class_counters(connection, column, {target.class_id: 1})
+
+    @event.listens_for(model, 'after_delete')
+    def after_delete(mapper, connection, target):
+        adjust_class_counters(connection, column, {target.class_id: -1})
+
+    @event.listens_for(model, 'after_update')
+    def after_update(mapper, connection, target):
+        change = class_id_change(target)
+        if change and change[0] != change[1]:
+            adjust_class_counters(connection, column, {change[0]: -1, change[1]: 1})
+
+
+_track(Student, 'student_count')
+_track(SubjectAssignment, 'assignment_count')
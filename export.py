@@ -0,0 +1,98 @@
+"""
+Streaming CSV/JSON exports
+Rows are fetched in server-side batches and written to the response as they arrive
+"""
+import csv
+import json
+from datetime import date, datetime
+from flask import Response, stream_with_context
+from models import db
+
+# Rows fetched per round trip while streaming
+EXPORT_BATCH_SIZE = 1000
+
+
+class _LineBuffer:
+    """File-like object that hands back what csv.writer writes"""
+
+    def write(self, value):
+        return value
+
+
+def _json_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _csv_chunks(fields, result):
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow(fields)
+    for partition in result.partitions():
+        yield ''.join(writer.writerow(row) for row in partition)
+
+
+def _json_chunks(fields, result):
+    yield '['
+    separator = ''
+    for partition in result.partitions():
+        chunk = []
+        for row in partition:
+            chunk.append(separator + json.dumps({f: _json_value(v) for f, v in zip(fields, row)}))
+            separator = ','
+        yield ''.join(chunk)
+    yield ']'
+
+
+def write_export(statement, fields, fmt, path, progress=None):
+    """
+    Write the rows of a select() to a CSV or JSON file.
+    progress, if given, is called with the approximate number of rows written.
+    Returns the number of rows written.
+    """
+    result = db.session.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    rows = 0
+
+    def counted(partitions):
+        nonlocal rows
+        for partition in partitions:
+            yield partition
+            rows += len(partition)
+            if progress:
+                progress(rows)
+
+    # The chunk writers only need partitions(), so hand them a counting one
+    class Counted:
+        def partitions(self):
+            return counted(result.partitions())
+
+    chunks = _json_chunks(fields, Counted()) if fmt == 'json' else _csv_chunks(fields, Counted())
+    try:
+        with open(path, 'w', newline='', encoding='utf-8') as output:
+            for chunk in chunks:
+                output.write(chunk)
+    finally:
+        result.close()
+    return rows
+
+
+def export_response(statement, fields, fmt, filename):
+    """
+    Stream the rows of a select() as a CSV or JSON download.
+    fields names the selected columns, in order.
+    """
+    def generate():
+        result = db.session.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        chunks = _json_chunks(fields, result) if fmt == 'json' else _csv_chunks(fields, result)
+        try:
+            yield from chunks
+        finally:
+            result.close()
+
+    if fmt == 'json':
+        mimetype, extension = 'application/json', 'json'
+    else:
+        mimetype, extension = 'text/csv', 'csv'
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename={filename}.{extension}'
+    })
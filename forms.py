@@ -2,10 +2,13 @@
 WTForms for form validation and rendering
 """
 from flask_wtf import FlaskForm
-from wtforms import StringField, DateField, TextAreaField, SelectField, PasswordField, EmailField
-from wtforms.validators import DataRequired, Email, Length, Optional, ValidationError
+from flask_wtf.file import FileField, FileRequired, FileAllowed
+from wtforms import StringField, DateField, TextAreaField, SelectField, PasswordField, EmailField, \
+    SelectMultipleField, IntegerField
+from wtforms.validators import DataRequired, Email, Length, Optional, ValidationError, NumberRange
 from datetime import date
 from models import Student, Teacher, Class, User
+from timetable import unavailable_mask
 
 
 class LoginForm(FlaskForm):
@@ -35,6 +38,21 @@ class StudentForm(FlaskForm):
         pass
 
 
+class StudentImportForm(FlaskForm):
+    """Form for uploading a CSV file of students"""
+    file = FileField('CSV File', validators=[FileRequired(), FileAllowed(['csv'], 'CSV files only.')])
+
+
+class BulkStudentForm(FlaskForm):
+    """Form for deleting or moving many students at once"""
+    # Ids come from the list page's checkboxes; any id is accepted
+    student_ids = SelectMultipleField('Students', coerce=int, validate_choice=False)
+    scope = SelectField('Apply to', choices=[('selected', 'Selected students'),
+                                             ('filtered', 'All matching students')])
+    action = SelectField('Action', choices=[('reassign', 'Move to class'), ('delete', 'Delete')])
+    class_id = SelectField('Class', coerce=int, validators=[Optional()], choices=[])
+
+
 class TeacherForm(FlaskForm):
     """Form for creating/editing teachers"""
     teacher_id = StringField('Teacher ID', validators=[DataRequired(), Length(min=1, max=20)])
@@ -44,11 +62,20 @@ class TeacherForm(FlaskForm):
     email = EmailField('Email', validators=[Optional(), Email(), Length(max=120)])
     phone = StringField('Phone', validators=[Optional(), Length(max=20)])
     joining_date = DateField('Joining Date', validators=[DataRequired()])
+    unavailable = StringField('Unavailable Periods', validators=[Optional(), Length(max=500)],
+                              description='For the timetable, e.g. "Mon 1-2, Fri" (a day alone means all of it)')
     
     def validate_joining_date(self, field):
         """Validate that joining date is not in the future"""
         if field.data and field.data > date.today():
             raise ValidationError('Joining date cannot be in the future.')
+    
+    def validate_unavailable(self, field):
+        """Validate the unavailable periods against the configured week"""
+        try:
+            unavailable_mask(field.data)
+        except ValueError as e:
+            raise ValidationError(str(e))
 
 
 class ClassForm(FlaskForm):
@@ -62,4 +89,43 @@ class SubjectAssignmentForm(FlaskForm):
     teacher_id = SelectField('Teacher', coerce=int, validators=[DataRequired()], choices=[])
     class_id = SelectField('Class', coerce=int, validators=[DataRequired()], choices=[])
     subject_name = StringField('Subject Name', validators=[DataRequired(), Length(max=100)])
+    periods_per_week = IntegerField('Periods per Week', validators=[Optional(), NumberRange(min=1, max=63)],
+                                    description='Leave empty for the school default')
+
+
+class TimetableForm(FlaskForm):
+    """Form for generating the timetable"""
+    mode = SelectField('Mode', choices=[('incremental', 'Keep scheduled lessons, place the missing ones'),
+                                        ('full', 'Rebuild from scratch')])
+
+
+class TermForm(FlaskForm):
+    """Form for creating school terms"""
+    name = StringField('Name', validators=[DataRequired(), Length(max=50)])
+    start_date = DateField('Start Date', validators=[DataRequired()])
+    end_date = DateField('End Date', validators=[DataRequired()])
+    
+    def validate_end_date(self, field):
+        """Validate that the term ends after it starts and lasts at most a year"""
+        if field.data and self.start_date.data:
+            if field.data < self.start_date.data:
+                raise ValidationError('End date cannot be before the start date.')
+            if (field.data - self.start_date.data).days >= 366:
+                raise ValidationError('A term cannot last longer than a year.')
+
+
+class AttendanceForm(FlaskForm):
+    """Form for marking a class's attendance for one day"""
+    day = DateField('Date', validators=[DataRequired()])
+    # Checked students are present, the rest of the class absent
+    present = SelectMultipleField('Present', coerce=int, validate_choice=False)
+    
+    def validate_day(self, field):
+        """Validate that the date is not in the future"""
+        if field.data and field.data > date.today():
+            raise ValidationError('Attendance cannot be marked for a future date.')
+
 
+class PromoteForm(FlaskForm):
+    """Form for moving every class up one grade"""
+    top_grade = IntegerField('Final Grade', default=12, validators=[DataRequired(), NumberRange(min=1, max=99)])
@@ -0,0 +1,130 @@
+"""
+Template fragment cache
+{% cache %} blocks store their rendered HTML keyed by the rows they show;
+commits bump per-row and per-table version counters so stale HTML is never
+looked up again and simply ages out of the LRU. Those counters are per process;
+changes from other workers reach the keys through updated_at or cache_versions
+"""
+import threading
+from flask import current_app
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from sqlalchemy import inspect
+from sqlalchemy.orm import InstanceState
+from cache import make_backend, rows_committed
+from models import db
+from refdata import table_version
+
+
+class FragmentCache:
+    """
+    Rendered fragments plus the version counters their keys are built from
+    A fragment depends on the model instances in its key and on any tables it
+    names with `depends`; a commit touching one of those changes the key.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._row_versions = {}  # (table, primary key) -> writes committed in this process
+        self._bulk_versions = {}  # table -> bulk statements committed, which hit unknown rows
+        self._table_versions = {}  # table -> commits that changed any of its rows
+        self._lock = threading.Lock()
+        # Tables each table references, so bulk changes reach parent pages too
+        self._references = {
+            table.name: {key.column.table.name for key in table.foreign_keys}
+            for table in db.metadata.tables.values()
+        }
+        rows_committed.connect(self._on_commit, weak=False)
+
+    def key_part(self, value):
+        """Model instances contribute their identity and versions; anything else itself"""
+        state = inspect(value, raiseerr=False)
+        if not isinstance(state, InstanceState) or state.key is None:
+            return value
+        table = state.mapper.local_table.name
+        row = (table, state.key[1][0])
+        # updated_at catches edits committed by other processes before the TTL does;
+        # rows without one (classes) use their table's version in cache_versions,
+        # which every commit changing the table bumps in the database
+        version = getattr(value, 'updated_at', None)
+        if version is None:
+            version = table_version(table)
+        return (row, version, self._bulk_versions.get(table, 0), self._row_versions.get(row, 0))
+
+    def make_key(self, template, parts, tables):
+        """Cache key for a block in template with the given key parts and table dependencies"""
+        return (template,
+                tuple(self.key_part(part) for part in parts),
+                tuple((table, self._table_versions.get(table, 0)) for table in tables))
+
+    def render(self, key, render):
+        """Cached HTML for key, rendering and storing it on a miss"""
+        html = self.backend.get(key)
+        if html is None:
+            html = render()
+            self.backend.set(key, html)
+        return html
+
+    def invalidate(self, rows=(), bulk=()):
+        """Move the versions of changed rows, and of every row of bulk-changed tables"""
+        with self._lock:
+            for row in rows:
+                self._row_versions[row] = self._row_versions.get(row, 0) + 1
+            bulk = set(bulk)
+            for table in list(bulk):
+                bulk |= self._references.get(table, set())
+            for table in bulk:
+                self._bulk_versions[table] = self._bulk_versions.get(table, 0) + 1
+            for table in bulk | {table for table, _ in rows}:
+                self._table_versions[table] = self._table_versions.get(table, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._row_versions.clear()
+            self._bulk_versions.clear()
+            self._table_versions.clear()
+        self.backend.clear()
+
+    def _on_commit(self, sender, rows, bulk):
+        self.invalidate(rows, bulk)
+
+
+class FragmentCacheExtension(Extension):
+    """
+    {% cache 'name', obj, other_obj, value depends ['table', ...] %}...{% endcache %}
+
+    Key parts may be model instances or plain hashable values; depends names
+    tables whose rows the block shows without having them in its key.
+    """
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        tables = nodes.List([])
+        if parser.stream.skip_if('name:depends'):
+            tables = parser.parse_expression()
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        args = [nodes.Const(parser.name), nodes.List(parts), tables]
+        return nodes.CallBlock(self.call_method('_render', args), [], [], body).set_lineno(lineno)
+
+    def _render(self, template, parts, tables, caller):
+        cache = current_app.extensions.get('fragment_cache')
+        if cache is None:
+            return caller()
+        key = cache.make_key(template, parts, tables)
+        return Markup(cache.render(key, lambda: str(caller())))
+
+
+def init_fragment_cache(app):
+    """Create the fragment cache and enable the {% cache %} tag"""
+    backend = make_backend(
+        app.config['FRAGMENT_CACHE_BACKEND'],
+        max_size=app.config['FRAGMENT_CACHE_SIZE'],
+        ttl=app.config['FRAGMENT_CACHE_TTL']
+    )
+    app.extensions['fragment_cache'] = FragmentCache(backend)
+    app.jinja_env.add_extension(FragmentCacheExtension)
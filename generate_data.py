@@ -0,0 +1,202 @@
+"""
+Synthetic dataset generator for load testing
+Adds deterministic, seedable classes, teachers, students and subject assignments
+to the configured database using batched Core inserts
+
+Example:
+    python generate_data.py --students 1000000 --teachers 20000 --classes 2000 --seed 7
+"""
+import argparse
+import random
+import time
+from contextlib import nullcontext
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, insert, select
+from app import create_app
+from config import Config
+from models import db, Student, Teacher, Class, SubjectAssignment
+from counters import refresh_class_counters
+from summaries import rebuild_summaries
+from search import deferred_search_index
+
+# Above this many new students and teachers, rebuild the search index once at the end
+DEFER_SEARCH_INDEX_ROWS = 50000
+
+FIRST_NAMES = ['James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda', 'William',
+               'Elizabeth', 'David', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah',
+               'Charles', 'Karen', 'Christopher', 'Nancy', 'Daniel', 'Lisa', 'Matthew', 'Betty', 'Anthony',
+               'Margaret', 'Mark', 'Sandra', 'Aisha', 'Wei', 'Priya', 'Mateo', 'Olga', 'Kenji']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez',
+              'Martinez', 'Hernandez', 'Lopez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson',
+              'Martin', 'Lee', 'Khan', 'Chen', 'Patel', 'Silva', 'Ivanova', 'Tanaka']
+SUBJECTS = ['Mathematics', 'English', 'Science', 'History', 'Geography', 'Physics', 'Chemistry',
+            'Biology', 'Computer Science', 'Art', 'Music', 'Physical Education']
+QUALIFICATIONS = ['B.Ed', 'M.Ed', 'M.Sc.', 'M.A.', 'Ph.D.', 'B.P.Ed']
+GRADES = [str(grade) for grade in range(1, 13)]
+
+
+def _next_id(model):
+    """First primary key value that new rows will receive"""
+    return (db.session.scalar(select(func.max(model.id))) or 0) + 1
+
+
+def _insert_batches(model, rows, batch_size):
+    """Insert an iterable of row dicts in executemany batches; returns the row count"""
+    total = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.session.execute(insert(model.__table__), batch)
+            db.session.commit()
+            total += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(model.__table__), batch)
+        db.session.commit()
+        total += len(batch)
+    return total
+
+
+def _class_rows(rng, count, start):
+    # Sections are numbered from the next class id, so they never collide with existing classes
+    for i in range(count):
+        yield {
+            'grade': GRADES[i % len(GRADES)],
+            'section': f'X{start + i // len(GRADES)}',
+        }
+
+
+def _teacher_rows(rng, count, start, now):
+    for i in range(count):
+        number = start + i
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        yield {
+            'teacher_id': f'GT{number:08d}',
+            'full_name': f'{first} {last}',
+            'subject': rng.choice(SUBJECTS),
+            'qualification': rng.choice(QUALIFICATIONS),
+            'email': f'{first.lower()}.{last.lower()}.t{number}@school.com',
+            'phone': f'555-{rng.randint(1000, 9999)}',
+            'joining_date': date(2000, 1, 1) + timedelta(days=rng.randint(0, 8000)),
+            'created_at': now - timedelta(seconds=count - i),
+            'updated_at': now - timedelta(seconds=count - i),
+        }
+
+
+def _student_rows(rng, count, start, class_ids, now):
+    today = now.date()
+    for i in range(count):
+        number = start + i
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        yield {
+            'student_id': f'GS{number:09d}',
+            'full_name': f'{first} {last}',
+            'date_of_birth': today - timedelta(days=rng.randint(5 * 365, 18 * 365)),
+            'email': f'{first.lower()}.{last.lower()}.{number}@student.school.com' if rng.random() > 0.2 else None,
+            'phone': f'555-{rng.randint(1000, 9999)}' if rng.random() > 0.3 else None,
+            'address': f'{rng.randint(100, 9999)} Main Street, City, State' if rng.random() > 0.4 else None,
+            'class_id': rng.choice(class_ids) if class_ids and rng.random() > 0.02 else None,
+            'created_at': now - timedelta(seconds=count - i),
+            'updated_at': now - timedelta(seconds=count - i),
+        }
+
+
+def _assignment_rows(rng, class_ids, teachers_by_subject, all_teachers, per_class):
+    for class_id in class_ids:
+        # Distinct subjects per class keep (teacher, class, subject) unique
+        for subject in rng.sample(SUBJECTS, min(per_class, len(SUBJECTS))):
+            candidates = teachers_by_subject.get(subject) or all_teachers
+            yield {
+                'teacher_id': rng.choice(candidates),
+                'class_id': class_id,
+                'subject_name': subject,
+            }
+
+
+def generate_dataset(students=0, teachers=0, classes=0, assignments_per_class=5,
+                     seed=42, batch_size=10000, report=print):
+    """
+    Add a synthetic dataset to the database of the current app context.
+    Returns {table name: (rows inserted, seconds)}.
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    timings = {}
+
+    def timed(name, run):
+        started = time.perf_counter()
+        inserted = run()
+        elapsed = time.perf_counter() - started
+        timings[name] = (inserted, elapsed)
+        if report and inserted:
+            report(f'  {name}: {inserted} rows in {elapsed:.1f}s ({inserted / max(elapsed, 1e-9):,.0f} rows/s)')
+
+    defer_index = students + teachers > DEFER_SEARCH_INDEX_ROWS
+    with deferred_search_index() if defer_index else nullcontext():
+        _generate(rng, now, timed, students, teachers, classes, assignments_per_class, batch_size)
+        if defer_index and report:
+            report('  rebuilding search index...')
+
+    # Core inserts bypass the counter and summary events
+    refresh_class_counters()
+    rebuild_summaries()
+    db.session.commit()
+    return timings
+
+
+def _generate(rng, now, timed, students, teachers, classes, assignments_per_class, batch_size):
+    """Insert each table in dependency order"""
+    first_class = _next_id(Class)
+    timed('classes', lambda: _insert_batches(Class, _class_rows(rng, classes, first_class), batch_size))
+    new_class_ids = list(db.session.scalars(select(Class.id).where(Class.id >= first_class).order_by(Class.id)))
+    all_class_ids = new_class_ids or list(db.session.scalars(select(Class.id)))
+
+    timed('teachers', lambda: _insert_batches(
+        Teacher, _teacher_rows(rng, teachers, _next_id(Teacher), now), batch_size))
+
+    teachers_by_subject, all_teachers = {}, []
+    for teacher_id, subject in db.session.execute(select(Teacher.id, Teacher.subject)):
+        teachers_by_subject.setdefault(subject, []).append(teacher_id)
+        all_teachers.append(teacher_id)
+
+    if all_teachers and assignments_per_class:
+        timed('subject_assignments', lambda: _insert_batches(
+            SubjectAssignment,
+            _assignment_rows(rng, new_class_ids, teachers_by_subject, all_teachers, assignments_per_class),
+            batch_size))
+
+    timed('students', lambda: _insert_batches(
+        Student, _student_rows(rng, students, _next_id(Student), all_class_ids, now), batch_size))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Add a synthetic dataset for load testing.')
+    parser.add_argument('--students', type=int, default=10000)
+    parser.add_argument('--teachers', type=int, default=200)
+    parser.add_argument('--classes', type=int, default=48)
+    parser.add_argument('--assignments-per-class', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42, help='Same seed and starting database give the same data.')
+    parser.add_argument('--batch-size', type=int, default=10000, help='Rows per executemany batch.')
+    parser.add_argument('--database', help='Database URL (defaults to the app configuration).')
+    args = parser.parse_args()
+
+    class GeneratorConfig(Config):
+        SQLALCHEMY_DATABASE_URI = args.database or Config.SQLALCHEMY_DATABASE_URI
+
+    app = create_app(GeneratorConfig)
+    with app.app_context():
+        print('Generating synthetic data...')
+        started = time.perf_counter()
+        timings = generate_dataset(
+            students=args.students, teachers=args.teachers, classes=args.classes,
+            assignments_per_class=args.assignments_per_class, seed=args.seed,
+            batch_size=args.batch_size
+        )
+        elapsed = time.perf_counter() - started
+        total = sum(inserted for inserted, _ in timings.values())
+        print(f'Inserted {total} rows in {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} rows/s)')
+
+
+if __name__ == '__main__':
+    main()
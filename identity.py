@@ -0,0 +1,138 @@
+"""
+Cached user loading for Flask-Login
+Serves the logged-in user from an in-process TTL cache, or from the signed
+session cookie, instead of querying the users table on every request
+"""
+import time
+from flask import current_app, has_app_context, session
+from flask_login import UserMixin, user_logged_in, user_logged_out
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from models import db, User
+from cache import make_backend
+
+# Session key holding the user's identity in 'session' mode
+SESSION_KEY = '_identity'
+
+
+class SessionUser(UserMixin):
+    """
+    Lightweight, cacheable stand-in for a User row
+    Carries only what requests need: id, username, email and role
+    """
+
+    def __init__(self, id, username, email, role):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.role = role
+
+    def is_admin(self):
+        """Check if user is admin"""
+        return self.role == 'Admin'
+
+    def __repr__(self):
+        return f'<SessionUser {self.username}>'
+
+
+def init_identity(app):
+    """Create the user cache and session hooks for the configured loader mode"""
+    app.extensions['user_cache'] = make_backend(
+        'lru', max_size=app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL']
+    )
+    user_logged_in.connect(_remember_identity, app)
+    user_logged_out.connect(_forget_identity, app)
+
+
+def _load_row(user_id):
+    """Fetch the identity columns of one user, or None"""
+    return db.session.execute(
+        select(User.id, User.username, User.email, User.role)
+        .where(User.id == user_id)
+    ).first()
+
+
+def _store_in_session(row):
+    session[SESSION_KEY] = {
+        'id': row.id,
+        'username': row.username,
+        'email': row.email,
+        'role': row.role,
+        'checked_at': time.time(),
+    }
+
+
+def load_identity(user_id):
+    """
+    Flask-Login user loader
+    USER_LOADER_MODE: 'db' (query every request), 'cache' (TTL cache keyed by
+    user id) or 'session' (identity in the signed session, rechecked every
+    SESSION_USER_RECHECK seconds)
+    """
+    user_id = int(user_id)
+    mode = current_app.config['USER_LOADER_MODE']
+
+    if mode == 'session':
+        identity = session.get(SESSION_KEY)
+        recheck = current_app.config['SESSION_USER_RECHECK']
+        if identity and identity['id'] == user_id and time.time() - identity['checked_at'] < recheck:
+            return SessionUser(identity['id'], identity['username'], identity['email'], identity['role'])
+
+        row = _load_row(user_id)
+        if row is None:
+            session.pop(SESSION_KEY, None)
+            return None
+        _store_in_session(row)
+        return SessionUser(row.id, row.username, row.email, row.role)
+
+    if mode == 'cache':
+        cache = current_app.extensions['user_cache']
+        user = cache.get(user_id)
+        if user is None:
+            row = _load_row(user_id)
+            if row is None:
+                return None
+            user = SessionUser(row.id, row.username, row.email, row.role)
+            cache.set(user_id, user)
+        return user
+
+    return db.session.get(User, user_id)
+
+
+def _remember_identity(app, user):
+    if app.config['USER_LOADER_MODE'] == 'session':
+        _store_in_session(user)
+
+
+def _forget_identity(app, user):
+    session.pop(SESSION_KEY, None)
+
+
+# Invalidation: drop a cached user once a change to its role, password or row commits
+
+@event.listens_for(User, 'after_update')
+def _user_updated(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.role.history.has_changes() or state.attrs.password_hash.history.has_changes() \
+            or state.attrs.username.history.has_changes():
+        state.session.info.setdefault('stale_users', set()).add(target.id)
+
+
+@event.listens_for(User, 'after_delete')
+def _user_deleted(mapper, connection, target):
+    inspect(target).session.info.setdefault('stale_users', set()).add(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _drop_stale_users(session):
+    stale = session.info.pop('stale_users', None)
+    if stale and has_app_context():
+        cache = current_app.extensions.get('user_cache')
+        if cache is not None:
+            for user_id in stale:
+                cache.delete(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _keep_users(session):
+    session.info.pop('stale_users', None)
@@ -0,0 +1,166 @@
+"""
+Bulk student import from CSV
+Streams rows in fixed memory and inserts them in batches with executemany
+"""
+import csv
+import re
+from datetime import date
+from sqlalchemy import insert, select
+from models import db, Student, Class
+from counters import adjust_class_counters
+from summaries import adjust_student_counts
+
+# Column layout shared with the student CSV export
+CSV_COLUMNS = ['student_id', 'full_name', 'date_of_birth', 'email', 'phone', 'address', 'class']
+REQUIRED_COLUMNS = ['student_id', 'full_name', 'date_of_birth']
+
+# Keep at most this many row errors in the report (the total is always counted)
+MAX_REPORTED_ERRORS = 1000
+
+_EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+class ImportReport:
+    """Outcome of an import: inserted rows and per-row errors"""
+
+    def __init__(self):
+        self.inserted = 0
+        self.error_count = 0
+        self.errors = []  # (line number, student_id, message)
+
+    def add_error(self, line, student_id, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, student_id, message))
+
+    @property
+    def processed(self):
+        return self.inserted + self.error_count
+
+
+def _class_map():
+    """Map lower-cased class display names ('10-science') to class ids"""
+    rows = db.session.execute(select(Class.id, Class.grade, Class.section))
+    return {f'{grade}-{section}'.lower(): class_id for class_id, grade, section in rows}
+
+
+def _parse_row(row, class_map):
+    """Validate one CSV row; return (values, None) or (None, error message)"""
+    student_id = (row.get('student_id') or '').strip()
+    full_name = (row.get('full_name') or '').strip()
+    email = (row.get('email') or '').strip() or None
+    phone = (row.get('phone') or '').strip() or None
+    address = (row.get('address') or '').strip() or None
+    class_name = (row.get('class') or '').strip()
+
+    if not student_id or len(student_id) > 20:
+        return None, 'Student ID is required (max 20 characters).'
+    if len(full_name) < 2 or len(full_name) > 100:
+        return None, 'Full name must be 2-100 characters.'
+    try:
+        date_of_birth = date.fromisoformat((row.get('date_of_birth') or '').strip())
+    except ValueError:
+        return None, 'Date of birth must be YYYY-MM-DD.'
+    if date_of_birth > date.today():
+        return None, 'Date of birth cannot be in the future.'
+    if email and (len(email) > 120 or not _EMAIL_RE.match(email)):
+        return None, 'Invalid email address.'
+    if phone and len(phone) > 20:
+        return None, 'Phone must be at most 20 characters.'
+    if address and len(address) > 500:
+        return None, 'Address must be at most 500 characters.'
+
+    class_id = None
+    if class_name:
+        class_id = class_map.get(class_name.lower())
+        if class_id is None:
+            return None, f'Unknown class "{class_name}".'
+
+    return {
+        'student_id': student_id,
+        'full_name': full_name,
+        'date_of_birth': date_of_birth,
+        'email': email,
+        'phone': phone,
+        'address': address,
+        'class_id': class_id,
+    }, None
+
+
+def _insert_batch(batch, report):
+    """
+    Insert one batch of parsed rows after set-based duplicate checks.
+    Duplicates against the database and within the batch are reported per row.
+    """
+    student_ids = [values['student_id'] for _, values in batch]
+    emails = [values['email'] for _, values in batch if values['email']]
+
+    taken_ids = set(db.session.scalars(
+        select(Student.student_id).where(Student.student_id.in_(student_ids))
+    ))
+    taken_emails = set(db.session.scalars(
+        select(Student.email).where(Student.email.in_(emails))
+    )) if emails else set()
+
+    rows = []
+    class_deltas = {}
+    seen_ids, seen_emails = set(), set()
+    for line, values in batch:
+        if values['student_id'] in taken_ids:
+            report.add_error(line, values['student_id'], 'Student ID already exists.')
+            continue
+        if values['email'] and values['email'] in taken_emails:
+            report.add_error(line, values['student_id'], 'Email already exists.')
+            continue
+        if values['student_id'] in seen_ids:
+            report.add_error(line, values['student_id'], 'Duplicate student ID in file.')
+            continue
+        if values['email'] and values['email'] in seen_emails:
+            report.add_error(line, values['student_id'], 'Duplicate email in file.')
+            continue
+        seen_ids.add(values['student_id'])
+        if values['email']:
+            seen_emails.add(values['email'])
+        rows.append(values)
+        if values['class_id']:
+            class_deltas[values['class_id']] = class_deltas.get(values['class_id'], 0) + 1
+
+    if rows:
+        # Core insert with a parameter list runs as a single executemany
+        db.session.execute(insert(Student.__table__), rows)
+        adjust_class_counters(db.session.connection(), 'student_count', class_deltas)
+        adjust_student_counts(db.session.connection(), class_deltas)
+    db.session.commit()
+    report.inserted += len(rows)
+
+
+def import_students(lines, batch_size=1000, progress=None):
+    """
+    Import students from an iterable of CSV lines with a header row.
+    Each batch commits on its own, so memory stays flat for any file size;
+    progress, if given, is called with the report after every batch.
+    """
+    reader = csv.DictReader(lines)
+    missing = [name for name in REQUIRED_COLUMNS if name not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f'CSV is missing required columns: {", ".join(missing)}')
+
+    report = ImportReport()
+    class_map = _class_map()
+    batch = []
+
+    for row in reader:
+        values, error = _parse_row(row, class_map)
+        if error:
+            report.add_error(reader.line_num, row.get('student_id'), error)
+            continue
+        batch.append((reader.line_num, values))
+        if len(batch) >= batch_size:
+            _insert_batch(batch, report)
+            batch = []
+            if progress:
+                progress(report)
+
+    if batch:
+        _insert_batch(batch, report)
+    return report
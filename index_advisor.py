@@ -0,0 +1,119 @@
+"""
+Index advisor
+Drives every benchmarked route against a scratch database, runs EXPLAIN QUERY
+PLAN on each distinct statement the routes issued, and flags table scans and
+temporary sorts that an index could avoid
+"""
+import os
+import shutil
+import tempfile
+from sqlalchemy import event, text
+from models import db
+from generate_data import generate_dataset
+
+# Plan details that point at a missing index
+FULL_SCAN = 'full table scan'
+INDEX_SCAN = 'full index scan'
+TEMP_SORT = 'temporary sort'
+
+
+class Finding:
+    """One questionable step of a query plan"""
+
+    def __init__(self, kind, detail):
+        self.kind = kind
+        self.detail = detail
+        self.statements = []
+        self.routes = set()
+
+
+def classify(detail):
+    """Kind of problem a plan line shows, or None when it is fine"""
+    if detail.startswith('SCAN '):
+        if 'VIRTUAL TABLE' in detail or 'CONSTANT ROW' in detail:
+            return None
+        if ' USING ' in detail:
+            return INDEX_SCAN
+        return FULL_SCAN
+    if detail.startswith('USE TEMP B-TREE'):
+        return TEMP_SORT
+    return None
+
+
+def capture_route_queries(students=2000, seed=42, routes=None):
+    """
+    Run every route once against a freshly seeded scratch database
+    Returns (app, {(statement, parameters): set of route names}); the caller
+    must call cleanup(app) once done with the app.
+    """
+    # Imported here: benchmark imports app, which imports the CLI commands
+    from benchmark import ROUTES, Bench, build_app, dataset_shape
+
+    workdir = tempfile.mkdtemp(prefix='school-advisor-')
+    app = build_app(os.path.join(workdir, 'advisor.db'), {'REQUEST_TIMING_SAMPLE_RATE': 0.0})
+    app.config['ADVISOR_WORKDIR'] = workdir
+    with app.app_context():
+        generate_dataset(seed=seed, report=None, **dataset_shape(students))
+        db.session.execute(text('ANALYZE'))
+        db.session.commit()
+
+    bench = Bench(app)
+    captured = {}
+    current = {}
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        route = current.get('route')
+        if route and not executemany and statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE', 'WITH')):
+            params = tuple(parameters) if isinstance(parameters, (list, tuple)) else parameters
+            key = (statement, params if isinstance(params, tuple) else ())
+            captured.setdefault(key, set()).add(route)
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', record)
+    try:
+        for route in routes or ROUTES:
+            current['route'] = route.name
+            bench.run(route, iterations=1, warmup=0)
+    finally:
+        current.clear()
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', record)
+    return app, captured
+
+
+def explain(app, captured):
+    """EXPLAIN QUERY PLAN every captured statement; returns a list of Findings"""
+    findings = {}
+    with app.app_context():
+        connection = db.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            for (statement, parameters), routes in captured.items():
+                cursor.execute(f'EXPLAIN QUERY PLAN {statement}', parameters)
+                for row in cursor.fetchall():
+                    detail = row[-1]
+                    kind = classify(detail)
+                    if kind is None:
+                        continue
+                    # Each plan step is reported once, with every statement and route that hit it
+                    finding = findings.get((kind, detail))
+                    if finding is None:
+                        finding = findings[(kind, detail)] = Finding(kind, detail)
+                    if statement not in finding.statements:
+                        finding.statements.append(statement)
+                    finding.routes |= routes
+        finally:
+            connection.close()
+    order = {FULL_SCAN: 0, INDEX_SCAN: 1, TEMP_SORT: 2}
+    return sorted(findings.values(), key=lambda f: (order[f.kind], f.detail))
+
+
+def cleanup(app):
+    """Dispose of the scratch database built by capture_route_queries"""
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+    shutil.rmtree(app.config['ADVISOR_WORKDIR'], ignore_errors=True)
@@ -0,0 +1,155 @@
+"""
+Per-request instrumentation
+Records SQL query count and time, the slowest statements and template render
+time for a sample of requests, and reports them in a Server-Timing header and
+a structured log line
+"""
+import heapq
+import json
+import logging
+import random
+import time
+from flask import current_app, g, has_app_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+from models import db
+
+logger = logging.getLogger('request_timing')
+
+# Characters of SQL kept for each of the slowest statements
+STATEMENT_PREVIEW = 200
+
+
+class RequestTiming:
+    """Measurements for one sampled request"""
+
+    def __init__(self, slow_queries):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.repeated = 0
+        self.template_time = 0.0
+        self.templates = []
+        self.slow_queries = slow_queries
+        self._slowest = []  # min-heap of (seconds, sequence, statement)
+        self._seen = set()
+        self._template_started = None
+
+    def add_query(self, statement, elapsed):
+        self.queries += 1
+        self.sql_time += elapsed
+        # The same SQL text run again in one request usually means a lazy load in a loop
+        if statement in self._seen:
+            self.repeated += 1
+        else:
+            self._seen.add(statement)
+        entry = (elapsed, self.queries, statement)
+        if len(self._slowest) < self.slow_queries:
+            heapq.heappush(self._slowest, entry)
+        elif elapsed > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+
+    def slowest(self):
+        """The slowest statements, slowest first"""
+        return [{'ms': round(elapsed * 1000, 3), 'sql': statement[:STATEMENT_PREVIEW]}
+                for elapsed, _, statement in sorted(self._slowest, reverse=True)]
+
+
+def init_instrumentation(app):
+    """Hook the request, SQL and template timers into the app"""
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+
+
+def _current():
+    """Timing of the current request, if it is being sampled"""
+    return g.get('request_timing') if has_app_context() else None
+
+
+def _start_request():
+    g.request_started = time.perf_counter()
+    rate = current_app.config['REQUEST_TIMING_SAMPLE_RATE']
+    if rate and (rate >= 1 or random.random() < rate):
+        g.request_timing = RequestTiming(current_app.config['REQUEST_TIMING_SLOW_QUERIES'])
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current() is not None:
+        conn.info.setdefault('request_timing_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timing = _current()
+    started = conn.info.get('request_timing_started')
+    if timing is not None and started:
+        timing.add_query(statement, time.perf_counter() - started.pop())
+
+
+def _before_render(app, template, context, **extra):
+    timing = _current()
+    if timing is not None:
+        timing._template_started = time.perf_counter()
+
+
+def _after_render(app, template, context, **extra):
+    timing = _current()
+    if timing is not None and timing._template_started is not None:
+        timing.template_time += time.perf_counter() - timing._template_started
+        timing._template_started = None
+        timing.templates.append(template.name)
+
+
+def _finish_request(response):
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    total = time.perf_counter() - started
+    timing = g.pop('request_timing', None)
+
+    if timing is None:
+        # Unsampled requests are only reported when they are slow
+        slow_ms = current_app.config['REQUEST_TIMING_SLOW_MS']
+        if slow_ms and total * 1000 >= slow_ms:
+            logger.warning(json.dumps(_base_record(response, total)))
+        return response
+
+    # SQL run while a streamed body is generated happens after this point and is not counted
+    record = _base_record(response, total)
+    record.update({
+        'queries': timing.queries,
+        'repeated_queries': timing.repeated,
+        'sql_ms': round(timing.sql_time * 1000, 3),
+        'template_ms': round(timing.template_time * 1000, 3),
+        'templates': timing.templates,
+        'slowest': timing.slowest(),
+    })
+    logger.info(json.dumps(record))
+
+    if current_app.config['REQUEST_TIMING_HEADER']:
+        response.headers.add('Server-Timing', ', '.join([
+            f'sql;dur={timing.sql_time * 1000:.2f};desc="{timing.queries} queries"',
+            f'tpl;dur={timing.template_time * 1000:.2f};desc="templates"',
+            f'app;dur={total * 1000:.2f};desc="total"',
+        ]))
+    return response
+
+
+def _base_record(response, total):
+    return {
+        'method': request.method,
+        'path': request.path,
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+        'duration_ms': round(total * 1000, 3),
+    }
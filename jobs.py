@@ -0,0 +1,245 @@
+"""
+Background job runner
+Long admin operations (imports, exports, bulk updates) are queued as Job rows
+and run on a small thread pool started by create_app, so requests return a job
+id at once and the page polls for progress instead of hitting proxy timeouts
+"""
+import json
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from models import db, Job
+
+# Job functions by kind; see job_type()
+JOB_TYPES = {}
+
+# Progress is written at most this often, in seconds, so reporting stays cheap
+PROGRESS_INTERVAL = 0.5
+
+
+class JobQueueFull(Exception):
+    """Raised by submit() when JOBS_MAX_QUEUED jobs are already waiting"""
+
+
+def job_type(kind):
+    """
+    Register a job function under a kind name
+    The function is called as fn(context, **params) inside an app context and
+    returns a JSON-serializable summary (or None).
+    """
+    def decorator(f):
+        JOB_TYPES[kind] = f
+        return f
+    return decorator
+
+
+def _runner_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+class JobContext:
+    """Handed to job functions for reporting progress and writing their output"""
+
+    def __init__(self, runner, job_id):
+        self.runner = runner
+        self.job_id = job_id
+        self.result_file = None
+        self.result_name = None
+        self._reported_at = 0.0
+
+    def progress(self, done, total=None, message=None, persist=True):
+        """
+        Record how far the job got. This process's status polls see it at once;
+        the jobs row is written at most every PROGRESS_INTERVAL seconds. Pass
+        persist=False while the job holds a read cursor open: without WAL, SQLite
+        cannot commit the row until that cursor is done.
+        """
+        values = {'progress': done}
+        if total is not None:
+            values['total'] = total
+        if message is not None:
+            values['message'] = message[:200]
+        self.runner.live.setdefault(self.job_id, {}).update(values)
+
+        now = time.monotonic()
+        if persist and now - self._reported_at >= PROGRESS_INTERVAL:
+            self._reported_at = now
+            self.runner.update(self.job_id, **self.runner.live[self.job_id])
+
+    def output_path(self, download_name):
+        """Path to write the job's downloadable result to"""
+        self.result_name = download_name
+        self.result_file = os.path.join(self.runner.directory, f'{uuid.uuid4().hex}-{download_name}')
+        return self.result_file
+
+
+class JobRunner:
+    """
+    Runs queued jobs on a bounded thread pool, separate from the request threads
+    With JOBS_MAX_WORKERS = 0 jobs run inline in submit(), for tests and scripts.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.directory = app.config['JOBS_DIR']
+        self.max_workers = app.config['JOBS_MAX_WORKERS']
+        self.max_queued = app.config['JOBS_MAX_QUEUED']
+        self.runner_id = _runner_id()
+        self._pending = 0
+        self.live = {}  # job id -> latest progress of jobs running in this process
+        self._lock = threading.Lock()
+        self._executor = None
+        if self.max_workers:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job')
+        os.makedirs(self.directory, exist_ok=True)
+
+    def save_upload(self, stream, filename):
+        """Spool an uploaded file into the jobs directory; returns its path"""
+        path = os.path.join(self.directory, f'upload-{uuid.uuid4().hex}-{os.path.basename(filename)}')
+        with open(path, 'wb') as output:
+            while True:
+                chunk = stream.read(1024 * 1024)
+                if not chunk:
+                    break
+                output.write(chunk)
+        return path
+
+    def submit(self, kind, params=None, user_id=None):
+        """Queue a job and return its id; the job starts as soon as a worker is free"""
+        if kind not in JOB_TYPES:
+            raise ValueError(f'Unknown job type: {kind}')
+        with self._lock:
+            if self._executor is not None and self._pending >= self.max_queued:
+                raise JobQueueFull(f'{self._pending} jobs are already waiting; try again later.')
+            self._pending += 1
+
+        job = Job(kind=kind, params=json.dumps(params or {}), user_id=user_id,
+                  status=Job.QUEUED, runner=self.runner_id)
+        db.session.add(job)
+        db.session.commit()
+
+        if self._executor is None:
+            self._run(job.id)
+        else:
+            self._executor.submit(self._run, job.id)
+        return job.id
+
+    def update(self, job_id, **values):
+        """Write job fields in their own transaction, outside the job's session"""
+        with self.app.app_context():
+            with db.engine.begin() as connection:
+                connection.execute(update(Job).where(Job.id == job_id).values(**values))
+
+    def _run(self, job_id):
+        try:
+            with self.app.app_context():
+                job = db.session.get(Job, job_id)
+                kind, params = job.kind, json.loads(job.params)
+                db.session.remove()
+            self.update(job_id, status=Job.RUNNING, started_at=datetime.utcnow())
+
+            context = JobContext(self, job_id)
+            try:
+                with self.app.app_context():
+                    result = JOB_TYPES[kind](context, **params)
+            except Exception as e:
+                self.app.logger.exception(f'Job {job_id} ({kind}) failed')
+                self.update(job_id, **dict(self.live.get(job_id, {}), status=Job.FAILED,
+                            finished_at=datetime.utcnow(), message=str(e)[:200],
+                            error=traceback.format_exc()))
+                return
+            # Progress the throttle held back is written with the outcome
+            self.update(job_id, **dict(self.live.get(job_id, {}), status=Job.SUCCEEDED,
+                        finished_at=datetime.utcnow(), result=json.dumps(result),
+                        result_file=context.result_file, result_name=context.result_name))
+        finally:
+            self.live.pop(job_id, None)
+            with self._lock:
+                self._pending -= 1
+
+    def status(self, job):
+        """JSON-ready state of a job, with live progress when this process runs it"""
+        live = self.live.get(job.id, {}) if job.runner == self.runner_id else {}
+        progress = live.get('progress', job.progress)
+        total = live.get('total', job.total)
+        percent = job.percent
+        if total and not job.finished:
+            percent = min(100, int(progress * 100 / total))
+        return {
+            'id': job.id,
+            'kind': job.kind,
+            'status': job.status,
+            'progress': progress,
+            'total': total,
+            'percent': percent,
+            'message': live.get('message', job.message),
+            'result': json.loads(job.result) if job.result else None,
+            'download': bool(job.result_file),
+            'created_at': job.created_at.isoformat() if job.created_at else None,
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        }
+
+    def recover(self):
+        """
+        Fail jobs a previous run of this process left behind
+        Only jobs of this host whose process is gone are touched, so other workers'
+        jobs keep running.
+        """
+        host = socket.gethostname()
+        with self.app.app_context():
+            stale = []
+            for job_id, runner in db.session.execute(
+                db.select(Job.id, Job.runner).where(Job.status.in_([Job.QUEUED, Job.RUNNING]))
+            ):
+                # Queued jobs live only in the memory of the process that accepted them
+                if runner is None or (runner.rsplit(':', 1)[0] == host and not _process_alive(runner)):
+                    stale.append(job_id)
+            db.session.remove()
+        if stale:
+            with self.app.app_context():
+                with db.engine.begin() as connection:
+                    connection.execute(update(Job).where(Job.id.in_(stale)).values(
+                        status=Job.FAILED, finished_at=datetime.utcnow(),
+                        message='Interrupted by a restart.'))
+
+    def prune(self, days):
+        """Delete finished jobs older than days along with their result files"""
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        with self.app.app_context():
+            old = db.session.execute(
+                db.select(Job.id, Job.result_file)
+                .where(Job.status.in_([Job.SUCCEEDED, Job.FAILED]), Job.finished_at < cutoff)
+            ).all()
+            for _, path in old:
+                if path and os.path.exists(path):
+                    os.remove(path)
+            if old:
+                db.session.execute(db.delete(Job).where(Job.id.in_([job_id for job_id, _ in old])))
+                db.session.commit()
+            return len(old)
+
+
+def _process_alive(runner):
+    pid = int(runner.rsplit(':', 1)[1])
+    if pid == os.getpid():
+        return False  # a new runner in the same pid means the old one is gone
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def init_jobs(app):
+    """Start the job runner; job types are registered by the modules that define them"""
+    runner = app.extensions['jobs'] = JobRunner(app)
+    runner.recover()
+    return runner
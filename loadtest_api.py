@@ -0,0 +1,203 @@
+"""
+Concurrency load test for the JSON API
+Serves the same student records from the async API (uvicorn) and from the Flask
+app on a fixed pool of worker threads, then drives both with many slow clients
+that trickle their requests in over --delay seconds. The thread pool can only
+serve as many slow clients at once as it has threads; the event loop serves all.
+
+    python loadtest_api.py --clients 100,1000 --delay 0.5 --threads 16
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import socket
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.serving import BaseWSGIServer
+from benchmark import Bench, build_app, dataset_shape, percentile
+from generate_data import generate_dataset
+from models import db
+
+API_TOKEN = 'loadtest'
+BACKLOG = 4096
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """WSGI server with a fixed number of worker threads, like gunicorn's gthread worker"""
+    request_queue_size = BACKLOG
+
+    def __init__(self, host, port, app, threads):
+        super().__init__(host, port, app)
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def serve_flask(app, port, threads):
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    # Connections opened by the parent must not be shared with this process
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    PooledWSGIServer('127.0.0.1', port, app, threads).serve_forever()
+
+
+def serve_api(database_path, port):
+    import uvicorn
+    from api import create_api
+    from config import Config
+
+    class LoadTestConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{database_path}'
+
+    LoadTestConfig.API_TOKEN = API_TOKEN
+    uvicorn.run(create_api(LoadTestConfig), host='127.0.0.1', port=port,
+                log_level='warning', backlog=BACKLOG, access_log=False)
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'Server on port {port} did not start')
+
+
+async def slow_request(port, path, headers, delay):
+    """One request whose header lines arrive spread over delay seconds; returns the status"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        lines = [f'GET {path} HTTP/1.1', 'Host: 127.0.0.1', 'Connection: close']
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        for i, line in enumerate(lines):
+            if i:
+                await asyncio.sleep(delay / (len(lines) - 1))
+            writer.write(f'{line}\r\n'.encode())
+            await writer.drain()
+        writer.write(b'\r\n')
+        status_line = await reader.readline()
+        await reader.read()
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def drive(port, paths, headers, clients, requests, delay, timeout):
+    """clients concurrent slow clients making requests each; returns the summary"""
+    latencies, errors = [], 0
+
+    async def client():
+        nonlocal errors
+        for _ in range(requests):
+            started = time.perf_counter()
+            try:
+                status = await asyncio.wait_for(
+                    slow_request(port, random.choice(paths), headers, delay), timeout)
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                status = None
+            if status == 200:
+                latencies.append((time.perf_counter() - started) * 1000)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'requests': clients * requests,
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50), 1),
+        'p95_ms': round(percentile(latencies, 95), 1),
+        'max_ms': round(max(latencies, default=0.0), 1),
+    }
+
+
+def raise_open_file_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the async API with thread-pooled Flask under slow clients.')
+    parser.add_argument('--students', type=int, default=2000, help='Students in the scratch database.')
+    parser.add_argument('--clients', default='100,1000', help='Comma separated concurrent client counts.')
+    parser.add_argument('--requests', type=int, default=2, help='Requests per client.')
+    parser.add_argument('--delay', type=float, default=0.5, help='Seconds each client takes to send its request.')
+    parser.add_argument('--threads', type=int, default=16, help='Worker threads of the Flask server.')
+    parser.add_argument('--timeout', type=float, default=60.0, help='Seconds before a request counts as failed.')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    raise_open_file_limit()
+    workdir = tempfile.mkdtemp(prefix='school-loadtest-')
+    servers = []
+    try:
+        database_path = os.path.join(workdir, 'loadtest.db')
+        app = build_app(database_path, {})
+        with app.app_context():
+            generate_dataset(seed=args.seed, report=None, **dataset_shape(args.students))
+        bench = Bench(app)
+        cookie = bench.client.get_cookie('session').value
+        ids = list(range(1, args.students + 1))
+
+        context = multiprocessing.get_context('fork')
+        flask_port, api_port = free_port(), free_port()
+        servers = [
+            context.Process(target=serve_flask, args=(app, flask_port, args.threads), daemon=True),
+            context.Process(target=serve_api, args=(database_path, api_port), daemon=True),
+        ]
+        for server in servers:
+            server.start()
+        wait_for_port(flask_port)
+        wait_for_port(api_port)
+
+        targets = [
+            (f'flask ({args.threads} threads)', flask_port, [f'/students/{i}' for i in ids],
+             {'Cookie': f'session={cookie}'}),
+            ('async api', api_port, [f'/api/students/{i}' for i in ids],
+             {'Authorization': f'Bearer {API_TOKEN}'}),
+        ]
+        print(f'{args.students} students, {args.requests} requests per client, {args.delay}s to send each')
+        print(f'{"server":<22}{"clients":>8}{"requests":>10}{"errors":>8}{"req/s":>9}'
+              f'{"p50 ms":>10}{"p95 ms":>10}{"max ms":>10}')
+        for clients in [int(c) for c in args.clients.split(',')]:
+            for name, port, paths, headers in targets:
+                result = asyncio.run(drive(port, paths, headers, clients, args.requests, args.delay, args.timeout))
+                print(f'{name:<22}{clients:>8}{result["requests"]:>10}{result["errors"]:>8}'
+                      f'{result["throughput_rps"]:>9}{result["p50_ms"]:>10}{result["p95_ms"]:>10}{result["max_ms"]:>10}')
+    finally:
+        for server in servers:
+            server.terminate()
+            server.join()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,333 @@
+"""
+Prometheus-style metrics
+Per-endpoint request counters and latency histograms, DB pool stats, cache hit
+ratios and error counts, served at /metrics in the Prometheus text format
+"""
+import glob
+import json
+import os
+import threading
+import time
+from flask import Response, current_app, g, request, got_request_exception
+from models import db
+
+# Latency histogram bucket bounds, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Totals of exited processes, in METRICS_DIR next to the live metrics-<pid>.json files
+RETIRED = 'metrics-retired.json'
+
+# Label for requests that matched no route, so 404 scans cannot blow up cardinality
+UNMATCHED = '<unmatched>'
+
+HELP = {
+    'http_requests_total': ('counter', 'Requests handled, by endpoint, method and status.'),
+    'http_request_exceptions_total': ('counter', 'Unhandled exceptions, by endpoint and exception type.'),
+    'http_request_duration_seconds': ('histogram', 'Request latency, by endpoint.'),
+    'cache_hits_total': ('counter', 'Cache lookups that found an entry.'),
+    'cache_misses_total': ('counter', 'Cache lookups that found nothing.'),
+    'cache_hit_ratio': ('gauge', 'Hits over lookups, across all processes.'),
+    'db_pool_size': ('gauge', 'Configured connection pool size, per process.'),
+    'db_pool_checked_out': ('gauge', 'Connections in use, per process.'),
+    'db_pool_checked_in': ('gauge', 'Idle pooled connections, per process.'),
+    'db_pool_overflow': ('gauge', 'Connections above the pool size, per process.'),
+}
+
+
+class _Store:
+    """One thread's counters and histograms; only its own thread writes to it"""
+
+    def __init__(self):
+        self.thread = threading.current_thread()
+        self.counters = {}  # (name, labels) -> value
+        self.histograms = {}  # labels -> [bucket counts..., +Inf count, sum]
+
+    def merge_into(self, counters, histograms):
+        for key, value in dict(self.counters).items():
+            counters[key] = counters.get(key, 0) + value
+        for labels, values in dict(self.histograms).items():
+            total = histograms.setdefault(labels, [0] * (len(BUCKETS) + 2))
+            for i, value in enumerate(list(values)):
+                total[i] += value
+
+
+class Metrics:
+    """
+    Metric registry for one app
+    Each thread records into its own store without locking; stores are summed
+    when scraped. With METRICS_DIR set, every process also writes its totals
+    to a file there, and a scrape sums the files of all workers. Files of
+    exited processes are folded into one retired file, so the directory does
+    not grow with every restart and a reused pid starts from zero.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.directory = app.config['METRICS_DIR']
+        self.flush_interval = app.config['METRICS_FLUSH_INTERVAL']
+        self._local = threading.local()
+        self._stores = []
+        self._retired = _Store()  # totals of threads that have exited
+        self._lock = threading.Lock()  # guards the store list, not the counters
+        self._flush_lock = threading.Lock()
+        self._flushed_at = 0.0
+        self._pid = None  # process that last wrote, to notice forks
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def _store(self):
+        store = getattr(self._local, 'store', None)
+        if store is None:
+            store = self._local.store = _Store()
+            with self._lock:
+                self._stores.append(store)
+        return store
+
+    def inc(self, name, labels, value=1):
+        counters = self._store().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, labels, seconds):
+        histograms = self._store().histograms
+        values = histograms.get(labels)
+        if values is None:
+            values = histograms[labels] = [0] * (len(BUCKETS) + 2)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                values[i] += 1
+                break
+        else:
+            values[len(BUCKETS)] += 1
+        values[-1] += seconds
+
+    def snapshot(self):
+        """This process's totals: (counters, histograms, gauges)"""
+        counters, histograms = {}, {}
+        with self._lock:
+            live = []
+            for store in self._stores:
+                if store.thread.is_alive():
+                    live.append(store)
+                else:
+                    store.merge_into(self._retired.counters, self._retired.histograms)
+            self._stores = live
+            self._retired.merge_into(counters, histograms)
+        for store in live:
+            store.merge_into(counters, histograms)
+
+        # Cache counters are kept by the caches themselves
+        for name, extension in self.app.extensions.items():
+            backend = getattr(extension, 'backend', extension)
+            if hasattr(backend, 'hits') and hasattr(backend, 'misses'):
+                counters[('cache_hits_total', (('cache', name),))] = backend.hits
+                counters[('cache_misses_total', (('cache', name),))] = backend.misses
+
+        gauges = {}
+        for bind, engine in db.engines.items():
+            labels = (('bind', bind or 'default'), ('pid', str(os.getpid())))
+            for name, method in (('db_pool_size', 'size'), ('db_pool_checked_out', 'checkedout'),
+                                 ('db_pool_checked_in', 'checkedin'), ('db_pool_overflow', 'overflow')):
+                if hasattr(engine.pool, method):
+                    gauges[(name, labels)] = getattr(engine.pool, method)()
+        return counters, histograms, gauges
+
+    def maybe_flush(self):
+        """Write this process's totals to METRICS_DIR if the last write is old enough"""
+        if self.directory and time.monotonic() - self._flushed_at >= self.flush_interval:
+            # Another thread already writing is as good as writing now
+            if self._flush_lock.acquire(blocking=False):
+                try:
+                    self._write()
+                finally:
+                    self._flush_lock.release()
+
+    def flush(self):
+        """Write this process's totals to METRICS_DIR"""
+        with self._flush_lock:
+            self._write()
+
+    def _write(self):
+        self._flushed_at = time.monotonic()
+        counters, histograms, gauges = self.snapshot()
+        path = os.path.join(self.directory, f'metrics-{os.getpid()}.json')
+        if self._pid != os.getpid():
+            # A file under this pid before our first write is an exited process's
+            self._pid = os.getpid()
+            self._retire(path)
+        _dump(path, counters, histograms, gauges)
+
+    def _retire(self, path, pid=None):
+        """
+        Add an exited process's counters to the retired file and remove its file;
+        with pid, only if that process is still gone once the lock is held
+        """
+        import fcntl  # Unix only; METRICS_DIR is for multi-process servers
+        with open(os.path.join(self.directory, 'metrics.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if pid is not None and _alive(pid):
+                return  # the pid was reused in the meantime
+            data = _load(path)
+            if data is None:
+                return  # already retired by another worker
+            retired = os.path.join(self.directory, RETIRED)
+            counters, histograms = {}, {}
+            for merged in (_load(retired), data):
+                if merged is not None:
+                    _add(merged, counters, histograms)
+            _dump(retired, counters, histograms, {}, written_at=0)
+            os.remove(path)
+
+    def collect(self):
+        """Totals across every process (or just this one without METRICS_DIR)"""
+        if not self.directory:
+            return self.snapshot()
+
+        self.flush()
+        counters, histograms, gauges = {}, {}, {}
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            pid = os.path.basename(path)[len('metrics-'):-len('.json')]
+            if pid.isdigit() and not _alive(int(pid)):
+                self._retire(path, int(pid))
+
+        # Counters of exited workers still count; their gauges no longer apply
+        stale_before = time.time() - max(3 * self.flush_interval, 60)
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            data = _load(path)
+            if data is None:
+                continue
+            _add(data, counters, histograms)
+            if data['written_at'] >= stale_before:
+                for name, labels, value in data['gauges']:
+                    gauges[(name, tuple(map(tuple, labels)))] = value
+        return counters, histograms, gauges
+
+
+def _alive(pid):
+    """Whether a process with this pid exists on this host"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # someone else's process
+    return True
+
+
+def _load(path):
+    """A metrics file's contents, or None when it is gone or half written"""
+    try:
+        with open(path) as data_file:
+            return json.load(data_file)
+    except (OSError, ValueError):
+        return None
+
+
+def _dump(path, counters, histograms, gauges, written_at=None):
+    """Write totals to path atomically, through a temporary file"""
+    with open(path + '.tmp', 'w') as output:
+        json.dump({
+            'written_at': time.time() if written_at is None else written_at,
+            'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+            'histograms': [[labels, values] for labels, values in histograms.items()],
+            'gauges': [[name, labels, value] for (name, labels), value in gauges.items()],
+        }, output)
+    os.replace(path + '.tmp', path)
+
+
+def _add(data, counters, histograms):
+    """Add a metrics file's counters and histograms to the totals"""
+    for name, labels, value in data['counters']:
+        key = (name, tuple(map(tuple, labels)))
+        counters[key] = counters.get(key, 0) + value
+    for labels, values in data['histograms']:
+        total = histograms.setdefault(tuple(map(tuple, labels)), [0] * (len(BUCKETS) + 2))
+        for i, value in enumerate(values):
+            total[i] += value
+
+
+def init_metrics(app):
+    """Record every request and serve the totals at /metrics"""
+    metrics = app.extensions['metrics'] = Metrics(app)
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            endpoint = request.endpoint or UNMATCHED
+            metrics.inc('http_requests_total', (
+                ('endpoint', endpoint), ('method', request.method), ('status', str(response.status_code))
+            ))
+            metrics.observe((('endpoint', endpoint),), time.perf_counter() - started)
+            metrics.maybe_flush()
+        return response
+
+    def _record_exception(sender, exception, **extra):
+        metrics.inc('http_request_exceptions_total', (
+            ('endpoint', request.endpoint or UNMATCHED), ('exception', type(exception).__name__)
+        ))
+
+    got_request_exception.connect(_record_exception, app, weak=False)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+
+
+def metrics_view():
+    """
+    Prometheus scrape endpoint; protected by METRICS_TOKEN when it is set, and
+    disabled without one when METRICS_REQUIRE_TOKEN is on
+    """
+    token = current_app.config['METRICS_TOKEN']
+    if not token and current_app.config['METRICS_REQUIRE_TOKEN']:
+        return Response('Set METRICS_TOKEN to enable /metrics\n', status=403, mimetype='text/plain')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    counters, histograms, gauges = current_app.extensions['metrics'].collect()
+    return Response(render(counters, histograms, gauges), mimetype='text/plain; version=0.0.4')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join('{}="{}"'.format(key, str(value).replace('\\', r'\\').replace('"', r'\"'))
+                     for key, value in labels)
+    return '{' + pairs + '}'
+
+
+def render(counters, histograms, gauges):
+    """Prometheus text exposition of collected totals"""
+    series = {}
+    for (name, labels), value in counters.items():
+        series.setdefault(name, []).append(f'{name}{_format_labels(labels)} {value}')
+
+    # Hit ratios are computed from the summed counters, so they are right across processes
+    for (name, labels), hits in counters.items():
+        if name == 'cache_hits_total':
+            lookups = hits + counters.get(('cache_misses_total', labels), 0)
+            if lookups:
+                series.setdefault('cache_hit_ratio', []).append(
+                    f'cache_hit_ratio{_format_labels(labels)} {hits / lookups:.4f}')
+
+    for (name, labels), value in gauges.items():
+        series.setdefault(name, []).append(f'{name}{_format_labels(labels)} {value}')
+
+    name = 'http_request_duration_seconds'
+    for labels, values in sorted(histograms.items()):
+        lines = series.setdefault(name, [])
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), values):
+            cumulative += count
+            lines.append(f'{name}_bucket{_format_labels(labels + (("le", str(bound)),))} {cumulative}')
+        lines.append(f'{name}_sum{_format_labels(labels)} {values[-1]:.6f}')
+        lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+
+    output = []
+    for name in sorted(series):
+        kind, description = HELP.get(name, ('untyped', ''))
+        output.append(f'# HELP {name} {description}')
+        output.append(f'# TYPE {name} {kind}')
+        output.extend(sorted(series[name]) if kind != 'histogram' else series[name])
+    return '\n'.join(output) + '\n'
@@ -0,0 +1,184 @@
+"""
+Schema migrations for existing databases
+db.create_all() only creates missing tables, so changes to tables that already
+exist are applied here in order and recorded in the schema_version table.
+Each step spells out the schema it creates rather than reading it from
+models.py, so later model changes cannot change what a shipped step does.
+"""
+from datetime import datetime
+from sqlalchemy import Column, Date, DateTime, ForeignKey, Index, Integer, LargeBinary, MetaData, String, Table, \
+    inspect, text
+from counters import refresh_class_counters
+from summaries import rebuild_summaries
+
+MIGRATIONS = []
+
+# Tables as their migrations first created them; later steps alter them in place
+_schema = MetaData()
+
+# Referenced by the foreign keys below, never created here
+Table('students', _schema, Column('id', Integer, primary_key=True))
+
+_class_stats = Table(
+    'class_stats', _schema,
+    Column('class_id', Integer, primary_key=True, autoincrement=False),
+    Column('grade', String(10), nullable=False),
+    Column('section', String(10), nullable=False),
+    Column('student_count', Integer, nullable=False),
+    Column('assignment_count', Integer, nullable=False),
+    Column('subject_count', Integer, nullable=False),
+    Column('teacher_count', Integer, nullable=False),
+    Index('ix_class_stats_grade_section', 'grade', 'section'),
+)
+
+_class_subject_stats = Table(
+    'class_subject_stats', _schema,
+    Column('class_id', Integer, primary_key=True, autoincrement=False),
+    Column('subject_name', String(100), primary_key=True),
+    Column('teacher_count', Integer, nullable=False),
+)
+
+_teacher_load = Table(
+    'teacher_load', _schema,
+    Column('teacher_id', Integer, primary_key=True, autoincrement=False),
+    Column('full_name', String(100), nullable=False),
+    Column('subject', String(100), nullable=False),
+    Column('assignment_count', Integer, nullable=False),
+    Column('class_count', Integer, nullable=False),
+    Column('student_count', Integer, nullable=False),
+    Index('ix_teacher_load_assignment_count', 'assignment_count'),
+)
+
+_terms = Table(
+    'terms', _schema,
+    Column('id', Integer, primary_key=True),
+    Column('name', String(50), unique=True, nullable=False),
+    Column('start_date', Date, nullable=False),
+    Column('end_date', Date, nullable=False),
+    Column('created_at', DateTime),
+)
+
+_attendance = Table(
+    'attendance', _schema,
+    Column('term_id', Integer, ForeignKey('terms.id'), primary_key=True),
+    Column('student_id', Integer, ForeignKey('students.id'), primary_key=True),
+    Column('class_id', Integer, nullable=False),
+    Column('marked', LargeBinary, nullable=False),
+    Column('present', LargeBinary, nullable=False),
+    Column('updated_at', DateTime),
+    Index('ix_attendance_student_id', 'student_id'),
+    sqlite_with_rowid=False,
+)
+
+
+def migration(version, description):
+    """Register a migration step; steps must be safe to run on a fresh schema"""
+    def decorator(f):
+        MIGRATIONS.append((version, description, f))
+        return f
+    return decorator
+
+
+def add_column(conn, table, column, ddl):
+    """Add a column unless create_all() already created it"""
+    existing = {c['name'] for c in inspect(conn).get_columns(table)}
+    if column not in existing:
+        conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+
+
+@migration(1, 'Counter columns on classes')
+def add_class_counters(conn):
+    add_column(conn, 'classes', 'student_count', 'INTEGER NOT NULL DEFAULT 0')
+    add_column(conn, 'classes', 'assignment_count', 'INTEGER NOT NULL DEFAULT 0')
+    refresh_class_counters(conn)
+
+
+@migration(2, 'Indexes for list filters, sorts and class lookups')
+def add_query_indexes(conn):
+    # Spelled out rather than read from the models: migration 3 later makes the
+    # grade/section index unique, and must find any duplicates first
+    for statement in (
+        'CREATE INDEX IF NOT EXISTS ix_students_created_at ON students (created_at)',
+        'CREATE INDEX IF NOT EXISTS ix_students_class_id_created_at ON students (class_id, created_at)',
+        'CREATE INDEX IF NOT EXISTS ix_teachers_created_at ON teachers (created_at)',
+        'CREATE INDEX IF NOT EXISTS ix_classes_grade_section ON classes (grade, section)',
+        'CREATE INDEX IF NOT EXISTS ix_subject_assignments_class_id ON subject_assignments (class_id)',
+    ):
+        conn.execute(text(statement))
+    # Give the planner row counts for choosing between the new indexes
+    if conn.dialect.name == 'sqlite':
+        conn.execute(text('ANALYZE'))
+
+
+@migration(3, 'Unique grade/section for classes')
+def unique_class_names(conn):
+    duplicates = conn.execute(text(
+        'SELECT grade, section FROM classes GROUP BY grade, section HAVING COUNT(*) > 1'
+    )).all()
+    if duplicates:
+        names = ', '.join(f'{grade}-{section}' for grade, section in duplicates)
+        raise RuntimeError(f'Merge or rename duplicate classes before upgrading: {names}')
+    conn.execute(text('DROP INDEX IF EXISTS ix_classes_grade_section'))
+    conn.execute(text('CREATE UNIQUE INDEX ix_classes_grade_section ON classes (grade, section)'))
+
+
+@migration(4, 'updated_at indexes for conditional GET fingerprints')
+def add_updated_at_indexes(conn):
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_students_updated_at ON students (updated_at)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_teachers_updated_at ON teachers (updated_at)'))
+
+
+@migration(5, 'Materialized report summaries')
+def add_report_summaries(conn):
+    for table in (_class_stats, _class_subject_stats, _teacher_load):
+        table.create(conn, checkfirst=True)
+    rebuild_summaries(conn)
+
+
+@migration(6, 'Timetable columns')
+def add_timetable_columns(conn):
+    add_column(conn, 'subject_assignments', 'periods_per_week', 'INTEGER')
+    add_column(conn, 'subject_assignments', 'timetable_slots', 'BIGINT NOT NULL DEFAULT 0')
+    add_column(conn, 'teachers', 'unavailable_slots', 'BIGINT NOT NULL DEFAULT 0')
+
+
+@migration(7, 'Terms and attendance bitmaps')
+def add_attendance(conn):
+    for table in (_terms, _attendance):
+        table.create(conn, checkfirst=True)
+
+
+@migration(8, 'Class names on attendance rows')
+def add_attendance_class_names(conn):
+    add_column(conn, 'attendance', 'grade', "VARCHAR(10) NOT NULL DEFAULT ''")
+    add_column(conn, 'attendance', 'section', "VARCHAR(10) NOT NULL DEFAULT ''")
+    # Rows marked before this migration take their class's current name
+    conn.execute(text(
+        "UPDATE attendance SET "
+        "grade = (SELECT grade FROM classes WHERE classes.id = attendance.class_id), "
+        "section = (SELECT section FROM classes WHERE classes.id = attendance.class_id) "
+        "WHERE grade = '' AND class_id IN (SELECT id FROM classes)"
+    ))
+
+
+def upgrade(engine, logger=None):
+    """Apply every migration newer than the recorded schema version"""
+    with engine.begin() as conn:
+        conn.execute(text(
+            'CREATE TABLE IF NOT EXISTS schema_version ('
+            'version INTEGER PRIMARY KEY, description VARCHAR(200), applied_at DATETIME)'
+        ))
+        current = conn.execute(text('SELECT MAX(version) FROM schema_version')).scalar() or 0
+
+    for version, description, step in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version <= current:
+            continue
+        with engine.begin() as conn:
+            step(conn)
+            conn.execute(
+                text('INSERT INTO schema_version (version, description, applied_at) '
+                     'VALUES (:version, :description, :applied_at)'),
+                {'version': version, 'description': description, 'applied_at': datetime.utcnow()}
+            )
+        if logger:
+            logger.info(f'Applied schema migration {version}: {description}')
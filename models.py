@@ -3,11 +3,32 @@ Database models for School Management System
 Using SQLAlchemy ORM for database operations
 """
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from flask_login import UserMixin
+from sqlalchemy.sql.dml import UpdateBase
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 
-db = SQLAlchemy()
+# Bind key of the optional read-only engine (see sqlite_profile.py)
+READ_BIND = 'read'
+
+
+class RoutingSession(Session):
+    """
+    Session that sends queries to the read-only engine while info['read_only']
+    is set (GET requests); flushes and write statements use the primary engine
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get('read_only') and not self._flushing \
+                and not isinstance(clause, UpdateBase):
+            engine = self._db.engines.get(READ_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 
 class User(UserMixin, db.Model):
@@ -57,13 +78,19 @@ class Student(db.Model):
     email = db.Column(db.String(120), unique=True, nullable=True)
     phone = db.Column(db.String(20), nullable=True)
     address = db.Column(db.Text, nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Foreign key to Class
     class_id = db.Column(db.Integer, db.ForeignKey('classes.id'), nullable=True)
     class_obj = db.relationship('Class', backref='students')
     
+    # Attendance bitmaps, one per term
+    attendance = db.relationship('Attendance', backref='student', cascade='all, delete-orphan')
+    
+    # Class filter in newest-first order (SQLite appends the rowid, so keyset pages use it too)
+    __table_args__ = (db.Index('ix_students_class_id_created_at', 'class_id', 'created_at'),)
+    
     def __repr__(self):
         return f'<Student {self.student_id}: {self.full_name}>'
 
@@ -83,8 +110,10 @@ class Teacher(db.Model):
     email = db.Column(db.String(120), unique=True, nullable=True)
     phone = db.Column(db.String(20), nullable=True)
     joining_date = db.Column(db.Date, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Timetable slots the teacher cannot teach, as a bitmask (see timetable.py)
+    unavailable_slots = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Foreign key to User for authentication
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, unique=True)
@@ -108,9 +137,16 @@ class Class(db.Model):
     section = db.Column(db.String(10), nullable=False)  # e.g., "A", "B", "Science", "Arts"
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Denormalized counters, maintained by ORM events in counters.py
+    student_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    assignment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
     # Many-to-many relationship with Teachers through SubjectAssignment
     teachers = db.relationship('SubjectAssignment', back_populates='class_obj', cascade='all, delete-orphan')
     
+    # One class per grade/section; also serves the grade/section ordering of every class list
+    __table_args__ = (db.Index('ix_classes_grade_section', 'grade', 'section', unique=True),)
+    
     def get_display_name(self):
         """Get formatted class name"""
         return f"{self.grade}-{self.section}"
@@ -128,8 +164,11 @@ class SubjectAssignment(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     teacher_id = db.Column(db.Integer, db.ForeignKey('teachers.id'), nullable=False)
-    class_id = db.Column(db.Integer, db.ForeignKey('classes.id'), nullable=False)
+    class_id = db.Column(db.Integer, db.ForeignKey('classes.id'), nullable=False, index=True)
     subject_name = db.Column(db.String(100), nullable=False)
+    periods_per_week = db.Column(db.Integer, nullable=True)  # None: TIMETABLE_DEFAULT_PERIODS
+    # Scheduled lessons as a bitmask of week slots, written by the timetable solver
+    timetable_slots = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -142,3 +181,177 @@ class SubjectAssignment(db.Model):
     def __repr__(self):
         return f'<SubjectAssignment Teacher:{self.teacher_id} Class:{self.class_id} Subject:{self.subject_name}>'
 
+
+class ClassStats(db.Model):
+    """
+    Materialized per-class report figures
+    Maintained by the ORM events in summaries.py, so reports never scan students
+    or subject_assignments; class_id mirrors classes.id
+    """
+    __tablename__ = 'class_stats'
+    
+    class_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    grade = db.Column(db.String(10), nullable=False)
+    section = db.Column(db.String(10), nullable=False)
+    student_count = db.Column(db.Integer, nullable=False, default=0)
+    assignment_count = db.Column(db.Integer, nullable=False, default=0)
+    subject_count = db.Column(db.Integer, nullable=False, default=0)  # distinct subjects taught
+    teacher_count = db.Column(db.Integer, nullable=False, default=0)  # distinct teachers
+    
+    __table_args__ = (db.Index('ix_class_stats_grade_section', 'grade', 'section'),)
+    
+    def __repr__(self):
+        return f'<ClassStats {self.grade}-{self.section}: {self.student_count} students>'
+
+
+class ClassSubjectStats(db.Model):
+    """
+    Teachers per subject of each class, for finding classes missing a subject
+    Maintained with ClassStats by summaries.py
+    """
+    __tablename__ = 'class_subject_stats'
+    
+    class_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    subject_name = db.Column(db.String(100), primary_key=True)
+    teacher_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<ClassSubjectStats {self.class_id}:{self.subject_name}>'
+
+
+class TeacherLoad(db.Model):
+    """
+    Materialized per-teacher workload
+    student_count counts each student of a class the teacher teaches once,
+    however many subjects the teacher has in that class; teacher_id mirrors teachers.id
+    """
+    __tablename__ = 'teacher_load'
+    
+    teacher_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    full_name = db.Column(db.String(100), nullable=False)
+    subject = db.Column(db.String(100), nullable=False)
+    assignment_count = db.Column(db.Integer, nullable=False, default=0)
+    class_count = db.Column(db.Integer, nullable=False, default=0)  # distinct classes
+    student_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    # The report lists the busiest teachers first
+    __table_args__ = (db.Index('ix_teacher_load_assignment_count', 'assignment_count'),)
+    
+    def __repr__(self):
+        return f'<TeacherLoad {self.teacher_id}: {self.assignment_count} assignments>'
+
+
+class Term(db.Model):
+    """
+    School term
+    Attendance bitmaps have one bit per calendar day from start_date to end_date,
+    so the dates are fixed once the term is created
+    """
+    __tablename__ = 'terms'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    @property
+    def days(self):
+        """Calendar days in the term, i.e. bits per attendance bitmap"""
+        return (self.end_date - self.start_date).days + 1
+    
+    def contains(self, day):
+        return self.start_date <= day <= self.end_date
+    
+    def __repr__(self):
+        return f'<Term {self.name}>'
+
+
+class Attendance(db.Model):
+    """
+    One student's attendance over one term, as two packed bitmaps
+    Bit d (byte d // 8, bit d % 8) stands for day d of the term: set in marked
+    when the student's class took attendance that day, set in present when the
+    student was there. See attendance.py.
+    """
+    __tablename__ = 'attendance'
+    
+    term_id = db.Column(db.Integer, db.ForeignKey('terms.id'), primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id'), primary_key=True)
+    # The student's class when last marked, with its name at the time: promotions
+    # rename classes and graduation deletes them, and past terms report as marked
+    class_id = db.Column(db.Integer, nullable=False)
+    grade = db.Column(db.String(10), nullable=False, default='', server_default='')
+    section = db.Column(db.String(10), nullable=False, default='', server_default='')
+    marked = db.Column(db.LargeBinary, nullable=False)
+    present = db.Column(db.LargeBinary, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Stored in primary key order, so a term report reads one contiguous range
+    __table_args__ = (db.Index('ix_attendance_student_id', 'student_id'), {'sqlite_with_rowid': False})
+    
+    def __repr__(self):
+        return f'<Attendance Student:{self.student_id} Term:{self.term_id}>'
+
+
+class Job(db.Model):
+    """
+    Background job
+    Long admin operations run in the job runner (jobs.py); this row records
+    their progress and outcome so any worker process can report on them
+    """
+    __tablename__ = 'jobs'
+    
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # registered job type, e.g. "import_students"
+    status = db.Column(db.String(20), nullable=False, default=QUEUED, index=True)
+    params = db.Column(db.Text, nullable=False, default='{}')  # JSON arguments of the job function
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=True)  # None while the amount of work is unknown
+    message = db.Column(db.String(200), nullable=True)
+    result = db.Column(db.Text, nullable=True)  # JSON summary
+    result_file = db.Column(db.String(500), nullable=True)  # path of the downloadable output
+    result_name = db.Column(db.String(200), nullable=True)  # download file name
+    error = db.Column(db.Text, nullable=True)
+    runner = db.Column(db.String(100), nullable=True)  # "host:pid" of the process running it
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)
+    user = db.relationship('User')
+    
+    @property
+    def finished(self):
+        return self.status in (self.SUCCEEDED, self.FAILED)
+    
+    @property
+    def percent(self):
+        """Completion percentage, or None when the total is unknown"""
+        if self.status == self.SUCCEEDED:
+            return 100
+        if not self.total:
+            return None
+        return min(100, int(self.progress * 100 / self.total))
+    
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind}:{self.status}>'
+
+
+class CacheVersion(db.Model):
+    """
+    Version counters for cached reference data
+    Bumped in the same transaction that changes the underlying table
+    """
+    __tablename__ = 'cache_versions'
+    
+    name = db.Column(db.String(50), primary_key=True)  # table name, e.g. "classes"
+    version = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<CacheVersion {self.name}:{self.version}>'
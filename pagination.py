@@ -0,0 +1,92 @@
+"""
+Keyset (cursor) pagination for the list views
+Pages are keyed on (created_at, id), so every page costs the same as the first
+"""
+from datetime import datetime
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeSerializer
+from models import db
+
+
+class KeysetPage:
+    """
+    One page of keyset-paginated results, newest first
+    Mirrors the parts of Flask-SQLAlchemy's Pagination used by the templates
+    """
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total  # None when the count was skipped
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def _serializer():
+    """Signs cursors so they stay opaque and cannot be tampered with"""
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='list-cursor')
+
+
+def encode_cursor(direction, row):
+    """Build an opaque token pointing before ('prev') or after ('next') a row"""
+    return _serializer().dumps([direction, row.created_at.isoformat(), row.id])
+
+
+def decode_cursor(token):
+    """Return (direction, created_at, id) for a token, or None if it is invalid"""
+    try:
+        direction, created_at, row_id = _serializer().loads(token)
+        return direction, datetime.fromisoformat(created_at), int(row_id)
+    except (BadSignature, ValueError, TypeError):
+        return None
+
+
+def keyset_paginate(query, model, cursor=None, per_page=10, with_count=True):
+    """
+    Paginate a query newest first using a cursor from a previous page.
+    Any ordering already on the query is replaced by (created_at, id).
+    """
+    position = decode_cursor(cursor) if cursor else None
+    total = query.order_by(None).count() if with_count else None
+
+    newest_first = (model.created_at.desc(), model.id.desc())
+    oldest_first = (model.created_at.asc(), model.id.asc())
+
+    if position is None:
+        rows = query.order_by(None).order_by(*newest_first).limit(per_page + 1).all()
+        items, has_more = rows[:per_page], len(rows) > per_page
+        has_next, has_prev = has_more, False
+    else:
+        direction, created_at, row_id = position
+        if direction == 'prev':
+            # Rows newer than the cursor, fetched oldest first then reversed
+            query = query.filter(db.or_(
+                model.created_at > created_at,
+                db.and_(model.created_at == created_at, model.id > row_id)
+            ))
+            rows = query.order_by(None).order_by(*oldest_first).limit(per_page + 1).all()
+            items = list(reversed(rows[:per_page]))
+            has_next, has_prev = True, len(rows) > per_page
+        else:
+            # Rows older than the cursor
+            query = query.filter(db.or_(
+                model.created_at < created_at,
+                db.and_(model.created_at == created_at, model.id < row_id)
+            ))
+            rows = query.order_by(None).order_by(*newest_first).limit(per_page + 1).all()
+            items = rows[:per_page]
+            has_next, has_prev = len(rows) > per_page, True
+
+    return KeysetPage(
+        items,
+        next_cursor=encode_cursor('next', items[-1]) if items and has_next else None,
+        prev_cursor=encode_cursor('prev', items[0]) if items and has_prev else None,
+        total=total
+    )
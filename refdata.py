@@ -0,0 +1,84 @@
+"""
+Reference data cache for form choice lists
+Choice tuples are kept per process and rebuilt only when the version row
+of their table changes, so every worker sees a commit on its next request
+"""
+import threading
+from flask import g
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from models import db, CacheVersion, Class, Teacher
+from cache import changed_tables
+
+# Tables whose changes invalidate cached choice lists
+REFERENCE_TABLES = frozenset(['classes', 'teachers'])
+
+_choices = {}  # (database url, table name) -> (version, choice tuples)
+_lock = threading.Lock()
+
+
+def init_refdata(app):
+    """Create the version rows so later bumps are plain UPDATEs"""
+    with app.app_context():
+        existing = set(db.session.scalars(select(CacheVersion.name)))
+        for name in REFERENCE_TABLES - existing:
+            db.session.add(CacheVersion(name=name, version=0))
+        db.session.commit()
+
+
+def _versions():
+    """Current version of every reference table, read once per request"""
+    if 'refdata_versions' not in g:
+        g.refdata_versions = dict(db.session.execute(select(CacheVersion.name, CacheVersion.version)).all())
+    return g.refdata_versions
+
+
+def table_version(name):
+    """Version of a reference table; moves on every commit that changes it"""
+    return _versions().get(name, 0)
+
+
+def _cached(name, build):
+    """Return the choices for a table, rebuilding them if its version moved"""
+    version = table_version(name)
+    key = (str(db.engine.url), name)
+    entry = _choices.get(key)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    choices = build()
+    with _lock:
+        _choices[key] = (version, choices)
+    return choices
+
+
+def class_choices():
+    """(id, display name) for every class, ordered by grade and section"""
+    return _cached('classes', lambda: [
+        (class_id, f'{grade}-{section}')
+        for class_id, grade, section in db.session.execute(
+            select(Class.id, Class.grade, Class.section).order_by(Class.grade, Class.section)
+        )
+    ])
+
+
+def teacher_choices():
+    """(id, "name (subject)") for every teacher, ordered by name"""
+    return _cached('teachers', lambda: [
+        (teacher_id, f'{full_name} ({subject})')
+        for teacher_id, full_name, subject in db.session.execute(
+            select(Teacher.id, Teacher.full_name, Teacher.subject).order_by(Teacher.full_name)
+        )
+    ])
+
+
+@event.listens_for(Session, 'before_commit')
+def _bump_versions(session):
+    # Flush first so the tables of pending changes are recorded too
+    session.flush()
+    changed = changed_tables(session) & REFERENCE_TABLES
+    for name in changed:
+        session.execute(
+            db.update(CacheVersion)
+            .where(CacheVersion.name == name)
+            .values(version=CacheVersion.version + 1)
+        )
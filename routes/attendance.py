@@ -0,0 +1,195 @@
+"""
+Attendance routes
+Terms, marking a class for a day, and attendance by student, class and grade
+"""
+from datetime import date
+from functools import wraps
+from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app
+from flask_login import login_required, current_user
+from sqlalchemy import delete, func, select
+from models import db, Student, Teacher, Class, Term, Attendance, SubjectAssignment
+from forms import TermForm, AttendanceForm
+from attendance import term_for, overlapping_term, class_attendance, mark_class, student_attendance, term_report
+
+attendance_bp = Blueprint('attendance', __name__)
+
+# Lowest-attendance classes and days listed on the term report
+CLASS_LIMIT = 50
+DAY_LIMIT = 10
+
+
+def admin_required(f):
+    """Decorator to require admin role"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_user.is_authenticated or not current_user.is_admin():
+            flash('Access denied. Admin privileges required.', 'error')
+            return redirect(url_for('dashboard.index'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def can_mark(class_id):
+    """Admins mark any class, teachers only the classes they are assigned to"""
+    if current_user.is_admin():
+        return True
+    return db.session.scalar(
+        select(SubjectAssignment.id)
+        .join(Teacher, Teacher.id == SubjectAssignment.teacher_id)
+        .where(Teacher.user_id == current_user.id, SubjectAssignment.class_id == class_id)
+        .limit(1)
+    ) is not None
+
+
+@attendance_bp.route('/')
+@login_required
+def index():
+    """
+    List terms with the number of students that have attendance in each
+    """
+    terms = db.session.execute(
+        select(Term, func.count(Attendance.student_id).label('students'))
+        .outerjoin(Attendance, Attendance.term_id == Term.id)
+        .group_by(Term.id)
+        .order_by(Term.start_date.desc())
+    ).all()
+    return render_template('attendance/index.html', terms=terms, current=term_for(date.today()))
+
+
+@attendance_bp.route('/terms/create', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def create_term():
+    """
+    Create a new term
+    """
+    form = TermForm()
+
+    if form.validate_on_submit():
+        overlap = overlapping_term(form.start_date.data, form.end_date.data)
+        if Term.query.filter_by(name=form.name.data).first():
+            flash('A term with this name already exists!', 'error')
+        elif overlap:
+            flash(f'The dates overlap term {overlap.name}.', 'error')
+        else:
+            term = Term(name=form.name.data, start_date=form.start_date.data, end_date=form.end_date.data)
+            try:
+                db.session.add(term)
+                db.session.commit()
+                flash(f'Term {term.name} created successfully!', 'success')
+                return redirect(url_for('attendance.index'))
+            except Exception as e:
+                db.session.rollback()
+                flash(f'Error creating term: {str(e)}', 'error')
+
+    return render_template('attendance/term_form.html', form=form)
+
+
+@attendance_bp.route('/terms/<int:term_id>/delete', methods=['POST'])
+@login_required
+@admin_required
+def delete_term(term_id):
+    """
+    Delete a term with all of its attendance
+    """
+    term = Term.query.get_or_404(term_id)
+    term_name = term.name
+
+    try:
+        db.session.execute(delete(Attendance).where(Attendance.term_id == term_id))
+        db.session.delete(term)
+        db.session.commit()
+        flash(f'Term {term_name} deleted successfully!', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error deleting term: {str(e)}', 'error')
+
+    return redirect(url_for('attendance.index'))
+
+
+@attendance_bp.route('/class/<int:class_id>', methods=['GET', 'POST'])
+@login_required
+def view_class(class_id):
+    """
+    Mark a class's attendance for one day (?day=, default today) and show each
+    student's term so far; only admins and the class's teachers can mark
+    """
+    class_obj = Class.query.get_or_404(class_id)
+    form = AttendanceForm()
+    editable = can_mark(class_id)
+
+    if form.is_submitted() and not editable:
+        flash('Access denied. Only admins and the class\'s teachers can mark attendance.', 'error')
+        return redirect(url_for('attendance.view_class', class_id=class_id))
+
+    if form.validate_on_submit():
+        day = form.day.data
+        term = term_for(day)
+        if term is None:
+            flash(f'No term includes {day:%Y-%m-%d}; create one first.', 'error')
+        else:
+            try:
+                marked = mark_class(term, class_id, day, form.present.data)
+                db.session.commit()
+                flash(f'Attendance for {day:%Y-%m-%d} saved for {marked} students.', 'success')
+                return redirect(url_for('attendance.view_class', class_id=class_id, day=day.isoformat()))
+            except Exception as e:
+                db.session.rollback()
+                flash(f'Error saving attendance: {str(e)}', 'error')
+
+    if not form.is_submitted():
+        form.day.data = request.args.get('day', default=date.today(), type=date.fromisoformat)
+    day = form.day.data or date.today()
+    term = term_for(day)
+    students = class_attendance(term, class_id, day) if term else []
+    return render_template('attendance/class.html',
+                           form=form,
+                           class_obj=class_obj,
+                           term=term,
+                           day=day,
+                           students=students,
+                           editable=editable)
+
+
+@attendance_bp.route('/student/<int:student_id>')
+@login_required
+def view_student(student_id):
+    """
+    A student's attendance in every term, with the days absent
+    """
+    student = Student.query.get_or_404(student_id)
+    return render_template('attendance/student.html',
+                           student=student,
+                           terms=student_attendance(student_id))
+
+
+@attendance_bp.route('/report')
+@login_required
+def report():
+    """
+    Term attendance by grade and class
+    ?term= picks the term (default: the current or latest one), ?grade= limits
+    the class table to one grade
+    """
+    terms = Term.query.order_by(Term.start_date.desc()).all()
+    term_id = request.args.get('term', type=int)
+    term = next((t for t in terms if t.id == term_id), None) or term_for(date.today()) or \
+        (terms[0] if terms else None)
+    if term is None:
+        flash('No terms yet.', 'info')
+        return redirect(url_for('attendance.index'))
+
+    summary = term_report(term, current_app.config['ATTENDANCE_LOW_THRESHOLD'])
+    grade = request.args.get('grade', '').strip()
+    classes = [row for row in summary.classes if not grade or row['grade'] == grade]
+    classes.sort(key=lambda row: row['rate'] if row['rate'] is not None else 1.0)
+    days = sorted(summary.daily, key=lambda day: day[1] / day[2])
+
+    return render_template('attendance/report.html',
+                           terms=terms,
+                           report=summary,
+                           grade=grade,
+                           classes=classes[:CLASS_LIMIT],
+                           class_total=len(classes),
+                           days=days[:DAY_LIMIT],
+                           class_limit=CLASS_LIMIT)
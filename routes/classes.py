@@ -2,13 +2,31 @@
 Class and Subject Management routes
 Handles CRUD operations for classes and subject assignments
 """
-from flask import Blueprint, render_template, request, flash, redirect, url_for
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, current_app, abort
 from flask_login import login_required, current_user
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload, load_only
 from models import db, Class, Student, Teacher, SubjectAssignment
-from forms import ClassForm, SubjectAssignmentForm
+from forms import ClassForm, SubjectAssignmentForm, PromoteForm
+from counters import class_counts_query
+from refdata import class_choices, teacher_choices, table_version
+from writes import save
+from bulk import promote_classes, promotion_plan
+from conditional import change_stamp, conditional
+from staffing import build_matrix
+from timetable import resolve_after_change
 
 classes_bp = Blueprint('classes', __name__)
 
+# Loader strategies for the class detail page: only the columns it shows,
+# with each assignment's teacher joined into the same query
+DETAIL_STUDENT_OPTIONS = (
+    load_only(Student.id, Student.student_id, Student.full_name, Student.email, Student.phone),
+)
+DETAIL_ASSIGNMENT_OPTIONS = (
+    joinedload(SubjectAssignment.teacher).load_only(Teacher.id, Teacher.teacher_id, Teacher.full_name),
+)
+
 
 def admin_required(f):
     """Decorator to require admin role"""
@@ -28,22 +46,64 @@ def list_classes():
     """
     List all classes with their students and teachers
     """
-    classes = Class.query.order_by(Class.grade, Class.section).all()
+    # Counts move with students and assignments; names with the classes version
+    stamp = db.session.execute(select(*change_stamp(Student.updated_at),
+                                      *change_stamp(SubjectAssignment.created_at))).one()
+    not_modified = conditional('classes', *stamp, table_version('classes'), weak=True)
+    if not_modified:
+        return not_modified
+    
+    # Get statistics for each class in one query
+    if current_app.config['CLASS_COUNTER_CACHE']:
+        rows = [(c, c.student_count, c.assignment_count)
+                for c in Class.query.order_by(Class.grade, Class.section).all()]
+    else:
+        rows = class_counts_query().all()
     
-    # Get statistics for each class
-    class_data = []
-    for class_obj in classes:
-        student_count = Student.query.filter_by(class_id=class_obj.id).count()
-        assignment_count = SubjectAssignment.query.filter_by(class_id=class_obj.id).count()
-        class_data.append({
-            'class': class_obj,
-            'student_count': student_count,
-            'assignment_count': assignment_count
-        })
+    class_data = [{
+        'class': class_obj,
+        'student_count': student_count,
+        'assignment_count': assignment_count
+    } for class_obj, student_count, assignment_count in rows]
     
     return render_template('classes/list.html', class_data=class_data)
 
 
+def _staffing_not_modified():
+    """304 if the client has the matrix for the current assignments, classes and teachers"""
+    stamp = db.session.execute(select(*change_stamp(SubjectAssignment.created_at))).one()
+    return conditional('staffing', *stamp, table_version('classes'), table_version('teachers'),
+                       current_app.config['STAFFING_MAX_ASSIGNMENTS'])
+
+
+@classes_bp.route('/staffing')
+@login_required
+@admin_required
+def staffing():
+    """
+    Teacher x class x subject matrix, with unstaffed subjects and overloaded teachers highlighted
+    """
+    not_modified = _staffing_not_modified()
+    if not_modified:
+        return not_modified
+    matrix = build_matrix(current_app.config['STAFFING_MAX_ASSIGNMENTS'])
+    overloaded = sorted((t for t in matrix.teachers if t['overloaded']), key=lambda t: -t['assignments'])
+    return render_template('classes/staffing.html', matrix=matrix, overloaded=overloaded)
+
+
+@classes_bp.route('/staffing.json')
+@login_required
+@admin_required
+def staffing_json():
+    """
+    The staffing matrix as JSON; cells hold teacher ids
+    """
+    not_modified = _staffing_not_modified()
+    if not_modified:
+        return not_modified
+    return jsonify(build_matrix(current_app.config['STAFFING_MAX_ASSIGNMENTS']).to_dict())
+
+
 @classes_bp.route('/create', methods=['GET', 'POST'])
 @login_required
 @admin_required
@@ -54,27 +114,16 @@ def create_class():
     form = ClassForm()
     
     if form.validate_on_submit():
-        # Check if class already exists
-        existing = Class.query.filter_by(
-            grade=form.grade.data,
-            section=form.section.data
-        ).first()
-        
-        if existing:
-            flash(f'Class {existing.get_display_name()} already exists.', 'error')
-            return render_template('classes/form.html', form=form, action='Create')
-        
-        # Create new class
+        # Create new class (duplicates are caught by the unique grade/section index)
         new_class = Class(
             grade=form.grade.data,
             section=form.section.data
         )
         
         try:
-            db.session.add(new_class)
-            db.session.commit()
-            flash(f'Class {new_class.get_display_name()} created successfully!', 'success')
-            return redirect(url_for('classes.list_classes'))
+            if save(form, new_class):
+                flash(f'Class {new_class.get_display_name()} created successfully!', 'success')
+                return redirect(url_for('classes.list_classes'))
         except Exception as e:
             db.session.rollback()
             flash(f'Error creating class: {str(e)}', 'error')
@@ -82,6 +131,34 @@ def create_class():
     return render_template('classes/form.html', form=form, action='Create')
 
 
+@classes_bp.route('/promote', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def promote():
+    """
+    Year-end promotion: move every class up one grade in one transaction
+    """
+    form = PromoteForm()
+    
+    if form.validate_on_submit():
+        try:
+            promoted, graduated, released = promote_classes(form.top_grade.data)
+            db.session.commit()
+            flash(f'Promoted {promoted} classes; {graduated} final-grade classes graduated '
+                  f'({released} students left without a class).', 'success')
+            return redirect(url_for('classes.list_classes'))
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error promoting classes: {str(e)}', 'error')
+    
+    classes_by_grade, graduating_classes, graduating_students = promotion_plan(form.top_grade.data or 12)
+    return render_template('classes/promote.html',
+                         form=form,
+                         classes_by_grade=classes_by_grade,
+                         graduating_classes=graduating_classes,
+                         graduating_students=graduating_students)
+
+
 @classes_bp.route('/<int:class_id>/delete', methods=['POST'])
 @login_required
 @admin_required
@@ -109,14 +186,35 @@ def view_class(class_id):
     """
     View class details including students and teachers
     """
+    # Class name, plus count and newest change of its students and of its assignments' teachers
+    stamp = db.session.execute(select(
+        Class.grade, Class.section,
+        *(select(aggregate).where(Student.class_id == class_id).scalar_subquery()
+          for aggregate in (func.count(Student.id), func.max(Student.updated_at))),
+        *(select(aggregate).select_from(SubjectAssignment).join(Teacher, SubjectAssignment.teacher_id == Teacher.id)
+          .where(SubjectAssignment.class_id == class_id).scalar_subquery()
+          for aggregate in (func.count(SubjectAssignment.id), func.max(SubjectAssignment.created_at),
+                            func.max(Teacher.updated_at)))
+    ).where(Class.id == class_id)).first()
+    if stamp is None:
+        abort(404)
+    not_modified = conditional('class', class_id, *stamp)
+    if not_modified:
+        return not_modified
+    
     class_obj = Class.query.get_or_404(class_id)
-    students = Student.query.filter_by(class_id=class_id).order_by(Student.full_name).all()
-    assignments = SubjectAssignment.query.filter_by(class_id=class_id).all()
+    # Passed unexecuted: the template runs them only on a fragment cache miss
+    students = Student.query.options(*DETAIL_STUDENT_OPTIONS) \
+        .filter_by(class_id=class_id).order_by(Student.full_name)
+    assignments = SubjectAssignment.query.options(*DETAIL_ASSIGNMENT_OPTIONS) \
+        .filter_by(class_id=class_id)
     
+    # The stamp keys the members fragment too, so the body changes with the ETag
     return render_template('classes/view.html',
                          class_obj=class_obj,
                          students=students,
-                         assignments=assignments)
+                         assignments=assignments,
+                         stamp=tuple(stamp))
 
 
 @classes_bp.route('/assign-subject', methods=['GET', 'POST'])
@@ -128,41 +226,29 @@ def assign_subject():
     """
     form = SubjectAssignmentForm()
     
-    # Populate choices
-    form.teacher_id.choices = [(0, 'Select Teacher')] + \
-                             [(t.id, f"{t.full_name} ({t.subject})") for t in Teacher.query.order_by(Teacher.full_name).all()]
-    form.class_id.choices = [(0, 'Select Class')] + \
-                           [(c.id, c.get_display_name()) for c in Class.query.order_by(Class.grade, Class.section).all()]
+    # Populate choices (cached reference data)
+    form.teacher_id.choices = [(0, 'Select Teacher')] + teacher_choices()
+    form.class_id.choices = [(0, 'Select Class')] + class_choices()
     
     if form.validate_on_submit():
-        # Check if assignment already exists
-        existing = SubjectAssignment.query.filter_by(
-            teacher_id=form.teacher_id.data,
-            class_id=form.class_id.data,
-            subject_name=form.subject_name.data
-        ).first()
-        
-        if existing:
-            flash('This assignment already exists.', 'error')
-            return render_template('classes/assign_subject.html', form=form)
-        
         # Validate that teacher and class are selected (not 0)
         if form.teacher_id.data == 0 or form.class_id.data == 0:
             flash('Please select both teacher and class.', 'error')
             return render_template('classes/assign_subject.html', form=form)
         
-        # Create assignment
+        # Create assignment (duplicates are caught by unique_teacher_class_subject)
         assignment = SubjectAssignment(
             teacher_id=form.teacher_id.data,
             class_id=form.class_id.data,
-            subject_name=form.subject_name.data
+            subject_name=form.subject_name.data,
+            periods_per_week=form.periods_per_week.data
         )
         
         try:
-            db.session.add(assignment)
-            db.session.commit()
-            flash('Subject assignment created successfully!', 'success')
-            return redirect(url_for('classes.list_classes'))
+            if save(form, assignment):
+                resolve_after_change([assignment.id], user_id=current_user.id)
+                flash('Subject assignment created successfully!', 'success')
+                return redirect(url_for('classes.list_classes'))
         except Exception as e:
             db.session.rollback()
             flash(f'Error creating assignment: {str(e)}', 'error')
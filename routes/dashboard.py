@@ -2,13 +2,38 @@
 Dashboard routes
 Main landing page after login with statistics
 """
-from flask import Blueprint, render_template
+from flask import Blueprint, render_template, current_app
 from flask_login import login_required
-from models import Student, Teacher, Class, SubjectAssignment
+from models import db, Student, Teacher, Class, SubjectAssignment
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
 
+def _recent_students():
+    """Last 5 students as plain dicts, safe to keep in the cache"""
+    rows = db.session.query(Student, Class).outerjoin(Class, Student.class_id == Class.id) \
+        .order_by(Student.created_at.desc()).limit(5).all()
+    return [{
+        'id': student.id,
+        'student_id': student.student_id,
+        'full_name': student.full_name,
+        'email': student.email,
+        'class_name': class_obj.get_display_name() if class_obj else None
+    } for student, class_obj in rows]
+
+
+def _recent_teachers():
+    """Last 5 teachers as plain dicts, safe to keep in the cache"""
+    teachers = Teacher.query.order_by(Teacher.created_at.desc()).limit(5).all()
+    return [{
+        'id': teacher.id,
+        'teacher_id': teacher.teacher_id,
+        'full_name': teacher.full_name,
+        'subject': teacher.subject,
+        'email': teacher.email
+    } for teacher in teachers]
+
+
 @dashboard_bp.route('/')
 @dashboard_bp.route('/dashboard')
 @login_required
@@ -16,18 +41,22 @@ def index():
     """
     Main dashboard page
     Displays overview statistics
+    Each statistic is cached until a commit changes the tables it reads
     """
+    cache = current_app.extensions['stats_cache']
+    
     # Get statistics
-    total_students = Student.query.count()
-    total_teachers = Teacher.query.count()
-    total_classes = Class.query.count()
-    total_assignments = SubjectAssignment.query.count()
+    total_students = cache.get_or_set('total_students', ['students'], Student.query.count)
+    total_teachers = cache.get_or_set('total_teachers', ['teachers'], Teacher.query.count)
+    total_classes = cache.get_or_set('total_classes', ['classes'], Class.query.count)
+    total_assignments = cache.get_or_set('total_assignments', ['subject_assignments'],
+                                         SubjectAssignment.query.count)
     
     # Get recent students (last 5)
-    recent_students = Student.query.order_by(Student.created_at.desc()).limit(5).all()
+    recent_students = cache.get_or_set('recent_students', ['students', 'classes'], _recent_students)
     
     # Get recent teachers (last 5)
-    recent_teachers = Teacher.query.order_by(Teacher.created_at.desc()).limit(5).all()
+    recent_teachers = cache.get_or_set('recent_teachers', ['teachers'], _recent_teachers)
     
     return render_template('dashboard/index.html',
                          total_students=total_students,
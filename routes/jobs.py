@@ -0,0 +1,63 @@
+"""
+Background job routes
+Job list, a progress page that polls the status endpoint, and result downloads
+"""
+import os
+from flask import Blueprint, render_template, jsonify, send_file, abort, current_app
+from flask_login import login_required, current_user
+from models import db, Job
+
+jobs_bp = Blueprint('jobs', __name__)
+
+
+def _get_job(job_id):
+    """A job the current user may see: their own, or any job for admins"""
+    job = db.session.get(Job, job_id)
+    if job is None or (job.user_id != current_user.id and not current_user.is_admin()):
+        abort(404)
+    return job
+
+
+@jobs_bp.route('/')
+@login_required
+def list_jobs():
+    """
+    Recent background jobs (all jobs for admins)
+    """
+    query = Job.query.order_by(Job.id.desc())
+    if not current_user.is_admin():
+        query = query.filter_by(user_id=current_user.id)
+    runner = current_app.extensions['jobs']
+    jobs = [runner.status(job) for job in query.limit(50)]
+    return render_template('jobs/list.html', jobs=jobs)
+
+
+@jobs_bp.route('/<int:job_id>')
+@login_required
+def view_job(job_id):
+    """
+    Progress and outcome of one job; the page polls job_status until it finishes
+    """
+    job = _get_job(job_id)
+    return render_template('jobs/view.html', job=current_app.extensions['jobs'].status(job))
+
+
+@jobs_bp.route('/<int:job_id>/status')
+@login_required
+def job_status(job_id):
+    """
+    Job state as JSON, for polling
+    """
+    return jsonify(current_app.extensions['jobs'].status(_get_job(job_id)))
+
+
+@jobs_bp.route('/<int:job_id>/download')
+@login_required
+def download_result(job_id):
+    """
+    The file a finished job produced
+    """
+    job = _get_job(job_id)
+    if job.status != Job.SUCCEEDED or not job.result_file or not os.path.exists(job.result_file):
+        abort(404)
+    return send_file(job.result_file, as_attachment=True, download_name=job.result_name)
@@ -0,0 +1,73 @@
+"""
+Report routes
+Students per grade, subject coverage and teacher workload, read only from the
+summary tables that summaries.py keeps up to date
+"""
+from flask import Blueprint, render_template, request
+from flask_login import login_required
+from sqlalchemy import and_, func, select
+from models import db, ClassStats, ClassSubjectStats, TeacherLoad
+
+reports_bp = Blueprint('reports', __name__)
+
+# Teachers listed in the workload table, busiest first
+TEACHER_LOAD_LIMIT = 50
+
+
+def _grade_key(grade):
+    """Numeric grades in number order, then the rest alphabetically"""
+    return (0, int(grade), '') if grade.isdigit() else (1, 0, grade)
+
+
+@reports_bp.route('/')
+@login_required
+def index():
+    """
+    School reports
+    ?subject= picks the subject whose unstaffed classes are listed
+    """
+    grades = sorted(db.session.execute(
+        select(ClassStats.grade,
+               func.count().label('classes'),
+               func.sum(ClassStats.student_count).label('students'),
+               func.sum(ClassStats.assignment_count).label('assignments'))
+        .group_by(ClassStats.grade)
+    ).all(), key=lambda row: _grade_key(row.grade))
+    total_classes = sum(row.classes for row in grades)
+
+    coverage = db.session.execute(
+        select(ClassSubjectStats.subject_name,
+               func.count().label('classes'),
+               func.sum(ClassSubjectStats.teacher_count).label('teachers'))
+        .group_by(ClassSubjectStats.subject_name)
+        .order_by(ClassSubjectStats.subject_name)
+    ).all()
+
+    subject = request.args.get('subject', '').strip()
+    if not subject and coverage:
+        # Default to the subject missing from the most classes
+        subject = min(coverage, key=lambda row: row.classes).subject_name
+    unstaffed = []
+    if subject:
+        taught = select(ClassSubjectStats.class_id).where(and_(
+            ClassSubjectStats.class_id == ClassStats.class_id,
+            ClassSubjectStats.subject_name == subject
+        ))
+        unstaffed = ClassStats.query.filter(~taught.exists()).all()
+        unstaffed.sort(key=lambda row: (_grade_key(row.grade), row.section))
+
+    teachers = TeacherLoad.query.order_by(TeacherLoad.assignment_count.desc(), TeacherLoad.full_name) \
+        .limit(TEACHER_LOAD_LIMIT).all()
+    idle_teachers = db.session.scalar(
+        select(func.count()).select_from(TeacherLoad).where(TeacherLoad.assignment_count == 0)
+    )
+
+    return render_template('reports/index.html',
+                           grades=grades,
+                           total_classes=total_classes,
+                           coverage=coverage,
+                           subject=subject,
+                           unstaffed=unstaffed,
+                           teachers=teachers,
+                           idle_teachers=idle_teachers,
+                           teacher_limit=TEACHER_LOAD_LIMIT)
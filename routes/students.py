@@ -2,14 +2,38 @@
 Student management routes
 Handles CRUD operations for students
 """
-from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, current_app, abort
 from flask_login import login_required, current_user
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload, load_only
 from models import db, Student, Class
-from forms import StudentForm
+from forms import StudentForm, StudentImportForm, BulkStudentForm
+from importer import import_students, CSV_COLUMNS
+from export import export_response, write_export
+from refdata import class_choices, table_version
+from search import apply_search
+from pagination import keyset_paginate
+from writes import save
+from bulk import delete_students, reassign_students
+from conditional import change_stamp, conditional, csrf_window
+from jobs import job_type, JobQueueFull
 from datetime import datetime
+import csv
+import io
+import os
 
 students_bp = Blueprint('students', __name__)
 
+# Loader strategies: one query per page, class name joined in, address never loaded
+LIST_OPTIONS = (
+    load_only(Student.id, Student.student_id, Student.full_name, Student.date_of_birth,
+              Student.email, Student.phone, Student.class_id, Student.created_at),
+    joinedload(Student.class_obj).load_only(Class.id, Class.grade, Class.section),
+)
+DETAIL_OPTIONS = (
+    joinedload(Student.class_obj).load_only(Class.id, Class.grade, Class.section),
+)
+
 
 def admin_required(f):
     """Decorator to require admin role"""
@@ -23,45 +47,141 @@ def admin_required(f):
     return decorated_function
 
 
+def _apply_filters(query, search, class_filter):
+    """Apply the list view's search and class filters to a query or select()"""
+    # Apply search filter (ranked by relevance)
+    if search:
+        query = apply_search(query, Student, search)
+    
+    # Apply class filter
+    if class_filter:
+        query = query.filter(Student.class_id == class_filter)
+    
+    return query
+
+
 @students_bp.route('/')
 @login_required
 def list_students():
     """
     List all students with pagination and search
+    Supports offset pages (?page=) and keyset pages (?paging=keyset&cursor=)
     """
     page = request.args.get('page', 1, type=int)
     search = request.args.get('search', '', type=str)
     class_filter = request.args.get('class', '', type=str)
+    paging = request.args.get('paging') or current_app.config['LIST_PAGINATION']
+    skip_count = request.args.get('count') == '0'
     
-    query = Student.query
+    # Any insert, update or delete moves the count or the newest updated_at
+    count, last_update = db.session.execute(select(*change_stamp(Student.updated_at))).one()
+    not_modified = conditional('students', count, last_update, table_version('classes'),
+                               current_user.is_admin() and csrf_window(), weak=True)
+    if not_modified:
+        return not_modified
     
-    # Apply search filter
-    if search:
-        query = query.filter(
-            db.or_(
-                Student.full_name.ilike(f'%{search}%'),
-                Student.student_id.ilike(f'%{search}%'),
-                Student.email.ilike(f'%{search}%')
-            )
-        )
+    query = _apply_filters(Student.query.options(*LIST_OPTIONS), search, class_filter)
     
-    # Apply class filter
-    if class_filter:
-        query = query.filter(Student.class_id == class_filter)
-    
-    # Get all classes for filter dropdown
-    classes = Class.query.order_by(Class.grade, Class.section).all()
+    # Get all classes for filter dropdown (cached reference data)
+    classes = class_choices()
     
     # Paginate results
-    students = query.order_by(Student.created_at.desc()).paginate(
-        page=page, per_page=10, error_out=False
-    )
+    if paging == 'keyset':
+        students = keyset_paginate(query, Student,
+                                   cursor=request.args.get('cursor'),
+                                   per_page=10,
+                                   with_count=not skip_count)
+    else:
+        students = query.order_by(Student.created_at.desc()).paginate(
+            page=page, per_page=10, error_out=False
+        )
+    
+    # Bulk actions bar for admins
+    bulk_form = None
+    if current_user.is_admin():
+        bulk_form = BulkStudentForm()
+        bulk_form.class_id.choices = [(0, 'No Class')] + classes
     
     return render_template('students/list.html',
                          students=students,
                          classes=classes,
                          search=search,
-                         class_filter=class_filter)
+                         class_filter=class_filter,
+                         paging=paging,
+                         skip_count=skip_count,
+                         bulk_form=bulk_form)
+
+
+@students_bp.route('/bulk', methods=['POST'])
+@login_required
+@admin_required
+def bulk_students():
+    """
+    Delete or move the selected students, or every student matching the list filters,
+    with one set-based statement
+    """
+    form = BulkStudentForm()
+    form.class_id.choices = [(0, 'No Class')] + class_choices()
+    search = request.form.get('search', '', type=str)
+    class_filter = request.form.get('class', '', type=str)
+    back = redirect(url_for('students.list_students', search=search or None, **{'class': class_filter or None}))
+    
+    if not form.validate_on_submit():
+        flash('Invalid bulk action.', 'error')
+        return back
+    
+    if form.scope.data == 'filtered':
+        # Never touch every student by accident
+        if not (search or class_filter):
+            flash('Search or filter the list before acting on all matching students.', 'error')
+            return back
+        # Any number of students may match, so this runs as a background job
+        return _submit_job('bulk_students', {
+            'action': form.action.data, 'class_id': form.class_id.data or None,
+            'search': search, 'class_filter': class_filter,
+        }, back)
+    
+    targets = form.student_ids.data
+    if not targets:
+        flash('No students selected.', 'info')
+        return back
+    
+    try:
+        message = _apply_bulk_action(form.action.data, targets, form.class_id.data or None)
+        db.session.commit()
+        flash(message, 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error applying bulk action: {str(e)}', 'error')
+    
+    return back
+
+
+def _apply_bulk_action(action, targets, class_id):
+    """Delete or move the target students; returns the summary message"""
+    if action == 'delete':
+        return f'Deleted {delete_students(targets)} students.'
+    return f'Moved {reassign_students(targets, class_id)} students.'
+
+
+def _submit_job(kind, params, back):
+    """Queue a background job and send the user to its progress page"""
+    try:
+        job_id = current_app.extensions['jobs'].submit(kind, params, user_id=current_user.id)
+    except JobQueueFull as e:
+        flash(str(e), 'error')
+        return back
+    return redirect(url_for('jobs.view_job', job_id=job_id))
+
+
+@job_type('bulk_students')
+def bulk_students_job(context, action, class_id, search, class_filter):
+    """Bulk action on every student matching the list filters"""
+    targets = _apply_filters(db.select(Student.id), search, class_filter)
+    message = _apply_bulk_action(action, targets, class_id)
+    db.session.commit()
+    context.progress(1, total=1, message=message)
+    return {'outcome': message}
 
 
 @students_bp.route('/create', methods=['GET', 'POST'])
@@ -73,22 +193,11 @@ def create_student():
     """
     form = StudentForm()
     
-    # Populate class choices
-    form.class_id.choices = [(0, 'Select Class')] + \
-                           [(c.id, c.get_display_name()) for c in Class.query.order_by(Class.grade, Class.section).all()]
+    # Populate class choices (cached reference data)
+    form.class_id.choices = [(0, 'Select Class')] + class_choices()
     
     if form.validate_on_submit():
-        # Check if student_id already exists
-        if Student.query.filter_by(student_id=form.student_id.data).first():
-            flash('Student ID already exists. Please use a different ID.', 'error')
-            return render_template('students/form.html', form=form, action='Create')
-        
-        # Check if email already exists (if provided)
-        if form.email.data and Student.query.filter_by(email=form.email.data).first():
-            flash('Email already exists. Please use a different email.', 'error')
-            return render_template('students/form.html', form=form, action='Create')
-        
-        # Create new student
+        # Create new student (duplicate IDs/emails are caught by the unique constraints)
         student = Student(
             student_id=form.student_id.data,
             full_name=form.full_name.data,
@@ -100,10 +209,9 @@ def create_student():
         )
         
         try:
-            db.session.add(student)
-            db.session.commit()
-            flash(f'Student {student.full_name} created successfully!', 'success')
-            return redirect(url_for('students.list_students'))
+            if save(form, student):
+                flash(f'Student {student.full_name} created successfully!', 'success')
+                return redirect(url_for('students.list_students'))
         except Exception as e:
             db.session.rollback()
             flash(f'Error creating student: {str(e)}', 'error')
@@ -111,6 +219,94 @@ def create_student():
     return render_template('students/form.html', form=form, action='Create')
 
 
+@students_bp.route('/export')
+@login_required
+def export_students():
+    """
+    Stream all students matching the list filters as CSV (importable) or JSON
+    """
+    search = request.args.get('search', '', type=str)
+    class_filter = request.args.get('class', '', type=str)
+    fmt = request.args.get('format', 'csv', type=str)
+    
+    # ?background=1 writes the file in a job, for exports too big to stream through a proxy
+    if request.args.get('background'):
+        return _submit_job('export_students', {'search': search, 'class_filter': class_filter, 'fmt': fmt},
+                           redirect(url_for('students.list_students')))
+    
+    return export_response(_export_statement(search, class_filter), CSV_COLUMNS, fmt, 'students')
+
+
+def _export_statement(search, class_filter):
+    """Rows of the student export, in CSV_COLUMNS order"""
+    class_name = (Class.grade + '-' + Class.section).label('class')
+    statement = db.select(
+        Student.student_id, Student.full_name, Student.date_of_birth, Student.email,
+        Student.phone, Student.address, class_name
+    ).outerjoin(Class, Student.class_id == Class.id).order_by(Student.id)
+    return _apply_filters(statement, search, class_filter)
+
+
+@job_type('export_students')
+def export_students_job(context, search, class_filter, fmt):
+    """Write the student export to a file for download"""
+    statement = _export_statement(search, class_filter)
+    total = db.session.scalar(db.select(db.func.count()).select_from(statement.order_by(None).subquery()))
+    context.progress(0, total=total)
+    extension = 'json' if fmt == 'json' else 'csv'
+    # The export holds a read cursor open, so progress stays in memory until it is done
+    rows = write_export(statement, CSV_COLUMNS, fmt, context.output_path(f'students.{extension}'),
+                        progress=lambda rows: context.progress(rows, persist=False))
+    context.progress(rows, total=rows)
+    return {'students_exported': rows}
+
+
+@students_bp.route('/import', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def import_students_csv():
+    """
+    Bulk import students from an uploaded CSV file
+    """
+    form = StudentImportForm()
+    
+    if form.validate_on_submit():
+        # The upload is kept in the jobs directory and imported in the background
+        path = current_app.extensions['jobs'].save_upload(form.file.data.stream, 'students.csv')
+        return _submit_job('import_students', {'path': path},
+                           redirect(url_for('students.import_students_csv')))
+    
+    return render_template('students/import.html', form=form, columns=CSV_COLUMNS)
+
+
+@job_type('import_students')
+def import_students_job(context, path):
+    """Import an uploaded CSV; rejected rows are offered as a CSV download"""
+    total = os.path.getsize(path)
+    try:
+        with open(path, 'rb') as raw:
+            lines = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+            report = import_students(
+                lines, batch_size=current_app.config['IMPORT_BATCH_SIZE'],
+                progress=lambda report: context.progress(
+                    raw.tell(), total=total, message=f'{report.inserted} students imported'))
+    except (ValueError, UnicodeDecodeError):
+        db.session.rollback()
+        raise
+    finally:
+        os.remove(path)
+    
+    if report.errors:
+        with open(context.output_path('import-errors.csv'), 'w', newline='', encoding='utf-8') as output:
+            writer = csv.writer(output)
+            writer.writerow(['line', 'student_id', 'error'])
+            writer.writerows(report.errors)
+    context.progress(total, total=total,
+                     message=f'Imported {report.inserted} students, {report.error_count} rows rejected.')
+    return {'rows_processed': report.processed, 'students_imported': report.inserted,
+            'rows_rejected': report.error_count}
+
+
 @students_bp.route('/<int:student_id>/edit', methods=['GET', 'POST'])
 @login_required
 @admin_required
@@ -121,24 +317,11 @@ def edit_student(student_id):
     student = Student.query.get_or_404(student_id)
     form = StudentForm(obj=student)
     
-    # Populate class choices
-    form.class_id.choices = [(0, 'Select Class')] + \
-                           [(c.id, c.get_display_name()) for c in Class.query.order_by(Class.grade, Class.section).all()]
+    # Populate class choices (cached reference data)
+    form.class_id.choices = [(0, 'Select Class')] + class_choices()
     
     if form.validate_on_submit():
-        # Check if student_id is changed and already exists
-        if form.student_id.data != student.student_id:
-            if Student.query.filter_by(student_id=form.student_id.data).first():
-                flash('Student ID already exists. Please use a different ID.', 'error')
-                return render_template('students/form.html', form=form, action='Edit', student=student)
-        
-        # Check if email is changed and already exists
-        if form.email.data and form.email.data != student.email:
-            if Student.query.filter_by(email=form.email.data).first():
-                flash('Email already exists. Please use a different email.', 'error')
-                return render_template('students/form.html', form=form, action='Edit', student=student)
-        
-        # Update student
+        # Update student (duplicate IDs/emails are caught by the unique constraints)
         student.student_id = form.student_id.data
         student.full_name = form.full_name.data
         student.date_of_birth = form.date_of_birth.data
@@ -149,9 +332,9 @@ def edit_student(student_id):
         student.updated_at = datetime.utcnow()
         
         try:
-            db.session.commit()
-            flash(f'Student {student.full_name} updated successfully!', 'success')
-            return redirect(url_for('students.list_students'))
+            if save(form):
+                flash(f'Student {student.full_name} updated successfully!', 'success')
+                return redirect(url_for('students.list_students'))
         except Exception as e:
             db.session.rollback()
             flash(f'Error updating student: {str(e)}', 'error')
@@ -186,6 +369,20 @@ def view_student(student_id):
     """
     View student details
     """
-    student = Student.query.get_or_404(student_id)
-    return render_template('students/view.html', student=student)
+    # Everything the page shows changes updated_at, except the class name, so the
+    # page gets no Last-Modified: If-Modified-Since alone would miss a class rename
+    stamp = db.session.execute(
+        select(Student.updated_at, Class.grade, Class.section)
+        .outerjoin(Class, Student.class_id == Class.id)
+        .where(Student.id == student_id)
+    ).first()
+    if stamp is None:
+        abort(404)
+    not_modified = conditional('student', student_id, *stamp)
+    if not_modified:
+        return not_modified
+    
+    student = Student.query.options(*DETAIL_OPTIONS).filter_by(id=student_id).first_or_404()
+    # The stamp keys the details fragment too, so the body changes with the ETag
+    return render_template('students/view.html', student=student, stamp=tuple(stamp))
 
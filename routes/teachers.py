@@ -2,10 +2,17 @@
 Teacher management routes
 Handles CRUD operations for teachers
 """
-from flask import Blueprint, render_template, request, flash, redirect, url_for
+from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, abort
 from flask_login import login_required, current_user
+from sqlalchemy import select
 from models import db, Teacher
 from forms import TeacherForm
+from search import apply_search
+from pagination import keyset_paginate
+from export import export_response
+from writes import save
+from conditional import change_stamp, conditional
+from timetable import unavailable_mask, unavailable_text, resolve_after_change
 from datetime import datetime
 
 teachers_bp = Blueprint('teachers', __name__)
@@ -23,34 +30,69 @@ def admin_required(f):
     return decorated_function
 
 
+# Columns written by the teacher export, in order
+EXPORT_COLUMNS = ['teacher_id', 'full_name', 'subject', 'qualification', 'email', 'phone', 'joining_date']
+
+
+def _apply_filters(query, search):
+    """Apply the list view's search filter to a query or select()"""
+    # Apply search filter (ranked by relevance)
+    if search:
+        query = apply_search(query, Teacher, search)
+    
+    return query
+
+
 @teachers_bp.route('/')
 @login_required
 def list_teachers():
     """
     List all teachers with pagination and search
+    Supports offset pages (?page=) and keyset pages (?paging=keyset&cursor=)
     """
     page = request.args.get('page', 1, type=int)
     search = request.args.get('search', '', type=str)
+    paging = request.args.get('paging') or current_app.config['LIST_PAGINATION']
+    skip_count = request.args.get('count') == '0'
     
-    query = Teacher.query
+    count, last_update = db.session.execute(select(*change_stamp(Teacher.updated_at))).one()
+    not_modified = conditional('teachers', count, last_update, weak=True)
+    if not_modified:
+        return not_modified
     
-    # Apply search filter
-    if search:
-        query = query.filter(
-            db.or_(
-                Teacher.full_name.ilike(f'%{search}%'),
-                Teacher.teacher_id.ilike(f'%{search}%'),
-                Teacher.subject.ilike(f'%{search}%'),
-                Teacher.email.ilike(f'%{search}%')
-            )
-        )
+    query = _apply_filters(Teacher.query, search)
     
     # Paginate results
-    teachers = query.order_by(Teacher.created_at.desc()).paginate(
-        page=page, per_page=10, error_out=False
-    )
+    if paging == 'keyset':
+        teachers = keyset_paginate(query, Teacher,
+                                   cursor=request.args.get('cursor'),
+                                   per_page=10,
+                                   with_count=not skip_count)
+    else:
+        teachers = query.order_by(Teacher.created_at.desc()).paginate(
+            page=page, per_page=10, error_out=False
+        )
+    
+    return render_template('teachers/list.html',
+                         teachers=teachers,
+                         search=search,
+                         paging=paging,
+                         skip_count=skip_count)
+
+
+@teachers_bp.route('/export')
+@login_required
+def export_teachers():
+    """
+    Stream all teachers matching the list search as CSV or JSON
+    """
+    search = request.args.get('search', '', type=str)
+    fmt = request.args.get('format', 'csv', type=str)
+    
+    statement = db.select(*[getattr(Teacher, name) for name in EXPORT_COLUMNS]).order_by(Teacher.id)
+    statement = _apply_filters(statement, search)
     
-    return render_template('teachers/list.html', teachers=teachers, search=search)
+    return export_response(statement, EXPORT_COLUMNS, fmt, 'teachers')
 
 
 @teachers_bp.route('/create', methods=['GET', 'POST'])
@@ -63,17 +105,7 @@ def create_teacher():
     form = TeacherForm()
     
     if form.validate_on_submit():
-        # Check if teacher_id already exists
-        if Teacher.query.filter_by(teacher_id=form.teacher_id.data).first():
-            flash('Teacher ID already exists. Please use a different ID.', 'error')
-            return render_template('teachers/form.html', form=form, action='Create')
-        
-        # Check if email already exists (if provided)
-        if form.email.data and Teacher.query.filter_by(email=form.email.data).first():
-            flash('Email already exists. Please use a different email.', 'error')
-            return render_template('teachers/form.html', form=form, action='Create')
-        
-        # Create new teacher
+        # Create new teacher (duplicate IDs/emails are caught by the unique constraints)
         teacher = Teacher(
             teacher_id=form.teacher_id.data,
             full_name=form.full_name.data,
@@ -81,14 +113,14 @@ def create_teacher():
             qualification=form.qualification.data if form.qualification.data else None,
             email=form.email.data if form.email.data else None,
             phone=form.phone.data if form.phone.data else None,
-            joining_date=form.joining_date.data
+            joining_date=form.joining_date.data,
+            unavailable_slots=unavailable_mask(form.unavailable.data)
         )
         
         try:
-            db.session.add(teacher)
-            db.session.commit()
-            flash(f'Teacher {teacher.full_name} created successfully!', 'success')
-            return redirect(url_for('teachers.list_teachers'))
+            if save(form, teacher):
+                flash(f'Teacher {teacher.full_name} created successfully!', 'success')
+                return redirect(url_for('teachers.list_teachers'))
         except Exception as e:
             db.session.rollback()
             flash(f'Error creating teacher: {str(e)}', 'error')
@@ -105,21 +137,11 @@ def edit_teacher(teacher_id):
     """
     teacher = Teacher.query.get_or_404(teacher_id)
     form = TeacherForm(obj=teacher)
+    if not form.is_submitted():
+        form.unavailable.data = unavailable_text(teacher.unavailable_slots)
     
     if form.validate_on_submit():
-        # Check if teacher_id is changed and already exists
-        if form.teacher_id.data != teacher.teacher_id:
-            if Teacher.query.filter_by(teacher_id=form.teacher_id.data).first():
-                flash('Teacher ID already exists. Please use a different ID.', 'error')
-                return render_template('teachers/form.html', form=form, action='Edit', teacher=teacher)
-        
-        # Check if email is changed and already exists
-        if form.email.data and form.email.data != teacher.email:
-            if Teacher.query.filter_by(email=form.email.data).first():
-                flash('Email already exists. Please use a different email.', 'error')
-                return render_template('teachers/form.html', form=form, action='Edit', teacher=teacher)
-        
-        # Update teacher
+        # Update teacher (duplicate IDs/emails are caught by the unique constraints)
         teacher.teacher_id = form.teacher_id.data
         teacher.full_name = form.full_name.data
         teacher.subject = form.subject.data
@@ -127,12 +149,18 @@ def edit_teacher(teacher_id):
         teacher.email = form.email.data if form.email.data else None
         teacher.phone = form.phone.data if form.phone.data else None
         teacher.joining_date = form.joining_date.data
+        unavailable = unavailable_mask(form.unavailable.data)
+        availability_changed = unavailable != teacher.unavailable_slots
+        teacher.unavailable_slots = unavailable
         teacher.updated_at = datetime.utcnow()
         
         try:
-            db.session.commit()
-            flash(f'Teacher {teacher.full_name} updated successfully!', 'success')
-            return redirect(url_for('teachers.list_teachers'))
+            if save(form):
+                if availability_changed:
+                    # Lessons in newly blocked periods are dropped on load and placed again
+                    resolve_after_change([], user_id=current_user.id)
+                flash(f'Teacher {teacher.full_name} updated successfully!', 'success')
+                return redirect(url_for('teachers.list_teachers'))
         except Exception as e:
             db.session.rollback()
             flash(f'Error updating teacher: {str(e)}', 'error')
@@ -167,6 +195,13 @@ def view_teacher(teacher_id):
     """
     View teacher details
     """
+    stamp = db.session.execute(select(Teacher.updated_at).where(Teacher.id == teacher_id)).first()
+    if stamp is None:
+        abort(404)
+    not_modified = conditional('teacher', teacher_id, stamp.updated_at, last_modified=stamp.updated_at)
+    if not_modified:
+        return not_modified
+    
     teacher = Teacher.query.get_or_404(teacher_id)
     return render_template('teachers/view.html', teacher=teacher)
 
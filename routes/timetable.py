@@ -0,0 +1,135 @@
+"""
+Timetable routes
+Generation status and the weekly grids of classes and teachers
+"""
+from functools import wraps
+from flask import Blueprint, render_template, flash, redirect, url_for, current_app
+from flask_login import login_required, current_user
+from sqlalchemy import func, select
+from models import db, Class, Teacher, SubjectAssignment
+from forms import TimetableForm
+from jobs import job_type, JobQueueFull
+from timetable import DAY_NAMES, generate_timetable, week_grid, unavailable_text
+
+timetable_bp = Blueprint('timetable', __name__)
+
+# Assignments listed as missing lessons on the status page
+UNPLACED_LIMIT = 50
+
+
+def admin_required(f):
+    """Decorator to require admin role"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_user.is_authenticated or not current_user.is_admin():
+            flash('Access denied. Admin privileges required.', 'error')
+            return redirect(url_for('dashboard.index'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def _week():
+    """Day names and period numbers of the configured week"""
+    config = current_app.config
+    return DAY_NAMES[:config['TIMETABLE_DAYS']], list(range(1, config['TIMETABLE_PERIODS_PER_DAY'] + 1))
+
+
+@job_type('generate_timetable')
+def generate_timetable_job(context, incremental, assignment_ids=None):
+    """Solve the timetable for every assignment, or repair it around assignment_ids"""
+    context.progress(0, total=1, message='Solving...')
+    summary = generate_timetable(current_app.config, incremental=incremental, assignment_ids=assignment_ids)
+    context.progress(1, total=1, message=f'{summary["lessons"] - summary["unplaced"]} of '
+                                         f'{summary["lessons"]} lessons scheduled.')
+    return summary
+
+
+@timetable_bp.route('/', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def index():
+    """
+    How much of the timetable is scheduled, with the assignments still missing lessons
+    """
+    form = TimetableForm()
+    if form.validate_on_submit():
+        try:
+            job_id = current_app.extensions['jobs'].submit(
+                'generate_timetable', {'incremental': form.mode.data == 'incremental'}, user_id=current_user.id)
+        except JobQueueFull as e:
+            flash(str(e), 'error')
+            return redirect(url_for('timetable.index'))
+        return redirect(url_for('jobs.view_job', job_id=job_id))
+
+    default_periods = current_app.config['TIMETABLE_DEFAULT_PERIODS']
+    rows = db.session.execute(
+        select(SubjectAssignment.subject_name,
+               func.coalesce(SubjectAssignment.periods_per_week, default_periods).label('periods'),
+               SubjectAssignment.timetable_slots, SubjectAssignment.class_id, Class.grade, Class.section,
+               SubjectAssignment.teacher_id, Teacher.full_name)
+        .join(Class, SubjectAssignment.class_id == Class.id)
+        .join(Teacher, SubjectAssignment.teacher_id == Teacher.id)
+        .order_by(Class.grade, Class.section, SubjectAssignment.subject_name)
+    ).all()
+    lessons = scheduled = 0
+    unplaced = []
+    for row in rows:
+        placed = (row.timetable_slots or 0).bit_count()
+        lessons += row.periods
+        scheduled += min(placed, row.periods)
+        if placed < row.periods:
+            unplaced.append((row, row.periods - placed))
+
+    return render_template('timetable/index.html',
+                           form=form,
+                           assignments=len(rows),
+                           lessons=lessons,
+                           scheduled=scheduled,
+                           unplaced=unplaced[:UNPLACED_LIMIT],
+                           unplaced_total=len(unplaced))
+
+
+@timetable_bp.route('/class/<int:class_id>')
+@login_required
+def class_timetable(class_id):
+    """
+    Weekly grid of one class: subject and teacher in each period
+    """
+    class_obj = Class.query.get_or_404(class_id)
+    entries = db.session.execute(
+        select(SubjectAssignment.timetable_slots, SubjectAssignment.subject_name, Teacher.full_name)
+        .join(Teacher, SubjectAssignment.teacher_id == Teacher.id)
+        .where(SubjectAssignment.class_id == class_id)
+    ).all()
+    days, periods = _week()
+    return render_template('timetable/grid.html',
+                           title=f'Class {class_obj.get_display_name()}',
+                           back=url_for('classes.view_class', class_id=class_id),
+                           grid=week_grid((slots, f'{subject} ({teacher})') for slots, subject, teacher in entries),
+                           days=days,
+                           periods=periods,
+                           blocked=None)
+
+
+@timetable_bp.route('/teacher/<int:teacher_id>')
+@login_required
+def teacher_timetable(teacher_id):
+    """
+    Weekly grid of one teacher: class and subject in each period, unavailable periods marked
+    """
+    teacher = Teacher.query.get_or_404(teacher_id)
+    entries = db.session.execute(
+        select(SubjectAssignment.timetable_slots, SubjectAssignment.subject_name, Class.grade, Class.section)
+        .join(Class, SubjectAssignment.class_id == Class.id)
+        .where(SubjectAssignment.teacher_id == teacher_id)
+    ).all()
+    days, periods = _week()
+    return render_template('timetable/grid.html',
+                           title=teacher.full_name,
+                           back=url_for('teachers.view_teacher', teacher_id=teacher_id),
+                           grid=week_grid((slots, f'{grade}-{section} {subject}')
+                                          for slots, subject, grade, section in entries),
+                           days=days,
+                           periods=periods,
+                           blocked=week_grid([(teacher.unavailable_slots, True)]),
+                           unavailable=unavailable_text(teacher.unavailable_slots))
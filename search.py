@@ -0,0 +1,150 @@
+"""
+Full-text search for the student and teacher lists
+Backed by SQLite FTS5 index tables that triggers keep in sync with the base tables
+"""
+import re
+from contextlib import contextmanager
+from flask import current_app
+from sqlalchemy import literal_column, select, table, column, text, func
+from sqlalchemy.exc import OperationalError
+from models import db
+
+# Indexed columns per table, with the bm25 weight of each column
+SEARCH_INDEXES = {
+    'students': [('full_name', 10.0), ('student_id', 5.0), ('email', 1.0)],
+    'teachers': [('full_name', 10.0), ('teacher_id', 5.0), ('subject', 3.0), ('email', 1.0)],
+}
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _index_name(tablename):
+    """Name of the FTS5 table that indexes a base table"""
+    return f'{tablename}_fts'
+
+
+def _index_ddl(tablename, columns):
+    """
+    DDL for an external-content FTS5 index and the triggers that maintain it.
+    Triggers (rather than ORM events) also cover Core and bulk statements.
+    """
+    fts = _index_name(tablename)
+    names = [name for name, _ in columns]
+    cols = ', '.join(names)
+    new_values = ', '.join(f'new.{name}' for name in names)
+    old_values = ', '.join(f'old.{name}' for name in names)
+    delete_row = (f"INSERT INTO {fts}({fts}, rowid, {cols}) "
+                  f"VALUES ('delete', old.id, {old_values});")
+    insert_row = f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_values});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{cols}, content='{tablename}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3 4')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {tablename} BEGIN "
+        f"{insert_row} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {tablename} BEGIN "
+        f"{delete_row} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {tablename} BEGIN "
+        f"{delete_row} {insert_row} END",
+    ]
+
+
+def init_search(app):
+    """
+    Create the FTS5 indexes if the database supports them.
+    Falls back to ILIKE matching for other databases or SQLite builds without FTS5.
+    """
+    enabled = False
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            try:
+                with db.engine.begin() as conn:
+                    for tablename, columns in SEARCH_INDEXES.items():
+                        fts = _index_name(tablename)
+                        exists = conn.execute(
+                            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                            {'name': fts}
+                        ).first()
+                        for statement in _index_ddl(tablename, columns):
+                            conn.execute(text(statement))
+                        if not exists:
+                            # Index rows that predate the search index
+                            weights = ', '.join(str(weight) for _, weight in columns)
+                            conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+                            conn.execute(text(f"INSERT INTO {fts}({fts}, rank) VALUES ('rank', 'bm25({weights})')"))
+                enabled = True
+            except OperationalError as e:
+                app.logger.warning(f'Full-text search unavailable, using ILIKE search: {e}')
+    app.extensions['search_fts'] = enabled
+
+
+@contextmanager
+def deferred_search_index():
+    """
+    Drop the sync triggers for an offline bulk load and rebuild the indexes afterwards.
+    A rebuild is several times faster than maintaining the index row by row.
+    """
+    if not current_app.extensions.get('search_fts'):
+        yield
+        return
+
+    for tablename in SEARCH_INDEXES:
+        fts = _index_name(tablename)
+        for suffix in ('ai', 'ad', 'au'):
+            db.session.execute(text(f'DROP TRIGGER IF EXISTS {fts}_{suffix}'))
+    db.session.commit()
+    try:
+        yield
+    finally:
+        db.session.rollback()
+        for tablename, columns in SEARCH_INDEXES.items():
+            fts = _index_name(tablename)
+            for statement in _index_ddl(tablename, columns):
+                db.session.execute(text(statement))
+            db.session.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+        db.session.commit()
+
+
+def build_match_query(search):
+    """
+    Turn free text into an FTS5 query.
+    Every word must match as a prefix, e.g. 'jo smi' -> '"jo"* "smi"*'.
+    """
+    tokens = _TOKEN_RE.findall(search)
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def apply_search(query, model, search):
+    """
+    Filter a model query by free-text search.
+    Selective searches are ordered by relevance; broad ones (more than
+    SEARCH_RANK_LIMIT hits) keep the caller's ordering, since bm25 has to
+    score every hit before the first page can be returned.
+    """
+    tablename = model.__tablename__
+    columns = [name for name, _ in SEARCH_INDEXES[tablename]]
+
+    if not current_app.extensions.get('search_fts'):
+        return query.filter(db.or_(*[
+            getattr(model, name).ilike(f'%{search}%') for name in columns
+        ]))
+
+    match = build_match_query(search)
+    if match is None:
+        return query.filter(db.false())
+
+    fts = _index_name(tablename)
+    index = table(fts, column('rowid'), column('rank'))
+    matches = literal_column(fts).op('MATCH')(match)
+
+    rank_limit = current_app.config.get('SEARCH_RANK_LIMIT', 500)
+    capped = select(index.c.rowid).where(matches).limit(rank_limit + 1).subquery()
+    hit_count = db.session.execute(select(func.count()).select_from(capped)).scalar()
+
+    if hit_count > rank_limit:
+        return query.filter(model.id.in_(select(index.c.rowid).where(matches)))
+
+    hits = select(index.c.rowid, index.c.rank).where(matches).subquery()
+    return query.join(hits, hits.c.rowid == model.id).order_by(hits.c.rank)
@@ -4,6 +4,7 @@ Populates database with sample data for testing and demonstration
 """
 from app import create_app
 from models import db, User, Student, Teacher, Class, SubjectAssignment
+from summaries import rebuild_summaries
 from datetime import date, datetime, timedelta
 import random
 
@@ -21,6 +22,7 @@ def seed_database():
         Teacher.query.delete()
         Class.query.delete()
         User.query.delete()
+        rebuild_summaries()  # bulk deletes bypass the summary events
         db.session.commit()
         
         print("Creating users...")
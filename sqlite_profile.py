@@ -0,0 +1,76 @@
+"""
+SQLite connection tuning
+Applies the configured pragmas to every new connection and, optionally, adds a
+read-only connection pool that serves GET requests so reads never wait on writes
+"""
+import os
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from models import db, READ_BIND
+
+# Pragmas that change the database file rather than the connection; primary engine only
+WRITER_PRAGMAS = ('journal_mode',)
+
+
+def sqlite_file(uri, instance_path):
+    """Absolute path of the SQLite file a database URI names, or None for other databases"""
+    url = make_url(uri)
+    if not url.drivername.startswith('sqlite') or url.database in (None, '', ':memory:'):
+        return None
+    if url.database.startswith('file:'):
+        return None  # already a driver URI; leave it alone
+    if os.path.isabs(url.database):
+        return url.database
+    # Flask-SQLAlchemy resolves relative paths against the instance folder
+    return os.path.join(instance_path, url.database)
+
+
+def _sqlite_path(app):
+    """Absolute path of the configured SQLite file, or None for other databases"""
+    return sqlite_file(app.config['SQLALCHEMY_DATABASE_URI'], app.instance_path)
+
+
+def configure_read_bind(app):
+    """
+    Add the read-only engine to SQLALCHEMY_BINDS
+    Call before db.init_app so Flask-SQLAlchemy creates it with the others.
+    """
+    if not app.config['SQLITE_READ_POOL']:
+        return
+    path = _sqlite_path(app)
+    if path is None:
+        return
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    binds[READ_BIND] = dict(app.config['SQLITE_READ_POOL_OPTIONS'],
+                            url=f'sqlite:///file:{path}?mode=ro&uri=true')
+    app.config['SQLALCHEMY_BINDS'] = binds
+
+
+def init_sqlite(app):
+    """Register the pragma hook and route GET requests to the read pool"""
+    pragmas = app.config['SQLITE_PRAGMAS']
+    with app.app_context():
+        for key, engine in db.engines.items():
+            if engine.dialect.name == 'sqlite' and pragmas:
+                event.listen(engine, 'connect', pragma_hook(pragmas, primary=key is None))
+        has_read_pool = READ_BIND in db.engines
+
+    if has_read_pool:
+        @app.before_request
+        def _use_read_pool():
+            if request.method in ('GET', 'HEAD'):
+                db.session.info['read_only'] = True
+
+
+def pragma_hook(pragmas, primary):
+    """Connect listener applying pragmas; file-level ones only on the primary engine"""
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                if primary or name not in WRITER_PRAGMAS:
+                    cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+    return apply_pragmas
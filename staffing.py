@@ -0,0 +1,127 @@
+"""
+Teacher x class x subject staffing matrix
+Every class and its subject assignments come back from one query and are
+pivoted with NumPy over integer codes, so the whole school costs one round
+trip and a handful of array operations rather than a query per class
+"""
+import numpy as np
+from sqlalchemy import select
+from models import db, Class, Teacher, SubjectAssignment
+
+
+class StaffingMatrix:
+    """
+    Staffing picture of the school
+    classes are (id, grade, section) in grade/section order and subjects are
+    sorted names; staff[c][s] lists the teacher indexes assigned to subject s of
+    class c. A subject is unstaffed in a class when another class of the same
+    grade has it and this one does not. Teachers carry their assignment and
+    distinct class counts; overloaded ones have more than max_assignments.
+    """
+
+    def __init__(self, classes, subjects, teachers, staff, unstaffed, max_assignments):
+        self.classes = classes
+        self.subjects = subjects
+        self.teachers = teachers
+        self.staff = staff
+        self.unstaffed = unstaffed  # bool array, classes x subjects
+        self.max_assignments = max_assignments
+
+    @property
+    def unstaffed_by_subject(self):
+        """Classes missing each subject, aligned with subjects"""
+        return self.unstaffed.sum(axis=0).tolist()
+
+    @property
+    def overloaded_count(self):
+        return sum(1 for teacher in self.teachers if teacher['overloaded'])
+
+    def to_dict(self):
+        """JSON-ready form with database ids in place of array indexes"""
+        teacher_ids = [teacher['id'] for teacher in self.teachers]
+        unstaffed = self.unstaffed.tolist()
+        return {
+            'subjects': self.subjects,
+            'max_assignments': self.max_assignments,
+            'classes': [{
+                'id': class_id,
+                'name': f'{grade}-{section}',
+                'grade': grade,
+                'staff': [[teacher_ids[t] for t in cell] for cell in self.staff[c]],
+                'unstaffed': [subject for subject, missing in zip(self.subjects, unstaffed[c]) if missing],
+            } for c, (class_id, grade, section) in enumerate(self.classes)],
+            'teachers': self.teachers,
+        }
+
+
+def _codes(values):
+    """Sorted distinct values and each value's index into them"""
+    distinct, codes = np.unique(np.asarray(values, dtype=object), return_inverse=True)
+    return distinct.tolist(), codes.reshape(-1)
+
+
+def build_matrix(max_assignments):
+    """Load every class with its assignments in one query and pivot them"""
+    rows = db.session.execute(
+        select(Class.id, Class.grade, Class.section,
+               SubjectAssignment.subject_name, SubjectAssignment.teacher_id, Teacher.full_name)
+        .outerjoin(SubjectAssignment, SubjectAssignment.class_id == Class.id)
+        .outerjoin(Teacher, Teacher.id == SubjectAssignment.teacher_id)
+        .order_by(Class.grade, Class.section, Class.id)
+    ).all()
+    if not rows:
+        return StaffingMatrix([], [], [], [], np.zeros((0, 0), dtype=bool), max_assignments)
+    class_ids, grades, sections, subject_names, teacher_ids, teacher_names = zip(*rows)
+
+    # Rows arrive grouped by class: a new class starts wherever the id changes
+    class_ids = np.array(class_ids, dtype=np.int64)
+    starts = np.empty(len(class_ids), dtype=bool)
+    starts[0] = True
+    np.not_equal(class_ids[1:], class_ids[:-1], out=starts[1:])
+    class_codes = np.cumsum(starts) - 1
+    first_rows = np.flatnonzero(starts)
+    classes = [(int(class_ids[i]), grades[i], sections[i]) for i in first_rows]
+    grade_names, class_grades = _codes([grade for _, grade, _ in classes])
+
+    # Classes without assignments contribute one row with no subject
+    rows_assigned = np.flatnonzero(np.array([teacher_id is not None for teacher_id in teacher_ids], dtype=bool))
+    if not len(rows_assigned):
+        return StaffingMatrix(classes, [], [], [[] for _ in classes],
+                              np.zeros((len(classes), 0), dtype=bool), max_assignments)
+    subjects, subject_codes = _codes([subject_names[i] for i in rows_assigned])
+    class_codes = class_codes[rows_assigned]
+    class_count, subject_count = len(classes), len(subjects)
+
+    staffed = np.zeros((class_count, subject_count), dtype=np.int32)
+    np.add.at(staffed, (class_codes, subject_codes), 1)
+    grade_subjects = np.zeros((len(grade_names), subject_count), dtype=bool)
+    grade_subjects[class_grades[class_codes], subject_codes] = True
+    unstaffed = grade_subjects[class_grades] & (staffed == 0)
+
+    # Teachers: assignments, and distinct classes from the unique (teacher, class) pairs
+    raw_teachers = np.array([teacher_ids[i] for i in rows_assigned], dtype=np.int64)
+    teacher_table, first_seen, teacher_codes = np.unique(raw_teachers, return_index=True, return_inverse=True)
+    teacher_codes = teacher_codes.reshape(-1)
+    assignments = np.bincount(teacher_codes)
+    pairs = np.unique(teacher_codes * class_count + class_codes)
+    class_counts = np.bincount(pairs // class_count, minlength=len(teacher_table))
+    teachers = [{
+        'id': int(teacher_id),
+        'name': teacher_names[rows_assigned[first]],
+        'assignments': int(count),
+        'classes': int(distinct),
+        'overloaded': bool(count > max_assignments),
+    } for teacher_id, first, count, distinct in zip(teacher_table, first_seen, assignments, class_counts)]
+
+    # Cells: assignments sorted by (class, subject, teacher name), split where the cell changes
+    names = np.array([teacher['name'] for teacher in teachers], dtype=object)[teacher_codes]
+    order = np.lexsort((names, subject_codes, class_codes))
+    cell_keys = (class_codes * subject_count + subject_codes)[order]
+    ordered_teachers = teacher_codes[order].tolist()
+    bounds = (np.flatnonzero(np.diff(cell_keys)) + 1).tolist()
+    staff = [[[] for _ in subjects] for _ in classes]
+    for begin, end in zip([0] + bounds, bounds + [len(cell_keys)]):
+        c, s = divmod(int(cell_keys[begin]), subject_count)
+        staff[c][s] = ordered_teachers[begin:end]
+
+    return StaffingMatrix(classes, subjects, teachers, staff, unstaffed, max_assignments)
@@ -0,0 +1,242 @@
+"""
+Materialized report summaries
+class_stats, class_subject_stats and teacher_load hold the per-class and
+per-teacher figures of the reports page. The ORM events below keep them in step
+with every flush: student moves adjust counts by delta, assignment changes
+recompute only the classes and teachers they touch. Bulk writes that bypass the
+ORM call refresh_summaries() themselves; rebuild_summaries() starts over.
+"""
+from sqlalchemy import bindparam, delete, event, func, inspect, insert, select, update
+from models import db, Student, Teacher, Class, SubjectAssignment, ClassStats, ClassSubjectStats, TeacherLoad
+from counters import class_id_change
+
+class_stats = ClassStats.__table__
+class_subject_stats = ClassSubjectStats.__table__
+teacher_load = TeacherLoad.__table__
+
+
+def _restrict(query, column, ids):
+    return query if ids is None else query.where(column.in_(ids))
+
+
+def refresh_class_stats(connection, class_ids=None):
+    """
+    Recompute the class_stats and class_subject_stats rows of class_ids (every
+    class when None) from the source tables. Returns the number of classes written.
+    """
+    if class_ids is not None:
+        class_ids = [class_id for class_id in set(class_ids) if class_id is not None]
+        if not class_ids:
+            return 0
+    connection.execute(_restrict(delete(class_stats), class_stats.c.class_id, class_ids))
+    connection.execute(_restrict(delete(class_subject_stats), class_subject_stats.c.class_id, class_ids))
+
+    students = _restrict(
+        select(Student.class_id, func.count().label('total')).where(Student.class_id.isnot(None)),
+        Student.class_id, class_ids
+    ).group_by(Student.class_id).subquery()
+    assignments = _restrict(
+        select(SubjectAssignment.class_id,
+               func.count().label('total'),
+               func.count(SubjectAssignment.subject_name.distinct()).label('subjects'),
+               func.count(SubjectAssignment.teacher_id.distinct()).label('teachers')),
+        SubjectAssignment.class_id, class_ids
+    ).group_by(SubjectAssignment.class_id).subquery()
+    rows = _restrict(
+        select(Class.id, Class.grade, Class.section,
+               func.coalesce(students.c.total, 0),
+               func.coalesce(assignments.c.total, 0),
+               func.coalesce(assignments.c.subjects, 0),
+               func.coalesce(assignments.c.teachers, 0))
+        .outerjoin(students, students.c.class_id == Class.id)
+        .outerjoin(assignments, assignments.c.class_id == Class.id),
+        Class.id, class_ids
+    )
+    written = connection.execute(insert(class_stats).from_select(
+        ['class_id', 'grade', 'section', 'student_count', 'assignment_count', 'subject_count', 'teacher_count'],
+        rows
+    )).rowcount
+
+    subjects = _restrict(
+        select(SubjectAssignment.class_id, SubjectAssignment.subject_name,
+               func.count(SubjectAssignment.teacher_id.distinct())),
+        SubjectAssignment.class_id, class_ids
+    ).group_by(SubjectAssignment.class_id, SubjectAssignment.subject_name)
+    connection.execute(insert(class_subject_stats).from_select(
+        ['class_id', 'subject_name', 'teacher_count'], subjects
+    ))
+    return written
+
+
+def refresh_teacher_load(connection, teacher_ids=None):
+    """
+    Recompute the teacher_load rows of teacher_ids (every teacher when None)
+    from the source tables. Returns the number of teachers written.
+    """
+    if teacher_ids is not None:
+        teacher_ids = [teacher_id for teacher_id in set(teacher_ids) if teacher_id is not None]
+        if not teacher_ids:
+            return 0
+    connection.execute(_restrict(delete(teacher_load), teacher_load.c.teacher_id, teacher_ids))
+
+    # Each (teacher, class) pair once, so a class taught in two subjects counts once
+    taught = _restrict(
+        select(SubjectAssignment.teacher_id, SubjectAssignment.class_id),
+        SubjectAssignment.teacher_id, teacher_ids
+    ).distinct().subquery()
+    class_sizes = select(Student.class_id, func.count().label('total')) \
+        .where(Student.class_id.in_(select(taught.c.class_id))) \
+        .group_by(Student.class_id).subquery()
+    students = select(taught.c.teacher_id, func.sum(class_sizes.c.total).label('total')) \
+        .join(class_sizes, class_sizes.c.class_id == taught.c.class_id) \
+        .group_by(taught.c.teacher_id).subquery()
+    assignments = _restrict(
+        select(SubjectAssignment.teacher_id,
+               func.count().label('total'),
+               func.count(SubjectAssignment.class_id.distinct()).label('classes')),
+        SubjectAssignment.teacher_id, teacher_ids
+    ).group_by(SubjectAssignment.teacher_id).subquery()
+    rows = _restrict(
+        select(Teacher.id, Teacher.full_name, Teacher.subject,
+               func.coalesce(assignments.c.total, 0),
+               func.coalesce(assignments.c.classes, 0),
+               func.coalesce(students.c.total, 0))
+        .outerjoin(assignments, assignments.c.teacher_id == Teacher.id)
+        .outerjoin(students, students.c.teacher_id == Teacher.id),
+        Teacher.id, teacher_ids
+    )
+    return connection.execute(insert(teacher_load).from_select(
+        ['teacher_id', 'full_name', 'subject', 'assignment_count', 'class_count', 'student_count'], rows
+    )).rowcount
+
+
+def refresh_summaries(connection=None, class_ids=None):
+    """
+    Recompute the summaries of class_ids and of every teacher teaching them.
+    For bulk writes to students or assignments that bypass the ORM events.
+    """
+    connection = connection or db.session.connection()
+    class_ids = [class_id for class_id in set(class_ids) if class_id is not None]
+    if not class_ids:
+        return
+    teacher_ids = connection.scalars(
+        select(SubjectAssignment.teacher_id).where(SubjectAssignment.class_id.in_(class_ids)).distinct()
+    ).all()
+    refresh_class_stats(connection, class_ids)
+    refresh_teacher_load(connection, teacher_ids)
+
+
+def rebuild_summaries(connection=None):
+    """Recompute every summary row; returns (classes, teachers) written"""
+    connection = connection or db.session.connection()
+    return refresh_class_stats(connection), refresh_teacher_load(connection)
+
+
+def adjust_student_counts(connection, deltas):
+    """
+    Add per-class student deltas ({class_id: delta}) to class_stats and to the
+    teacher_load of every teacher of those classes. Two statements per call.
+    """
+    params = [{'class_pk': class_id, 'delta': delta}
+              for class_id, delta in deltas.items() if class_id is not None and delta]
+    if not params:
+        return
+    connection.execute(
+        update(class_stats)
+        .where(class_stats.c.class_id == bindparam('class_pk'))
+        .values(student_count=class_stats.c.student_count + bindparam('delta')),
+        params
+    )
+    connection.execute(
+        update(teacher_load)
+        .where(teacher_load.c.teacher_id.in_(
+            select(SubjectAssignment.teacher_id).where(SubjectAssignment.class_id == bindparam('class_pk'))
+        ))
+        .values(student_count=teacher_load.c.student_count + bindparam('delta')),
+        params
+    )
+
+
+def _changes(target, *names):
+    """Old and new values of the named attributes that changed in this flush"""
+    values = set()
+    state = inspect(target)
+    for name in names:
+        history = state.attrs[name].history
+        if history.has_changes():
+            values.update(history.deleted)
+            values.update(history.added)
+    return values
+
+
+@event.listens_for(Student, 'after_insert')
+def _student_inserted(mapper, connection, target):
+    adjust_student_counts(connection, {target.class_id: 1})
+
+
+@event.listens_for(Student, 'after_delete')
+def _student_deleted(mapper, connection, target):
+    adjust_student_counts(connection, {target.class_id: -1})
+
+
+@event.listens_for(Student, 'after_update')
+def _student_updated(mapper, connection, target):
+    change = class_id_change(target)
+    if change and change[0] != change[1]:
+        adjust_student_counts(connection, {change[0]: -1, change[1]: 1})
+
+
+# Assignment changes recompute their rows: distinct subject, teacher and class
+# counts cannot be kept by delta, and a class or teacher has few assignments
+
+@event.listens_for(SubjectAssignment, 'after_insert')
+def _assignment_inserted(mapper, connection, target):
+    refresh_class_stats(connection, {target.class_id})
+    refresh_teacher_load(connection, {target.teacher_id})
+
+
+@event.listens_for(SubjectAssignment, 'after_delete')
+def _assignment_deleted(mapper, connection, target):
+    refresh_class_stats(connection, {target.class_id})
+    refresh_teacher_load(connection, {target.teacher_id})
+
+
+@event.listens_for(SubjectAssignment, 'after_update')
+def _assignment_updated(mapper, connection, target):
+    refresh_class_stats(connection, {target.class_id} | _changes(target, 'class_id'))
+    refresh_teacher_load(connection, {target.teacher_id} | _changes(target, 'teacher_id'))
+
+
+@event.listens_for(Class, 'after_insert')
+def _class_inserted(mapper, connection, target):
+    refresh_class_stats(connection, {target.id})
+
+
+@event.listens_for(Class, 'after_update')
+def _class_updated(mapper, connection, target):
+    if _changes(target, 'grade', 'section'):
+        connection.execute(update(class_stats).where(class_stats.c.class_id == target.id)
+                           .values(grade=target.grade, section=target.section))
+
+
+@event.listens_for(Class, 'after_delete')
+def _class_deleted(mapper, connection, target):
+    connection.execute(delete(class_stats).where(class_stats.c.class_id == target.id))
+    connection.execute(delete(class_subject_stats).where(class_subject_stats.c.class_id == target.id))
+
+
+@event.listens_for(Teacher, 'after_insert')
+def _teacher_inserted(mapper, connection, target):
+    refresh_teacher_load(connection, {target.id})
+
+
+@event.listens_for(Teacher, 'after_update')
+def _teacher_updated(mapper, connection, target):
+    if _changes(target, 'full_name', 'subject'):
+        connection.execute(update(teacher_load).where(teacher_load.c.teacher_id == target.id)
+                           .values(full_name=target.full_name, subject=target.subject))
+
+
+@event.listens_for(Teacher, 'after_delete')
+def _teacher_deleted(mapper, connection, target):
+    connection.execute(delete(teacher_load).where(teacher_load.c.teacher_id == target.id))
@@ -0,0 +1,544 @@
+"""
+Timetable scheduler
+Places every subject assignment's weekly lessons into the week's slots so no
+teacher or class is double-booked and teachers are only booked when available.
+A week of days x periods slots fits in one integer, so each assignment's lessons,
+each teacher's and class's busy slots and each teacher's blocked slots are
+bitmasks; free slots for a lesson are one AND-NOT away.
+
+Solving is a greedy construction (most constrained assignments first, lessons
+spread over different days) followed by a min-conflicts repair: a lesson with no
+free slot takes the slot with the fewest clashes and evicts them, with a short
+tabu list so evicted lessons do not bounce straight back. Placements are stored
+on subject_assignments.timetable_slots, so a re-solve keeps every valid lesson
+and only repairs what a change broke.
+"""
+import random
+import re
+import threading
+import time
+from collections import deque
+from flask import current_app
+from sqlalchemy import bindparam, func, select, text, update
+from models import db, Teacher, SubjectAssignment
+
+DAY_NAMES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+FULL_DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# One part of an availability text: "Mon", "Mon 3", "Monday 1-2", or "4" / "5-6"
+# continuing the previous part's day
+_SLOT_PART = re.compile(r'^([A-Za-z]+)?\s*(?:(\d+)(?:\s*-\s*(\d+))?)?$')
+
+# Steps a lesson placed by the repair is protected from eviction
+TABU_TENURE = 10
+
+# One solve at a time per process; _lock_for_solve() serializes worker processes
+_solve_lock = threading.Lock()
+
+
+def _bits(mask):
+    """Indexes of the set bits of mask, lowest first"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def _pick(mask, offset):
+    """The first set bit of mask at or after offset, wrapping around"""
+    high = mask >> offset
+    if high:
+        return offset + (high & -high).bit_length() - 1
+    return (mask & -mask).bit_length() - 1
+
+
+class Timetable:
+    """
+    In-memory timetable over integer ids
+    Assignments, teachers and classes get dense indexes; busy slots are kept as
+    bitmasks per teacher and class, and who sits in a slot in flat lists of
+    (teacher or class index) * slot_count + slot.
+    """
+
+    def __init__(self, days, periods_per_day, seed=0):
+        self.days = days
+        self.periods_per_day = periods_per_day
+        self.slot_count = days * periods_per_day
+        if not 0 < self.slot_count <= 63:
+            raise ValueError('A week must have between 1 and 63 slots to fit a 64-bit column')
+        self.full = (1 << self.slot_count) - 1
+        self.day_masks = [((1 << periods_per_day) - 1) << (day * periods_per_day) for day in range(days)]
+        self.rng = random.Random(seed)
+
+        self.index = {}  # assignment id -> dense index
+        self.ids = []
+        self.teacher = []  # per assignment: teacher index
+        self.klass = []  # per assignment: class index
+        self.periods = []  # lessons per week wanted
+        self.slots = []  # placed lessons, as a slot bitmask
+        self.changed = set()  # assignment ids whose slots differ from what was loaded
+
+        self.teacher_index, self.class_index = {}, {}
+        self.teacher_busy, self.class_busy = [], []
+        self.blocked = []  # per teacher: unavailable slots
+        self.teacher_at, self.class_at = [], []  # who occupies each slot, or -1
+
+    # -- setup --------------------------------------------------------------
+
+    def _teacher(self, teacher_id):
+        index = self.teacher_index.get(teacher_id)
+        if index is None:
+            index = self.teacher_index[teacher_id] = len(self.teacher_busy)
+            self.teacher_busy.append(0)
+            self.blocked.append(0)
+            self.teacher_at.extend([-1] * self.slot_count)
+        return index
+
+    def _class(self, class_id):
+        index = self.class_index.get(class_id)
+        if index is None:
+            index = self.class_index[class_id] = len(self.class_busy)
+            self.class_busy.append(0)
+            self.class_at.extend([-1] * self.slot_count)
+        return index
+
+    def set_unavailable(self, teacher_id, mask):
+        """Block a teacher's unavailable slots; lessons already there are unplaced"""
+        t = self._teacher(teacher_id)
+        self.blocked[t] = mask & self.full
+        for slot in _bits(self.teacher_busy[t] & self.blocked[t]):
+            self._unplace(self.teacher_at[t * self.slot_count + slot], slot)
+
+    def add_assignment(self, assignment_id, teacher_id, class_id, periods, slots=0):
+        """
+        Add an assignment wanting periods lessons a week. Previously saved slots
+        are kept where they are still valid; the rest are left for the solver.
+        """
+        a = len(self.ids)
+        self.index[assignment_id] = a
+        self.ids.append(assignment_id)
+        self.teacher.append(self._teacher(teacher_id))
+        self.klass.append(self._class(class_id))
+        self.periods.append(max(0, min(periods, self.slot_count)))
+        self.slots.append(0)
+        kept = 0
+        for slot in _bits(slots & self.full):
+            if kept < self.periods[a] and self._free(a) >> slot & 1:
+                self._place(a, slot)
+                kept += 1
+        if self.slots[a] == slots:
+            self.changed.discard(assignment_id)
+        else:
+            self.changed.add(assignment_id)
+        return a
+
+    # -- incremental changes ------------------------------------------------
+
+    def set_assignment(self, assignment_id, teacher_id, class_id, periods):
+        """Add or change one assignment; its lessons move only if they must"""
+        a = self.index.get(assignment_id)
+        if a is None:
+            return self.add_assignment(assignment_id, teacher_id, class_id, periods)
+        if self.teacher[a] != self._teacher(teacher_id) or self.klass[a] != self._class(class_id):
+            for slot in list(_bits(self.slots[a])):
+                self._unplace(a, slot)
+            self.teacher[a] = self._teacher(teacher_id)
+            self.klass[a] = self._class(class_id)
+        self.periods[a] = max(0, min(periods, self.slot_count))
+        # Fewer lessons: drop the latest ones in the week
+        while self.slots[a].bit_count() > self.periods[a]:
+            self._unplace(a, self.slots[a].bit_length() - 1)
+        return a
+
+    def remove_assignment(self, assignment_id):
+        """Free an assignment's slots; its index stays behind with no lessons"""
+        a = self.index.get(assignment_id)
+        if a is not None:
+            for slot in list(_bits(self.slots[a])):
+                self._unplace(a, slot)
+            self.periods[a] = 0
+
+    # -- slot bookkeeping ---------------------------------------------------
+
+    def _free(self, a):
+        """Slots where assignment a could take a lesson without any clash"""
+        t, c = self.teacher[a], self.klass[a]
+        return self.full & ~(self.teacher_busy[t] | self.blocked[t] | self.class_busy[c] | self.slots[a])
+
+    def _used_days(self, a):
+        mask = self.slots[a]
+        used = 0
+        if mask:
+            for day_mask in self.day_masks:
+                if mask & day_mask:
+                    used |= day_mask
+        return used
+
+    def _place(self, a, slot):
+        bit = 1 << slot
+        t, c = self.teacher[a], self.klass[a]
+        self.slots[a] |= bit
+        self.teacher_busy[t] |= bit
+        self.class_busy[c] |= bit
+        self.teacher_at[t * self.slot_count + slot] = a
+        self.class_at[c * self.slot_count + slot] = a
+        self.changed.add(self.ids[a])
+
+    def _unplace(self, a, slot):
+        bit = ~(1 << slot)
+        t, c = self.teacher[a], self.klass[a]
+        self.slots[a] &= bit
+        self.teacher_busy[t] &= bit
+        self.class_busy[c] &= bit
+        self.teacher_at[t * self.slot_count + slot] = -1
+        self.class_at[c * self.slot_count + slot] = -1
+        self.changed.add(self.ids[a])
+
+    def missing(self, a):
+        return self.periods[a] - self.slots[a].bit_count()
+
+    def _place_free(self, a):
+        """Place as many of a's missing lessons as fit without clashes, on new days first"""
+        placed = 0
+        while self.missing(a) > 0:
+            free = self._free(a)
+            if not free:
+                break
+            spread = free & ~self._used_days(a)
+            self._place(a, _pick(spread or free, self.rng.randrange(self.slot_count)))
+            placed += 1
+        return placed
+
+    # -- solving ------------------------------------------------------------
+
+    def construct(self):
+        """
+        Greedy pass over every assignment with missing lessons, tightest first:
+        teachers with the least spare capacity, then the fullest classes
+        """
+        demand_t = [0] * len(self.teacher_busy)
+        demand_c = [0] * len(self.class_busy)
+        for a, periods in enumerate(self.periods):
+            demand_t[self.teacher[a]] += periods
+            demand_c[self.klass[a]] += periods
+        capacity_t = [self.slot_count - blocked.bit_count() for blocked in self.blocked]
+
+        order = [a for a in range(len(self.ids)) if self.missing(a) > 0]
+        order.sort(key=lambda a: (capacity_t[self.teacher[a]] - demand_t[self.teacher[a]],
+                                  -demand_c[self.klass[a]], self.rng.random()))
+        for a in order:
+            self._place_free(a)
+
+    def repair(self, assignments=None, time_limit=None, max_steps=None):
+        """
+        Min-conflicts repair of missing lessons: of the given assignment indexes
+        (and whatever they evict), or of every assignment when None.
+        Returns the number of lessons still missing, which is only above zero when
+        a teacher or class needs more lessons than it has available slots, or the
+        step or time budget ran out.
+        """
+        if assignments is None:
+            assignments = range(len(self.ids))
+        queue = deque(a for a in assignments if self.missing(a) > 0)
+        queued = set(queue)
+        if max_steps is None:
+            max_steps = 50 * sum(self.missing(a) for a in queue) + 1000
+        deadline = time.monotonic() + time_limit if time_limit else None
+        capacity_t = [self.slot_count - blocked.bit_count() for blocked in self.blocked]
+        tabu = {}  # (assignment, slot) -> step until which that lesson stays put
+        S = self.slot_count
+
+        step = 0
+        while queue and step < max_steps:
+            step += 1
+            if deadline is not None and step % 256 == 0 and time.monotonic() > deadline:
+                break
+            a = queue.popleft()
+            queued.discard(a)
+            self._place_free(a)
+            if self.missing(a) <= 0:
+                continue
+            t, c = self.teacher[a], self.klass[a]
+            # Full teacher or class: evicting their own lessons cannot help
+            if self.teacher_busy[t].bit_count() >= capacity_t[t] or self.class_busy[c] == self.full:
+                continue
+
+            candidates = self.full & ~(self.blocked[t] | self.slots[a])
+            used_days = self._used_days(a)
+            best, best_score = [], None
+            for slot in _bits(candidates):
+                clashes = {self.teacher_at[t * S + slot], self.class_at[c * S + slot]}
+                clashes.discard(-1)
+                score = 2 * len(clashes) + (1 if used_days >> slot & 1 else 0)
+                if any(tabu.get((b, slot), 0) > step for b in clashes):
+                    score += 100
+                if best_score is None or score < best_score:
+                    best, best_score = [slot], score
+                elif score == best_score:
+                    best.append(slot)
+            slot = self.rng.choice(best)
+            for b in {self.teacher_at[t * S + slot], self.class_at[c * S + slot]} - {-1}:
+                self._unplace(b, slot)
+                if b not in queued:
+                    queue.append(b)
+                    queued.add(b)
+            self._place(a, slot)
+            tabu[(a, slot)] = step + TABU_TENURE + self.rng.randrange(TABU_TENURE)
+            if self.missing(a) > 0 and a not in queued:
+                queue.append(a)
+                queued.add(a)
+        return self.unplaced
+
+    def solve(self, time_limit=None):
+        """Construct and repair; returns the number of lessons left unplaced"""
+        self.construct()
+        return self.repair(time_limit=time_limit)
+
+    def resolve(self, assignment_ids=None, time_limit=None):
+        """
+        Repair after a change: every lesson still in place stays and only the
+        missing lessons of assignment_ids (all assignments when None) are placed,
+        moving as few others as the repair needs
+        """
+        assignments = None
+        if assignment_ids is not None:
+            assignments = [self.index[i] for i in set(assignment_ids) if i in self.index]
+        self.repair(assignments, time_limit=time_limit)
+        return self.unplaced
+
+    # -- reporting ----------------------------------------------------------
+
+    @property
+    def lessons(self):
+        return sum(self.periods)
+
+    @property
+    def unplaced(self):
+        return sum(max(0, self.missing(a)) for a in range(len(self.ids)))
+
+    def over_capacity(self):
+        """
+        Lessons that cannot be placed in any timetable: demand above available
+        slots, per teacher and per class (the larger of the two totals)
+        """
+        demand_t = [0] * len(self.teacher_busy)
+        demand_c = [0] * len(self.class_busy)
+        for a, periods in enumerate(self.periods):
+            demand_t[self.teacher[a]] += periods
+            demand_c[self.klass[a]] += periods
+        teachers = sum(max(0, demand - (self.slot_count - blocked.bit_count()))
+                       for demand, blocked in zip(demand_t, self.blocked))
+        classes = sum(max(0, demand - self.slot_count) for demand in demand_c)
+        return max(teachers, classes)
+
+    def clashes(self):
+        """Double bookings and unavailable slots in use; empty for a valid timetable"""
+        problems = []
+        teacher_seen = [0] * len(self.teacher_busy)
+        class_seen = [0] * len(self.class_busy)
+        for a, mask in enumerate(self.slots):
+            t, c = self.teacher[a], self.klass[a]
+            if teacher_seen[t] & mask:
+                problems.append(('teacher', self.ids[a], teacher_seen[t] & mask))
+            if class_seen[c] & mask:
+                problems.append(('class', self.ids[a], class_seen[c] & mask))
+            if self.blocked[t] & mask:
+                problems.append(('unavailable', self.ids[a], self.blocked[t] & mask))
+            teacher_seen[t] |= mask
+            class_seen[c] |= mask
+        return problems
+
+
+# -- slot names -------------------------------------------------------------
+
+def slot_name(slot, periods_per_day):
+    day, period = divmod(slot, periods_per_day)
+    return f'{DAY_NAMES[day]} {period + 1}'
+
+
+def format_slots(mask, days, periods_per_day):
+    """"Mon 1-2, Fri 8" style text for a slot bitmask"""
+    parts = []
+    for day in range(days):
+        periods = [p + 1 for p in range(periods_per_day) if mask >> (day * periods_per_day + p) & 1]
+        runs = []
+        for period in periods:
+            if runs and period == runs[-1][1] + 1:
+                runs[-1][1] = period
+            else:
+                runs.append([period, period])
+        for first, last in runs:
+            parts.append(f'{DAY_NAMES[day]} {first}' if first == last else f'{DAY_NAMES[day]} {first}-{last}')
+    return ', '.join(parts)
+
+
+def parse_slots(text, days, periods_per_day):
+    """
+    Slot bitmask from text like "Mon 1-2, Fri 8", "Wed" (the whole day) or
+    "Tuesday 1, 3" (a part without a day continues the previous day's).
+    Raises ValueError on anything it cannot read.
+    """
+    mask = 0
+    names = {}
+    for day in range(days):
+        names[DAY_NAMES[day].lower()] = names[FULL_DAY_NAMES[day].lower()] = day
+    day = None
+    for part in filter(None, (part.strip() for part in (text or '').split(','))):
+        match = _SLOT_PART.match(part)
+        if not match:
+            raise ValueError(f'Cannot read "{part}"; use e.g. "Mon 1-2, Fri"')
+        day_name, first, last = match.groups()
+        if day_name is not None:
+            day = names.get(day_name.lower())
+            if day is None:
+                raise ValueError(f'Unknown day in "{part}"; use {", ".join(DAY_NAMES[:days])}')
+        elif day is None or first is None:
+            raise ValueError(f'No day in "{part}"; use e.g. "Mon 1-2"')
+        if first is None:
+            first, last = 1, periods_per_day
+        else:
+            first = int(first)
+            last = int(last) if last else first
+        if not 1 <= first <= last <= periods_per_day:
+            raise ValueError(f'Periods in "{part}" must be between 1 and {periods_per_day}')
+        for period in range(first, last + 1):
+            mask |= 1 << (day * periods_per_day + period - 1)
+    return mask
+
+
+def unavailable_mask(text):
+    """Slot bitmask of a teacher's unavailable periods text, for the configured week"""
+    config = current_app.config
+    return parse_slots(text, config['TIMETABLE_DAYS'], config['TIMETABLE_PERIODS_PER_DAY'])
+
+
+def unavailable_text(mask):
+    """Text form of a teacher's unavailable slot bitmask"""
+    config = current_app.config
+    return format_slots(mask or 0, config['TIMETABLE_DAYS'], config['TIMETABLE_PERIODS_PER_DAY'])
+
+
+def week_grid(entries):
+    """
+    Rows of periods, each a list of days holding the labels scheduled there,
+    from (slot bitmask, label) pairs
+    """
+    days, periods = current_app.config['TIMETABLE_DAYS'], current_app.config['TIMETABLE_PERIODS_PER_DAY']
+    grid = [[[] for _ in range(days)] for _ in range(periods)]
+    for mask, label in entries:
+        for slot in _bits(mask or 0):
+            day, period = divmod(slot, periods)
+            if day < days:
+                grid[period][day].append(label)
+    return grid
+
+
+# -- database ---------------------------------------------------------------
+
+def load_timetable(config, keep=True):
+    """
+    Build a Timetable from the subject assignments and teacher availability.
+    With keep, saved placements that are still valid are loaded too.
+    """
+    timetable = Timetable(config['TIMETABLE_DAYS'], config['TIMETABLE_PERIODS_PER_DAY'],
+                          seed=config['TIMETABLE_SEED'])
+    for teacher_id, mask in db.session.execute(
+        select(Teacher.id, Teacher.unavailable_slots).where(Teacher.unavailable_slots != 0)
+    ):
+        timetable.set_unavailable(teacher_id, mask)
+    default_periods = config['TIMETABLE_DEFAULT_PERIODS']
+    for assignment_id, teacher_id, class_id, periods, slots in db.session.execute(
+        select(SubjectAssignment.id, SubjectAssignment.teacher_id, SubjectAssignment.class_id,
+               func.coalesce(SubjectAssignment.periods_per_week, default_periods),
+               SubjectAssignment.timetable_slots).order_by(SubjectAssignment.id)
+    ):
+        timetable.add_assignment(assignment_id, teacher_id, class_id, periods, slots if keep else 0)
+    return timetable
+
+
+def save_timetable(timetable):
+    """Write the slots of changed assignments in one executemany; the caller commits"""
+    params = [{'assignment_pk': assignment_id, 'slots': timetable.slots[timetable.index[assignment_id]]}
+              for assignment_id in timetable.changed]
+    if params:
+        db.session.execute(
+            update(SubjectAssignment.__table__)
+            .where(SubjectAssignment.__table__.c.id == bindparam('assignment_pk'))
+            .values(timetable_slots=bindparam('slots')),
+            params
+        )
+    timetable.changed.clear()
+    return len(params)
+
+
+def timetable_exists():
+    """Whether any lesson has been scheduled yet"""
+    return db.session.scalar(
+        select(SubjectAssignment.id).where(SubjectAssignment.timetable_slots != 0).limit(1)
+    ) is not None
+
+
+def _lock_for_solve():
+    """
+    Hold the database write lock from loading until the solve commits, so solves
+    in other worker processes wait rather than save over each other: SQLite
+    locks the database with BEGIN IMMEDIATE, other databases every assignment row
+    """
+    if db.session.get_bind().dialect.name == 'sqlite':
+        db.session.execute(text('BEGIN IMMEDIATE'))
+    else:
+        db.session.execute(select(SubjectAssignment.id).with_for_update()).all()
+
+
+def generate_timetable(config, incremental=False, assignment_ids=None):
+    """
+    Solve and save the timetable, from scratch or (incremental) keeping every
+    valid saved lesson. Call with no uncommitted writes: the solve runs in its
+    own locked transaction. Returns a summary dict; commits.
+    """
+    with _solve_lock:
+        started = time.perf_counter()
+        _lock_for_solve()
+        timetable = load_timetable(config, keep=incremental)
+        loaded = time.perf_counter()
+        if incremental:
+            # Assignments whose saved lessons did not survive loading need repair too
+            if assignment_ids is not None:
+                assignment_ids = set(assignment_ids) | timetable.changed
+            unplaced = timetable.resolve(assignment_ids, time_limit=config['TIMETABLE_TIME_LIMIT'])
+        else:
+            unplaced = timetable.solve(time_limit=config['TIMETABLE_TIME_LIMIT'])
+        solved = time.perf_counter()
+        written = save_timetable(timetable)
+        db.session.commit()
+        return {
+            'lessons': timetable.lessons,
+            'unplaced': unplaced,
+            'over_capacity': timetable.over_capacity(),
+            'assignments_written': written,
+            'load_seconds': round(loaded - started, 3),
+            'solve_seconds': round(solved - loaded, 3),
+            'save_seconds': round(time.perf_counter() - solved, 3),
+        }
+
+
+def resolve_after_change(assignment_ids=None, user_id=None):
+    """
+    Queue an incremental re-solve after assignments or teacher availability
+    changed, once a timetable exists and TIMETABLE_AUTO_RESOLVE is on. The solve
+    runs in the job runner, so the save that triggered it returns at once.
+    Returns the job id, or None. Failures are logged: the change itself is
+    already committed and a later solve repairs it.
+    """
+    config = current_app.config
+    if not config['TIMETABLE_AUTO_RESOLVE']:
+        return None
+    try:
+        if not timetable_exists():
+            return None
+        return current_app.extensions['jobs'].submit(
+            'generate_timetable', {'incremental': True, 'assignment_ids': assignment_ids}, user_id=user_id)
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception('Could not queue the timetable re-solve')
+        return None
@@ -0,0 +1,63 @@
+"""
+Constraint-driven writes for the create/edit views
+Saves go straight to the database and unique constraint violations are mapped
+back to form field errors, instead of checking for duplicates with SELECTs first
+"""
+import re
+from flask import flash
+from sqlalchemy.exc import IntegrityError
+from models import db
+
+# Unique constraints -> (form field, message formatted with the form data). Keyed by the
+# column list SQLite reports ("table.col, table.col") and by constraint/index name otherwise.
+UNIQUE_ERRORS = {
+    'students.student_id': ('student_id', 'Student ID already exists. Please use a different ID.'),
+    'ix_students_student_id': ('student_id', 'Student ID already exists. Please use a different ID.'),
+    'students.email': ('email', 'Email already exists. Please use a different email.'),
+    'students_email_key': ('email', 'Email already exists. Please use a different email.'),
+    'teachers.teacher_id': ('teacher_id', 'Teacher ID already exists. Please use a different ID.'),
+    'ix_teachers_teacher_id': ('teacher_id', 'Teacher ID already exists. Please use a different ID.'),
+    'teachers.email': ('email', 'Email already exists. Please use a different email.'),
+    'teachers_email_key': ('email', 'Email already exists. Please use a different email.'),
+    'classes.grade, classes.section': ('section', 'Class {grade}-{section} already exists.'),
+    'ix_classes_grade_section': ('section', 'Class {grade}-{section} already exists.'),
+    'subject_assignments.teacher_id, subject_assignments.class_id, subject_assignments.subject_name':
+        ('subject_name', 'This assignment already exists.'),
+    'unique_teacher_class_subject': ('subject_name', 'This assignment already exists.'),
+}
+
+_SQLITE_UNIQUE = re.compile(r'UNIQUE constraint failed: ([\w., ]+)')
+_NAMED_CONSTRAINT = re.compile(r'constraint "?(\w+)"?')
+
+
+def unique_violation(error):
+    """(field, message) for an IntegrityError from a known unique constraint, else None"""
+    text = str(error.orig)
+    match = _SQLITE_UNIQUE.search(text) or _NAMED_CONSTRAINT.search(text)
+    if match:
+        return UNIQUE_ERRORS.get(match.group(1).strip())
+    return None
+
+
+def save(form, instance=None):
+    """
+    Add instance (if given) and commit in one round trip.
+    Returns True on success. On a known unique violation the transaction is rolled
+    back, the message is attached to the form field and flashed, and False is
+    returned; other database errors propagate.
+    """
+    try:
+        if instance is not None:
+            db.session.add(instance)
+        db.session.commit()
+        return True
+    except IntegrityError as e:
+        db.session.rollback()
+        violation = unique_violation(e)
+        if violation is None:
+            raise
+        field, message = violation
+        message = message.format(**form.data)
+        form[field].errors = list(form[field].errors) + [message]
+        flash(message, 'error')
+        return False